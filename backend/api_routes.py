@@ -4,15 +4,23 @@ API路由模块
 定义所有的API接口路由和处理逻辑
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
+import json
 import logging
 import time
 from functools import wraps
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from config import get_config
 from database import db_manager
 from stock_service import stock_service
+from upstream import upstream_registry
+from fetch_executor import fetch_executor
+from watchlist_refresher import watchlist_refresher
+from symbol_master import symbol_master
+from http_cache import cached_response, json_response, compress_response, response_body_cache
+import request_timing
+import metrics
 from auth_utils import token_required, optional_token
 
 # 获取配置
@@ -43,6 +51,7 @@ def rate_limit(f):
         
         # 检查请求频率
         if len(request_counts[client_ip]) >= config.RATE_LIMIT_PER_MINUTE:
+            metrics.rate_limited_requests.inc(request.endpoint)
             return create_error_response(
                 'RATE_LIMIT_EXCEEDED',
                 config.ERROR_MESSAGES['RATE_LIMIT_EXCEEDED'],
@@ -67,7 +76,7 @@ def log_api_call(f):
         
         try:
             response = f(*args, **kwargs)
-            response_code = response[1] if isinstance(response, tuple) else 200
+            response_code = response[1] if isinstance(response, tuple) else response.status_code
             error_message = None
         except Exception as e:
             response = create_error_response('INTERNAL_ERROR', str(e), 500)
@@ -95,8 +104,8 @@ def log_api_call(f):
         return response
     return decorated_function
 
-def create_success_response(data: Any, message: str = None, **kwargs) -> Dict:
-    """创建成功响应"""
+def _success_payload(data: Any, message: str = None, **kwargs) -> Dict:
+    """成功响应的内容"""
     response = {
         'success': True,
         'data': data
@@ -108,7 +117,18 @@ def create_success_response(data: Any, message: str = None, **kwargs) -> Dict:
     # 添加额外字段
     response.update(kwargs)
     
-    return jsonify(response)
+    return response
+
+def create_success_response(data: Any, message: str = None, **kwargs) -> Dict:
+    """创建成功响应"""
+    return jsonify(_success_payload(data, message, **kwargs))
+
+def create_cached_response(validator: Optional[Dict[str, Any]], data: Any, message: str = None, **kwargs):
+    """
+    创建成功响应（快速JSON序列化）
+    带校验信息时设置ETag，并按ETag缓存序列化后的响应体，缓存未刷新的后续请求直接写出字节
+    """
+    return json_response(_success_payload(data, message, **kwargs), validator)
 
 def create_error_response(error_code: str, error_message: str = None, status_code: int = 400) -> tuple:
     """创建错误响应"""
@@ -128,6 +148,44 @@ def validate_stock_code(stock_code: str) -> bool:
         stock_code.isdigit()
     )
 
+@api_bp.before_request
+def start_request_timing():
+    """开始记录本次请求的分段计时"""
+    request_timing.start_trace()
+
+@api_bp.after_request
+def compress_api_response(response):
+    """较大的JSON响应（历史数据、批量查询、关注列表等）按客户端支持的编码压缩"""
+    return compress_response(request, response)
+
+@api_bp.after_request
+def add_server_timing(response):
+    """附加 Server-Timing 头（各阶段和上游请求耗时），并结束本次请求的计时记录"""
+    trace = request_timing.current_trace()
+    if trace is not None:
+        if config.SERVER_TIMING_ENABLED:
+            response.headers['Server-Timing'] = trace.server_timing()
+        request_timing.end_trace()
+    return response
+
+@api_bp.before_app_request
+def mark_request_start():
+    """记录请求开始时间（应用级钩子：未匹配任何路由的请求不经过蓝图的钩子）"""
+    g.request_started_at = time.perf_counter()
+
+@api_bp.after_app_request
+def record_request_metrics(response):
+    """
+    记录 /api 请求的次数和耗时指标
+    未匹配任何路由的请求（扫描路径、拼写错误等）统一计入 unmatched 接口标签
+    """
+    started_at = g.get('request_started_at')
+    unmatched = request.url_rule is None and request.path.startswith(api_bp.url_prefix + '/')
+    if started_at is not None and (request.blueprint == api_bp.name or unmatched):
+        metrics.observe_request(request.endpoint, request.method, response.status_code,
+                                time.perf_counter() - started_at)
+    return response
+
 # ==================== API路由定义 ====================
 
 @api_bp.route('/health', methods=['GET'])
@@ -159,19 +217,40 @@ def search_stocks():
         if limit > config.MAX_SEARCH_RESULTS:
             limit = config.MAX_SEARCH_RESULTS
         
+        # 是否返回11个字段的完整数据（默认只返回代码、名称和行情）
+        enrich = request.args.get('enrich', 'false').lower() in ('1', 'true', 'yes')
+        
         # 搜索股票
-        results = stock_service.search_stocks(keyword, limit)
+        results = stock_service.search_stocks(keyword, limit, enrich=enrich)
         
         return create_success_response(
             data=results,
             count=len(results),
-            keyword=keyword
+            keyword=keyword,
+            enriched=enrich
         )
     
     except Exception as e:
         logger.error(f"搜索股票API错误: {str(e)}")
         return create_error_response('INTERNAL_ERROR', str(e), 500)
 
+@api_bp.route('/stocks/suggest', methods=['GET'])
+def suggest_stocks():
+    """
+    股票联想输入接口
+    纯内存索引查找，不请求上游、不限流、不写调用日志，供搜索框逐字输入时调用
+    """
+    keyword = request.args.get('keyword', '').strip()
+    limit = request.args.get('limit', config.SUGGEST_DEFAULT_RESULTS, type=int)
+    limit = max(1, min(limit, config.SUGGEST_MAX_RESULTS))
+    
+    suggestions = symbol_master.suggest(keyword, limit) if keyword else []
+    
+    response = create_success_response(data=suggestions, count=len(suggestions))
+    # 代码表每天刷新一次，联想结果允许浏览器短时间缓存
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
 @api_bp.route('/stocks/<stock_code>', methods=['GET'])
 @rate_limit
 @log_api_call
@@ -186,15 +265,6 @@ def get_stock_detail(stock_code):
                 config.ERROR_MESSAGES['INVALID_STOCK_CODE']
             )
         
-        # 获取股票信息
-        stock_info = stock_service.get_stock_complete_data(stock_code)
-        if not stock_info:
-            return create_error_response(
-                'STOCK_NOT_FOUND',
-                config.ERROR_MESSAGES['STOCK_NOT_FOUND'],
-                404
-            )
-        
         # 检查是否在关注列表中（支持用户隔离）
         user_id = None
         if hasattr(request, 'current_user') and request.current_user:
@@ -203,9 +273,27 @@ def get_stock_detail(stock_code):
         is_watched = False
         if user_id:
             is_watched = db_manager.is_in_watchlist(stock_code, user_id)
+        
+        # 快照各字段层缓存均未刷新时，客户端缓存的响应仍是最新的
+        cache_keys = stock_service.snapshot_cache_keys(stock_code)
+        cached = cached_response(request, stock_service.get_cache_validator(cache_keys, (is_watched,)))
+        if cached:
+            return cached
+        
+        # 获取股票信息（同时返回组装时使用的缓存项，ETag由这些缓存项生成）
+        stock_info, cache_entries = stock_service.get_stock_snapshot(stock_code)
+        if not stock_info:
+            return create_error_response(
+                'STOCK_NOT_FOUND',
+                config.ERROR_MESSAGES['STOCK_NOT_FOUND'],
+                404
+            )
         stock_info['is_watched'] = is_watched
         
-        return create_success_response(data=stock_info)
+        return create_cached_response(
+            stock_service.make_cache_validator(list(cache_entries.items()), (is_watched,)),
+            data=stock_info
+        )
     
     except Exception as e:
         logger.error(f"获取股票详情API错误: {stock_code}, {str(e)}")
@@ -231,10 +319,18 @@ def get_stock_history(stock_code):
                 f'时间周期参数错误，支持的周期: {", ".join(config.SUPPORTED_PERIODS)}'
             )
         
+        # 历史数据缓存未刷新时直接返回304或已序列化的响应（此时的响应必然是缓存命中，cache_hit 为True）
+        cache_keys = [f"stock_history_{stock_code}_{period}"]
+        cached = cached_response(request, stock_service.get_cache_validator(cache_keys, (True,)))
+        if cached:
+            return cached
+        
         # 获取历史数据（现在返回包含缓存信息的字典）
         result = stock_service.get_stock_history(stock_code, period)
         
-        return create_success_response(
+        # ETag由返回数据所在的缓存项生成（未缓存时不设置ETag，也不缓存响应体）
+        return create_cached_response(
+            stock_service.make_cache_validator([(cache_keys[0], result['cache_entry'])], (result['cache_hit'],)),
             data=result['data'],
             count=result['count'],
             period=result['period'],
@@ -317,10 +413,33 @@ def get_watchlist():
         watchlist = db_manager.get_watchlist(user_id)
         logger.info(f"查询到 {len(watchlist)} 条关注列表记录")
         
+        # 关注列表记录和所有股票的快照缓存均未变化时直接返回304或已序列化的响应
+        cache_keys = [
+            cache_key
+            for item in watchlist
+            for cache_key in stock_service.snapshot_cache_keys(item['code'])
+        ]
+        watchlist_version = (json.dumps(watchlist, sort_keys=True, default=str),)
+        cached = cached_response(request, stock_service.get_cache_validator(cache_keys, watchlist_version))
+        if cached:
+            return cached
+        
+        # 批量获取所有关注股票的完整信息（批量行情，少量上游请求）
+        snapshots = stock_service.get_batch_snapshots([item['code'] for item in watchlist])
+        stock_infos = {code: stock_info for code, (stock_info, _) in snapshots.items()}
+        # ETag由组装数据时实际使用的缓存项生成（任一股票获取失败时不设置ETag）
+        cache_entries = []
+        for item in watchlist:
+            entries = snapshots.get(item['code'], (None, {}))[1]
+            cache_entries.extend(
+                (cache_key, entries.get(cache_key))
+                for cache_key in stock_service.snapshot_cache_keys(item['code'])
+            )
+        
         # 为每个关注的股票添加完整的股票信息
         enriched_watchlist = []
         for item in watchlist:
-            stock_info = stock_service.get_stock_basic_info(item['code'])
+            stock_info = stock_infos.get(item['code'])
             if stock_info:
                 # 合并关注列表基本信息和完整股票信息（按新字段格式）
                 enriched_item = {
@@ -358,7 +477,8 @@ def get_watchlist():
                 }
             enriched_watchlist.append(enriched_item)
         
-        return create_success_response(
+        return create_cached_response(
+            stock_service.make_cache_validator(cache_entries, watchlist_version),
             data=enriched_watchlist,
             count=len(enriched_watchlist)
         )
@@ -515,15 +635,22 @@ def toggle_pin_stock(stock_code):
 def get_market_overview():
     """获取市场概览接口"""
     try:
-        market_data = stock_service.get_market_overview()
-        if not market_data:
+        cached = cached_response(request, stock_service.get_cache_validator(['market_overview']))
+        if cached:
+            return cached
+        
+        overview_entry = stock_service.get_market_overview_entry()
+        if not overview_entry:
             return create_error_response(
                 'INTERNAL_ERROR',
                 '获取市场数据失败',
                 500
             )
         
-        return create_success_response(data=market_data)
+        return create_cached_response(
+            stock_service.make_cache_validator([('market_overview', overview_entry)]),
+            data=overview_entry['data']
+        )
     
     except Exception as e:
         logger.error(f"获取市场概览API错误: {str(e)}")
@@ -535,6 +662,7 @@ def clear_cache():
     """清空缓存接口（管理功能）"""
     try:
         stock_service.clear_cache()
+        response_body_cache.clear()
         
         return create_success_response(
             data={'cleared': True},
@@ -545,6 +673,24 @@ def clear_cache():
         logger.error(f"清空缓存API错误: {str(e)}")
         return create_error_response('INTERNAL_ERROR', str(e), 500)
 
+@api_bp.route('/symbols/refresh', methods=['POST'])
+@rate_limit
+@log_api_call
+@token_required
+def refresh_symbols():
+    """刷新证券代码表接口（管理功能）"""
+    try:
+        symbol_count = stock_service.refresh_symbol_master()
+        
+        return create_success_response(
+            data={'symbol_count': symbol_count},
+            message='证券代码表刷新成功'
+        )
+    
+    except Exception as e:
+        logger.error(f"刷新证券代码表API错误: {str(e)}")
+        return create_error_response('INTERNAL_ERROR', str(e), 500)
+
 @api_bp.route('/stats', methods=['GET'])
 @log_api_call
 def get_api_stats():
@@ -556,11 +702,23 @@ def get_api_stats():
         
         api_stats = db_manager.get_api_stats(hours)
         cache_stats = stock_service.get_cache_stats()
+        upstream_stats = upstream_registry.get_stats()
+        executor_stats = fetch_executor.get_stats()
+        watchlist_refresh_stats = watchlist_refresher.get_stats()
+        symbol_master_stats = symbol_master.get_stats()
+        response_cache_stats = response_body_cache.get_stats()
+        timing_stats = request_timing.get_stats()
         
         return create_success_response(
             data={
                 'api_stats': api_stats,
                 'cache_stats': cache_stats,
+                'upstream_stats': upstream_stats,
+                'executor_stats': executor_stats,
+                'watchlist_refresh_stats': watchlist_refresh_stats,
+                'symbol_master_stats': symbol_master_stats,
+                'response_cache_stats': response_cache_stats,
+                'timing_stats': timing_stats,
                 'period_hours': hours
             }
         )
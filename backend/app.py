@@ -5,7 +5,7 @@
 功能: 提供股票数据查询、搜索、历史数据和关注列表管理的API接口
 """
 
-from flask import Flask
+from flask import Flask, Response
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 import logging
@@ -17,6 +17,9 @@ from config import get_config
 from database import db_manager
 from api_routes import api_bp
 from auth_routes import auth_bp
+from watchlist_refresher import watchlist_refresher
+from stock_service import stock_service
+import metrics
 
 def create_app(config_name=None):
     """应用工厂函数"""
@@ -56,6 +59,13 @@ def create_app(config_name=None):
             'timestamp': datetime.now().isoformat()
         }
     
+    # Prometheus 指标（不经过频率限制和API日志，供监控系统定时抓取）
+    if config.METRICS_ENABLED:
+        @app.route('/metrics')
+        def prometheus_metrics():
+            """Prometheus 文本格式的运行指标"""
+            return Response(metrics.render_metrics(), content_type=metrics.CONTENT_TYPE)
+    
     # 注册蓝图
     app.register_blueprint(api_bp)
     app.register_blueprint(auth_bp)
@@ -72,6 +82,13 @@ def create_app(config_name=None):
             app.logger.error(f"数据库初始化失败: {str(e)}")
             raise
     
+    # 加载证券代码表索引（数据过期且开启自动刷新时在后台刷新）
+    stock_service.ensure_symbol_master()
+    
+    # 启动关注列表后台刷新（重复创建应用时只启动一次）
+    if config.WATCHLIST_REFRESH_ENABLED:
+        watchlist_refresher.start()
+    
     app.logger.info(f"股票数据API应用创建完成，配置: {config_name or 'default'}")
     return app
 
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+异步上游请求后端
+在独立线程中运行一个 asyncio 事件循环，使用 aiohttp 长连接池发起上游请求，
+单个事件循环线程即可同时承载数百个上游请求；
+同时提供同步桥接接口，供 Flask 工作线程中的同步代码直接调用
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import requests
+
+from config import get_config
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp 为可选依赖，未安装时只能使用同步后端
+    aiohttp = None
+
+# 获取配置
+config = get_config()
+logger = logging.getLogger(__name__)
+
+
+class AsyncResponse:
+    """异步请求的响应（接口与 requests.Response 中 StockService 用到的部分一致）"""
+    
+    def __init__(self, url: str, status_code: int, content: bytes, headers: Dict[str, str],
+                 encoding: Optional[str], elapsed: float):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.encoding = encoding or 'utf-8'
+        self.elapsed = timedelta(seconds=elapsed)
+    
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors='replace')
+    
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+class AsyncFetchBackend:
+    """基于 asyncio + aiohttp 的上游请求后端"""
+    
+    def __init__(self, limit: int = None, limit_per_host: int = None, keepalive_timeout: float = None):
+        if aiohttp is None:
+            raise RuntimeError("异步请求后端需要安装 aiohttp")
+        
+        self.limit = limit or config.ASYNC_FETCH_LIMIT
+        self.limit_per_host = limit_per_host or config.ASYNC_FETCH_LIMIT_PER_HOST
+        self.keepalive_timeout = keepalive_timeout or config.ASYNC_FETCH_KEEPALIVE_TIMEOUT
+        
+        # 事件循环在独立的守护线程中运行
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever,
+            name='async-fetch-loop',
+            daemon=True
+        )
+        self._thread.start()
+        self._session = self._run(self._create_session())
+        logger.info(f"异步请求后端已启动，连接上限 {self.limit}，单主机上限 {self.limit_per_host}")
+    
+    async def _create_session(self) -> 'aiohttp.ClientSession':
+        """创建带长连接池的 aiohttp 会话（必须在事件循环线程中创建）"""
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        return aiohttp.ClientSession(connector=connector)
+    
+    def _run(self, coro, timeout: Optional[float] = None) -> Any:
+        """在事件循环线程中执行协程并同步等待结果"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+    
+    async def get_async(self, url: str, params: Dict[str, Any] = None, headers: Dict[str, str] = None,
+                        timeout: float = None) -> AsyncResponse:
+        """
+        异步GET请求
+        超时和连接错误转换为 requests 的异常类型，调用方无需区分同步/异步后端
+        """
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{urlencode(params)}"
+        
+        start_time = time.time()
+        try:
+            async with self._session.get(
+                url,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=timeout or config.UPSTREAM_DEFAULT_TIMEOUT)
+            ) as response:
+                content = await response.read()
+                return AsyncResponse(
+                    url=url,
+                    status_code=response.status,
+                    content=content,
+                    headers=dict(response.headers),
+                    encoding=response.charset,
+                    elapsed=time.time() - start_time
+                )
+        except asyncio.TimeoutError as e:
+            raise requests.exceptions.Timeout(f"请求超时: {url}") from e
+        except aiohttp.ClientError as e:
+            raise requests.exceptions.ConnectionError(f"请求失败: {url}, {e}") from e
+    
+    def get(self, url: str, **kwargs) -> AsyncResponse:
+        """同步桥接：在事件循环中执行请求，阻塞等待结果"""
+        return self._run(self.get_async(url, **kwargs))
+    
+    def get_many(self, request_list: List[Tuple[str, Dict[str, Any]]]) -> List[Any]:
+        """
+        同步桥接：在事件循环中并发执行一组请求
+        
+        Args:
+            request_list: [(url, 请求参数)]
+        
+        Returns:
+            与请求顺序一致的结果列表，失败的请求对应位置为异常对象
+        """
+        async def gather():
+            return await asyncio.gather(
+                *(self.get_async(url, **kwargs) for url, kwargs in request_list),
+                return_exceptions=True
+            )
+        
+        return self._run(gather())
+    
+    def close(self) -> None:
+        """关闭会话并停止事件循环"""
+        try:
+            self._run(self._session.close(), timeout=5)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def create_async_backend() -> Optional[AsyncFetchBackend]:
+    """按配置创建异步后端；未启用或 aiohttp 不可用时返回None（使用同步后端）"""
+    if config.FETCH_BACKEND != 'async':
+        return None
+    
+    if aiohttp is None:
+        logger.warning("配置了异步请求后端但未安装 aiohttp，使用同步后端")
+        return None
+    
+    return AsyncFetchBackend()
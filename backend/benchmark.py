@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+快照链路基准测试脚本
+在同一进程中启动上游行情模拟服务（market_simulator.py），使用临时数据库，测量：
+- get_stock_complete_data / get_batch_stocks / get_stock_history 的冷、热缓存延迟分位数
+- 每个快照的上游请求次数
+- _calculate_derived_indicators 的单次耗时
+- 腾讯行情解析（parse_tencent_quotes）的单次耗时，与整段解码后逐字段切分对照
+- N 个并发客户端下的吞吐量
+- 单次快照的内存分配（tracemalloc）
+- 网页抓取（模拟服务生成的填充页面）：流式扫描的CPU耗时、读取字节数和峰值内存，与整页解码后查找对照
+
+结果保存为JSON，可与保存的基线比较，指标退化超过容忍度时以退出码1结束
+
+用法:
+    python benchmark.py --output result.json
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Callable
+
+from config import get_config
+from html_scan import scan_stream
+from tencent_quote import TencentQuote, parse_tencent_quotes
+from market_simulator import MarketSimulator, MarketUniverse, LatencyProfile, start_simulator
+
+# 获取配置
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# 越大越好的指标（其余指标越小越好）
+HIGHER_IS_BETTER = ('rps',)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """延迟样本（秒）汇总为毫秒分位数"""
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p90_ms': round(percentile(samples, 90) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(max(samples) * 1000, 3) if samples else 0.0,
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0
+    }
+
+
+class SnapshotBenchmark:
+    """快照链路基准测试"""
+    
+    def __init__(self, args):
+        self.args = args
+        self.simulator = MarketSimulator(
+            MarketUniverse(size=args.symbols, seed=args.seed),
+            default_profile=LatencyProfile(args.latency_ms, args.latency_sigma, args.error_rate),
+            html_padding_kb=args.html_padding_kb
+        )
+        self.server = start_simulator(simulator=self.simulator)
+        host, port = self.server.server_address[:2]
+        
+        # 导入 stock_service 之前改写配置：上游指向模拟服务，数据库使用临时文件（不影响 stock_data.db）
+        self.temp_dir = tempfile.TemporaryDirectory(prefix='stock-benchmark-')
+        config.UPSTREAM_SIMULATOR_URL = f"http://{host}:{port}"
+        config.DATABASE_PATH = os.path.join(self.temp_dir.name, 'benchmark.db')
+        from stock_service import stock_service
+        self.service = stock_service
+        
+        # 每个冷缓存样本使用从未请求过的代码（本地基本面库中也没有记录）
+        self._fresh_codes = iter([stock['code'] for stock in self.simulator.universe.stocks.values()])
+        self._rng = random.Random(args.seed)
+    
+    def fresh_codes(self, count: int) -> List[str]:
+        codes = [code for _, code in zip(range(count), self._fresh_codes)]
+        if len(codes) < count:
+            raise RuntimeError('模拟证券数量不足，请增大 --symbols')
+        return codes
+    
+    def upstream_requests(self) -> int:
+        return sum(self.simulator.get_stats()['request_counts'].values())
+    
+    def timed(self, func: Callable, *args) -> float:
+        start = time.perf_counter()
+        func(*args)
+        return time.perf_counter() - start
+    
+    def measure_cold_warm(self, func: Callable, keys: List[Any]) -> Dict[str, Any]:
+        """依次对每个参数冷调用一次，再热调用 --warm-repeat 次"""
+        before = self.upstream_requests()
+        cold = [self.timed(func, key) for key in keys]
+        upstream = self.upstream_requests() - before
+        warm = [self.timed(func, key) for _ in range(self.args.warm_repeat) for key in keys]
+        return {
+            'cold': latency_summary(cold),
+            'warm': latency_summary(warm),
+            'upstream_calls_per_call': round(upstream / len(keys), 2)
+        }
+    
+    def bench_snapshot(self) -> Dict[str, Any]:
+        return self.measure_cold_warm(self.service.get_stock_complete_data, self.fresh_codes(self.args.samples))
+    
+    def bench_batch(self) -> Dict[str, Any]:
+        size = self.args.batch_size
+        batches = [self.fresh_codes(size) for _ in range(max(1, self.args.samples // size))]
+        result = self.measure_cold_warm(self.service.get_batch_stocks, batches)
+        result['batch_size'] = size
+        result['upstream_calls_per_snapshot'] = round(result['upstream_calls_per_call'] / size, 2)
+        return result
+    
+    def bench_history(self) -> Dict[str, Any]:
+        return self.measure_cold_warm(
+            lambda code: self.service.get_stock_history(code, '1y'), self.fresh_codes(self.args.samples)
+        )
+    
+    def bench_derived_indicators(self) -> Dict[str, Any]:
+        """_calculate_derived_indicators 单次耗时（输入取自一个真实快照的字段层）"""
+        code = self.fresh_codes(1)[0]
+        self.service.get_stock_complete_data(code)
+        groups = {}
+        for tier in self.service.SNAPSHOT_TIERS:
+            groups.update(self.service.cache[f"stock_{tier}_{code}"]['data'])
+        financial_data = {
+            'roe': groups['roe'],
+            'industry': groups['industry'],
+            'dividend_ratio': groups['dividend_ratio']
+        }
+        
+        iterations = self.args.micro_iterations
+        samples = []
+        for _ in range(5):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                self.service._calculate_derived_indicators(groups['basic'], groups['valuation'], financial_data)
+            samples.append((time.perf_counter() - start) / iterations)
+        return {'best_us': round(min(samples) * 10 ** 6, 3), 'median_us': round(percentile(samples, 50) * 10 ** 6, 3)}
+    
+    def bench_tencent_parser(self) -> Dict[str, Any]:
+        """腾讯行情解析：一次批量行情响应（quote_batch_size 只股票，取自模拟服务）的解析耗时"""
+        symbols = [f"{stock['market']}{stock['code']}" for stock in self.simulator.universe.stocks.values()]
+        symbols = symbols[:self.service.quote_batch_size]
+        _, _, content = self.simulator.tencent_quote('/q=' + ','.join(symbols), {})
+        
+        def full_split():
+            # 对照：整段解码后按行、按 ~ 全部切分（解析模块优化前的做法）
+            quotes = {}
+            for line in content.decode('gbk').split(';'):
+                if '="' not in line:
+                    continue
+                symbol, body = line.strip()[2:].split('="', 1)
+                fields = body.rstrip('"').split('~')
+                if len(fields) > 50:
+                    values = [float(fields[index] or 0) for index in (3, 39, 46, 38, 44, 45, 73)]
+                    quotes[symbol] = TencentQuote(symbol, fields[1], *values)
+            return quotes
+        
+        iterations = max(1, self.args.micro_iterations // 100)
+        parse_us = self.cpu_per_call(lambda: parse_tencent_quotes(content), iterations) * 10 ** 6
+        return {
+            'records': len(parse_tencent_quotes(content)),
+            'response_kib': round(len(content) / 1024, 1),
+            'parse_us': round(parse_us, 3),
+            'parse_us_per_record': round(parse_us / len(symbols), 3),
+            'full_split_us': round(self.cpu_per_call(full_split, iterations) * 10 ** 6, 3)
+        }
+    
+    def bench_throughput(self) -> Dict[str, Any]:
+        """N 个并发客户端在 --duration 秒内随机请求一组新代码的快照（冷热混合）"""
+        results = {}
+        for clients in self.args.clients:
+            pool = self.fresh_codes(self.args.pool_size)
+            deadline = time.perf_counter() + self.args.duration
+            latencies = []
+            errors = [0]
+            lock = threading.Lock()
+            before = self.upstream_requests()
+            
+            def client(seed: int):
+                rng = random.Random(seed)
+                local = []
+                failed = 0
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    if self.service.get_stock_complete_data(rng.choice(pool)) is None:
+                        failed += 1
+                    local.append(time.perf_counter() - start)
+                with lock:
+                    latencies.extend(local)
+                    errors[0] += failed
+            
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=clients) as executor:
+                list(executor.map(client, [self._rng.random() for _ in range(clients)]))
+            elapsed = time.perf_counter() - start
+            
+            summary = latency_summary(latencies)
+            summary.update({
+                'rps': round(len(latencies) / elapsed, 2),
+                'errors': errors[0],
+                'upstream_calls_per_request': round((self.upstream_requests() - before) / max(1, len(latencies)), 2)
+            })
+            results[f"clients_{clients}"] = summary
+        return results
+    
+    def measure_allocations(self, func: Callable, *args) -> Dict[str, Any]:
+        """单次调用的峰值内存和调用结束后仍保留的内存（包括执行器线程中的分配）"""
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            base_current, _ = tracemalloc.get_traced_memory()
+            func(*args)
+            _, peak = tracemalloc.get_traced_memory()
+            diff = tracemalloc.take_snapshot().compare_to(before, 'filename')
+        finally:
+            tracemalloc.stop()
+        return {
+            'peak_kib': round((peak - base_current) / 1024, 1),
+            'retained_kib': round(sum(stat.size_diff for stat in diff) / 1024, 1),
+            'retained_blocks': sum(stat.count_diff for stat in diff)
+        }
+    
+    def bench_allocations(self) -> Dict[str, Any]:
+        code = self.fresh_codes(1)[0]
+        batch = self.fresh_codes(self.args.batch_size)
+        return {
+            'snapshot_cold': self.measure_allocations(self.service.get_stock_complete_data, code),
+            'snapshot_warm': self.measure_allocations(self.service.get_stock_complete_data, code),
+            'batch_cold': self.measure_allocations(self.service.get_batch_stocks, batch),
+            'batch_warm': self.measure_allocations(self.service.get_batch_stocks, batch)
+        }
+    
+    def cpu_per_call(self, func: Callable, iterations: int) -> float:
+        """单次调用的进程CPU时间（秒，5轮中最好的一轮）"""
+        samples = []
+        for _ in range(5):
+            start = time.process_time()
+            for _ in range(iterations):
+                func()
+            samples.append((time.process_time() - start) / iterations)
+        return min(samples)
+    
+    def bench_scrape(self) -> Dict[str, Any]:
+        """
+        网页抓取：对模拟服务生成的填充页面（--html-padding-kb）分别测量
+        - 流式扫描（按 SCRAPE_CHUNK_SIZE 分块，与抓取时相同的停止条件）的CPU耗时、读取字节数和峰值内存
+        - 对照：整页GBK解码后用字符串正则查找的CPU耗时和峰值内存
+        - 经过HTTP的完整抓取（新浪财务摘要、同花顺ROE）的峰值内存
+        """
+        from stock_service import SINA_FINANCE_SUMMARY_PATTERNS, THS_ROE_PATTERNS
+        
+        code = next(stock['code'] for stock in self.simulator.universe.stocks.values() if stock['market'] in ('sh', 'sz'))
+        pages = {
+            'sina_summary': (
+                self.simulator.sina_money(f'/corp/go.php/vFD_FinanceSummary/stockid/{code}.phtml', {})[2],
+                SINA_FINANCE_SUMMARY_PATTERNS, None, self.service._get_financial_statements
+            ),
+            'ths_finance': (
+                self.simulator.ths_finance(f'/{code}/finance.html', {})[2],
+                THS_ROE_PATTERNS, lambda found: self.service._select_ths_roe(found) is not None,
+                self.service._get_roe_from_10jqka
+            )
+        }
+        chunk_size = config.SCRAPE_CHUNK_SIZE
+        iterations = self.args.scrape_iterations
+        
+        results = {}
+        for name, (page, patterns, stop, fetch) in pages.items():
+            bytes_read = [0]
+            
+            def stream_scan():
+                def chunks():
+                    for start in range(0, len(page), chunk_size):
+                        chunk = page[start:start + chunk_size]
+                        bytes_read[0] += len(chunk)
+                        yield chunk
+                return scan_stream(chunks(), patterns, stop)
+            
+            text_patterns = {key: re.compile(pattern.pattern.decode('gbk')) for key, pattern in patterns.items()}
+            
+            def full_decode():
+                text = page.decode('gbk', errors='ignore')
+                return {key: pattern.search(text) for key, pattern in text_patterns.items()}
+            
+            stream_scan()
+            results[name] = {
+                'page_kib': round(len(page) / 1024, 1),
+                'bytes_read': bytes_read[0],
+                'stream_cpu_us': round(self.cpu_per_call(stream_scan, iterations) * 10 ** 6, 3),
+                'stream_peak_kib': self.measure_allocations(stream_scan)['peak_kib'],
+                'full_decode_cpu_us': round(self.cpu_per_call(full_decode, iterations) * 10 ** 6, 3),
+                'full_decode_peak_kib': self.measure_allocations(full_decode)['peak_kib'],
+                'fetch_peak_kib': self.measure_allocations(fetch, code)['peak_kib']
+            }
+        return results
+    
+    def run(self) -> Dict[str, Any]:
+        benchmarks = {
+            'snapshot': self.bench_snapshot,
+            'batch': self.bench_batch,
+            'history': self.bench_history,
+            'derived_indicators': self.bench_derived_indicators,
+            'tencent_parser': self.bench_tencent_parser,
+            'throughput': self.bench_throughput,
+            'allocations': self.bench_allocations,
+            'scrape': self.bench_scrape
+        }
+        results = {}
+        for name in self.args.only or benchmarks:
+            print(f"运行 {name} ...", file=sys.stderr)
+            results[name] = benchmarks[name]()
+        
+        self.server.shutdown()
+        self.temp_dir.cleanup()
+        return {
+            'meta': {
+                'time': datetime.now().isoformat(timespec='seconds'),
+                'git_commit': git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'options': {key: value for key, value in vars(self.args).items()
+                            if key not in ('output', 'baseline', 'save_baseline')}
+            },
+            'results': results
+        }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def flatten(results: Dict[str, Any], prefix: str = '') -> Dict[str, float]:
+    """嵌套结果展开为 {'snapshot.cold.p50_ms': 值}"""
+    metrics = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = value
+    return metrics
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float,
+            min_delta: float = 0.0) -> List[str]:
+    """
+    与基线比较，返回退化的指标说明
+    计数类指标（count、errors、batch_size）不参与比较；越小越好的指标超过基线 (1 + tolerance) 倍
+    且增加量不小于 min_delta（过滤热缓存下微秒级延迟的抖动）视为退化，吞吐量低于基线 (1 - tolerance) 倍视为退化
+    """
+    current_metrics = flatten(current['results'])
+    baseline_metrics = flatten(baseline['results'])
+    regressions = []
+    for name, base in sorted(baseline_metrics.items()):
+        if name not in current_metrics or name.rsplit('.', 1)[-1] in ('count', 'errors', 'batch_size'):
+            continue
+        value = current_metrics[name]
+        if name.endswith(HIGHER_IS_BETTER):
+            regressed = value < base * (1 - tolerance)
+        else:
+            regressed = value > base * (1 + tolerance) and value - base >= min_delta
+        if regressed:
+            change = (value - base) / base * 100 if base else float('inf')
+            regressions.append(f"{name}: {base} -> {value} ({change:+.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='快照链路基准测试（使用本地上游模拟服务）')
+    parser.add_argument('--symbols', type=int, default=5000, help='模拟证券数量')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    parser.add_argument('--latency-ms', type=float, default=20, help='模拟上游延迟中位数（毫秒）')
+    parser.add_argument('--latency-sigma', type=float, default=0.3, help='模拟上游延迟分布的 sigma')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟上游错误率')
+    parser.add_argument('--html-padding-kb', type=float, default=100, help='模拟财务页面大小（KB）')
+    parser.add_argument('--samples', type=int, default=40, help='每项冷缓存测试的样本数')
+    parser.add_argument('--warm-repeat', type=int, default=5, help='热缓存测试对每个样本的重复次数')
+    parser.add_argument('--batch-size', type=int, default=20, help='批量查询的股票数')
+    parser.add_argument('--micro-iterations', type=int, default=20000, help='衍生指标计算的循环次数')
+    parser.add_argument('--scrape-iterations', type=int, default=50, help='网页扫描CPU耗时测量的循环次数')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32], help='并发客户端数')
+    parser.add_argument('--duration', type=float, default=5, help='每个并发级别的持续时间（秒）')
+    parser.add_argument('--pool-size', type=int, default=200, help='吞吐量测试请求的代码数')
+    parser.add_argument('--only', nargs='+', help='只运行指定项目（snapshot batch history derived_indicators tencent_parser throughput allocations scrape）')
+    parser.add_argument('--output', help='结果JSON文件')
+    parser.add_argument('--save-baseline', help='将结果保存为基线文件')
+    parser.add_argument('--baseline', help='与该基线比较')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的退化比例')
+    parser.add_argument('--min-delta', type=float, default=0.5,
+                        help='越小越好的指标至少增加该值（按指标自身单位）才视为退化')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.WARNING)
+    result = SnapshotBenchmark(args).run()
+    
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    print(text)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+    
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(result, json.load(f), args.tolerance, args.min_delta)
+        if regressions:
+            print(f"\n相对基线退化（容忍度 {args.tolerance:.0%}）:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+        print(f"\n与基线相比无退化（容忍度 {args.tolerance:.0%}）", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
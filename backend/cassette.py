@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+上游请求录制/回放模块
+以 requests 传输适配器的形式挂载在 StockService 的会话上：
+录制模式下真实请求上游（腾讯、新浪、东方财富、雪球、同花顺），并把响应和耗时写入磁带目录；
+回放模式下不访问网络，按录制时的耗时（或注入的延迟）返回磁带中的响应，
+使完整的获取链路可以离线、确定性地进行基准测试和回归测试
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from config import get_config
+
+# 获取配置
+config = get_config()
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ('record', 'replay')
+
+# 响应体已由 requests 解压，回放时不能再带这些头
+DROPPED_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length', 'connection'}
+
+
+class CassetteAdapter(HTTPAdapter):
+    """录制/回放上游响应的传输适配器"""
+    
+    def __init__(self, mode: str, cassette_dir: str = None, latency_scale: float = None,
+                 fixed_latency: Optional[float] = None, transport: Optional[HTTPAdapter] = None, **kwargs):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"不支持的磁带模式: {mode}")
+        super().__init__(**kwargs)
+        
+        self.mode = mode
+        self.cassette_dir = cassette_dir or config.CASSETTE_DIR
+        # 录制时实际发送请求的适配器（如模拟服务适配器），默认直接请求上游；磁带仍按原始URL保存
+        self.transport = transport
+        self.latency_scale = config.CASSETTE_LATENCY_SCALE if latency_scale is None else latency_scale
+        self.fixed_latency = config.CASSETTE_FIXED_LATENCY if fixed_latency is None else fixed_latency
+        # 时间戳、随机数等每次请求都不同的参数不参与匹配（新浪行情的 rn 参数在路径中）
+        self._volatile_pattern = re.compile(
+            r'(?<=[/?&])(?:%s)=[^&]*&?' % '|'.join(re.escape(name) for name in config.CASSETTE_VOLATILE_PARAMS)
+        )
+        self._interactions = {}  # 回放时已加载的磁带 {文件路径: 录制内容}
+        self._lock = threading.Lock()
+        
+        # 统计
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+    
+    def _cassette_path(self, request: requests.PreparedRequest) -> str:
+        """请求对应的磁带文件：磁带目录/主机/请求方法和规范化URL的摘要.json"""
+        url = self._volatile_pattern.sub('', request.url).rstrip('?&')
+        digest = hashlib.sha1(f"{request.method} {url}".encode('utf-8')).hexdigest()[:20]
+        host = urlsplit(request.url).hostname or 'unknown'
+        return os.path.join(self.cassette_dir, host, f"{digest}.json")
+    
+    def send(self, request: requests.PreparedRequest, stream: bool = False, timeout=None,
+             verify=True, cert=None, proxies=None) -> requests.Response:
+        if self.mode == 'replay':
+            return self._replay(request, timeout)
+        
+        start_time = time.time()
+        send = self.transport.send if self.transport is not None else super().send
+        response = send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        # 录制需要完整的响应体（流式请求也会读完）
+        content = response.content
+        self._record(request, response, content, time.time() - start_time)
+        return response
+    
+    def _record(self, request: requests.PreparedRequest, response: requests.Response,
+                content: bytes, elapsed: float) -> None:
+        """写入一次请求的响应和耗时"""
+        path = self._cassette_path(request)
+        interaction = {
+            'method': request.method,
+            'url': request.url,
+            'status_code': response.status_code,
+            'reason': response.reason,
+            'headers': {
+                name: value for name, value in response.headers.items()
+                if name.lower() not in DROPPED_HEADERS
+            },
+            'body': base64.b64encode(content).decode('ascii'),
+            'elapsed': round(elapsed, 4),
+            'recorded_time': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(interaction, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, path)
+            self.recorded += 1
+        except Exception as e:
+            logger.error(f"录制上游响应失败 {request.url}: {e}")
+    
+    def _load(self, path: str) -> Optional[Dict[str, Any]]:
+        """读取磁带（回放期间缓存在内存中）"""
+        with self._lock:
+            if path in self._interactions:
+                return self._interactions[path]
+        
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                interaction = json.load(f)
+            interaction['content'] = base64.b64decode(interaction.pop('body'))
+        except FileNotFoundError:
+            interaction = None
+        
+        with self._lock:
+            self._interactions[path] = interaction
+        return interaction
+    
+    def _replay_latency(self, interaction: Dict[str, Any]) -> float:
+        """回放延迟：固定延迟优先，否则为录制时耗时乘以缩放系数"""
+        if self.fixed_latency is not None:
+            return self.fixed_latency
+        return interaction['elapsed'] * self.latency_scale
+    
+    def _read_timeout(self, timeout) -> Optional[float]:
+        """请求的读取超时（timeout 可以是数值或 (连接超时, 读取超时)）"""
+        if isinstance(timeout, tuple):
+            return timeout[1]
+        if isinstance(timeout, (int, float)):
+            return timeout
+        return None
+    
+    def _replay(self, request: requests.PreparedRequest, timeout) -> requests.Response:
+        """
+        回放磁带中的响应
+        磁带中没有该请求时抛出连接错误（与离线时一致）；回放延迟超过请求超时时等待超时后抛出超时异常
+        """
+        interaction = self._load(self._cassette_path(request))
+        if interaction is None:
+            self.misses += 1
+            raise requests.exceptions.ConnectionError(f"磁带中没有该请求: {request.url}", request=request)
+        
+        latency = self._replay_latency(interaction)
+        read_timeout = self._read_timeout(timeout)
+        if read_timeout is not None and latency > read_timeout:
+            time.sleep(read_timeout)
+            raise requests.exceptions.ReadTimeout(f"回放请求超时: {request.url}", request=request)
+        if latency > 0:
+            time.sleep(latency)
+        
+        response = requests.Response()
+        response.status_code = interaction['status_code']
+        response.reason = interaction.get('reason')
+        response.headers = CaseInsensitiveDict(interaction['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = interaction['content']
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = timedelta(seconds=latency)
+        self.replayed += 1
+        return response
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """录制/回放统计"""
+        return {
+            'mode': self.mode,
+            'cassette_dir': self.cassette_dir,
+            'recorded': self.recorded,
+            'replayed': self.replayed,
+            'misses': self.misses
+        }
+
+
+def create_cassette_adapter(**kwargs) -> Optional[CassetteAdapter]:
+    """按配置创建录制/回放适配器；未启用时返回None（使用普通连接池适配器）"""
+    if config.CASSETTE_MODE not in CASSETTE_MODES:
+        return None
+    
+    logger.info(f"上游请求{'录制' if config.CASSETTE_MODE == 'record' else '回放'}已启用，磁带目录 {config.CASSETTE_DIR}")
+    return CassetteAdapter(config.CASSETTE_MODE, **kwargs)
@@ -35,6 +35,93 @@ class Config:
     # 批量查询限制
     MAX_BATCH_SIZE = 20  # 批量查询最大股票数量
     
+    # ROE数据源竞速策略：各数据源的启动延迟（秒）
+    # 0 表示立即并发竞速；大于0表示对冲延迟，到达延迟且仍无有效ROE时才发起请求
+    ROE_SOURCE_HEDGE_DELAYS = {
+        'eastmoney': 0,      # 东方财富财务主表
+        'xueqiu': 0,         # 雪球财务指标
+        '10jqka': 0.3,       # 同花顺财务页面
+        'statements': 0.8,   # 新浪财务摘要计算
+        'eps': 1.2           # 腾讯行情EPS/BPS推算
+    }
+    ROE_RESOLVE_TIMEOUT = 4  # ROE竞速总超时（秒）
+    
+    # 股票快照分层缓存有效期（秒）：按字段变化频率分层，刷新时只重新获取过期的层
+    SNAPSHOT_CACHE_TTLS = {
+        'quote': 10,             # 行情：名称、当前价格、涨跌幅
+        'valuation': 300,        # 估值：市盈率TTM、市净率、总市值
+        'fundamentals': 21600    # 基本面：ROE、行业、股利支付率（季度财报更新）
+    }
+    
+    # 沪深交易日历：交易时段（北京时间，含开盘集合竞价）和休市日期文件
+    # 非交易时段行情类缓存（行情、估值、市场概览）保持有效直到下一次开盘
+    TRADING_SESSIONS = [('09:15', '11:30'), ('13:00', '15:00')]
+    TRADING_CLOSE_GRACE_MINUTES = 5      # 收盘后仍按交易时段处理的宽限时间（分钟）
+    TRADING_HOLIDAYS_FILE = os.path.join(os.path.dirname(__file__), 'trading_holidays.json')
+    
+    # 进程间共享的快照缓存：行情、估值字段层同时写入数据库（snapshot_cache 表），内存中没有或已过期时从中读取，
+    # 多进程部署（gunicorn 多个 worker）时各进程共用后台刷新的结果；单进程的开发服务器不需要
+    SHARED_SNAPSHOT_CACHE_ENABLED = False
+    
+    # 本地基本面库：距上次检查超过该时长、且新财报可能已发布时才到网络刷新（小时）
+    FUNDAMENTALS_RECHECK_HOURS = 24
+    
+    # 关注列表后台刷新：定时汇总所有用户关注的股票，分批提前刷新即将过期的缓存
+    WATCHLIST_REFRESH_ENABLED = True
+    WATCHLIST_REFRESH_INTERVAL = None    # 刷新周期（秒）；None 时为行情缓存有效期减去上一轮耗时，每只股票每个有效期只刷新一次
+    WATCHLIST_REFRESH_MIN_INTERVAL = 1   # 推导出的刷新周期下限（秒）
+    WATCHLIST_REFRESH_BATCH_SIZE = 60    # 每批刷新的股票数
+    # 启用共享快照缓存时只有持有该文件锁的进程执行刷新（持有者退出后由其他进程接替），其他进程从共享缓存读取刷新结果；
+    # 未启用时每个进程各自刷新自己的内存缓存
+    WATCHLIST_REFRESH_LOCK_FILE = os.path.join(os.path.dirname(__file__), 'watchlist_refresher.lock')
+    
+    # A股证券代码表：数据库为空时从本地文件导入，超过刷新间隔后在后台从批量股票列表接口刷新
+    SYMBOL_MASTER_FILE = os.path.join(os.path.dirname(__file__), 'stock_symbols.csv')
+    SYMBOL_MASTER_REFRESH_ENABLED = True  # 是否在后台自动刷新（关闭时只使用已有数据，可通过管理接口手动刷新）
+    SYMBOL_MASTER_REFRESH_HOURS = 24     # 代码表刷新间隔（小时）
+    SYMBOL_MASTER_RETRY_SECONDS = 600    # 刷新失败后的重试间隔（秒）
+    SYMBOL_LISTING_PAGE_SIZE = 100       # 批量股票列表每页条数（各页并发请求）
+    
+    # 网页抓取（新浪财务摘要、同花顺财务页）流式扫描：找到所需字段后停止下载
+    SCRAPE_CHUNK_SIZE = 8192             # 每次读取的字节数
+    SCRAPE_OVERLAP_BYTES = 1024          # 块间重叠字节数（不小于单个字段正则的最大匹配长度）
+    SCRAPE_MAX_BYTES = 2 * 1024 * 1024   # 单个页面最多读取的字节数
+    
+    HTTP_POOL_CONNECTIONS = 10                # 连接池缓存的主机数
+    HTTP_POOL_MAXSIZE = 20                    # 每个主机的最大连接数
+    FETCH_EXECUTOR_WORKERS = HTTP_POOL_MAXSIZE  # 线程池大小与连接池一致，避免线程争抢连接
+    
+    # 上游请求后端：'sync' 使用 requests 连接池；'async' 使用 asyncio + aiohttp 事件循环
+    FETCH_BACKEND = os.environ.get('STOCK_FETCH_BACKEND', 'sync')
+    ASYNC_FETCH_LIMIT = 200              # 异步后端总连接数上限
+    ASYNC_FETCH_LIMIT_PER_HOST = 50      # 异步后端单主机连接数上限
+    ASYNC_FETCH_KEEPALIVE_TIMEOUT = 30   # 长连接保持时间（秒）
+    
+    # 上游请求录制/回放（离线基准测试和回归测试）：'off' 关闭；'record' 真实请求并写入磁带目录；'replay' 只从磁带回放
+    CASSETTE_MODE = os.environ.get('STOCK_CASSETTE_MODE', 'off')
+    CASSETTE_DIR = os.environ.get('STOCK_CASSETTE_DIR') or os.path.join(os.path.dirname(__file__), 'cassettes')
+    CASSETTE_LATENCY_SCALE = float(os.environ.get('STOCK_CASSETTE_LATENCY_SCALE', '1'))  # 回放延迟 = 录制耗时 × 系数（0 不等待）
+    CASSETTE_FIXED_LATENCY = (float(os.environ['STOCK_CASSETTE_FIXED_LATENCY'])
+                              if os.environ.get('STOCK_CASSETTE_FIXED_LATENCY') else None)  # 设置后回放延迟固定为该值（秒）
+    CASSETTE_VOLATILE_PARAMS = ['rn', '_']   # 不参与请求匹配的参数（时间戳、随机数）
+    
+    # 上游行情模拟服务地址（market_simulator.py，本地压测用），设置后所有上游请求改写到该服务；录制/回放启用时不生效
+    UPSTREAM_SIMULATOR_URL = os.environ.get('STOCK_UPSTREAM_SIMULATOR', '')
+    
+    CIRCUIT_BREAKER_WINDOW = 20          # 滚动窗口请求数
+    CIRCUIT_BREAKER_MIN_REQUESTS = 5     # 窗口内至少多少次请求才判断是否熔断
+    CIRCUIT_BREAKER_ERROR_RATE = 0.5     # 错误率达到该比例时打开熔断
+    CIRCUIT_BREAKER_OPEN_SECONDS = 30    # 熔断打开持续时间（秒），之后进入半开状态探测
+    
+    # 上游自适应超时配置（按主机延迟直方图的高分位推导）
+    UPSTREAM_DEFAULT_TIMEOUT = 2         # 未指定超时时的默认值（秒）
+    UPSTREAM_LATENCY_WINDOW = 500        # 延迟直方图保留的最近样本数
+    UPSTREAM_TIMEOUT_MIN_SAMPLES = 20    # 样本数达到后才启用自适应超时
+    UPSTREAM_TIMEOUT_PERCENTILE = 99     # 用于推导超时的延迟分位
+    UPSTREAM_TIMEOUT_MULTIPLIER = 1.5    # 分位延迟的放大系数
+    UPSTREAM_TIMEOUT_FLOOR = 0.5         # 超时下限（秒）
+    UPSTREAM_TIMEOUT_CEILING = 15        # 超时上限（秒）
+    
     # 股票代码验证
     STOCK_CODE_LENGTH = 6
     
@@ -43,6 +130,23 @@ class Config:
     
     # 搜索结果限制
     MAX_SEARCH_RESULTS = 20
+    SEARCH_PREFETCH_TOP_N = 3  # 轻量搜索后在后台预取完整数据的前几条结果
+    SUGGEST_DEFAULT_RESULTS = 8  # 联想输入默认返回条数
+    SUGGEST_MAX_RESULTS = 10     # 联想输入最多返回条数（索引中每个键预先保留的结果数）
+    
+    # 响应压缩：超过该大小（字节）的JSON响应按 Accept-Encoding 协商 brotli / gzip 压缩
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_GZIP_LEVEL = 6              # gzip 压缩级别（1-9）
+    COMPRESS_BROTLI_QUALITY = 4          # brotli 压缩质量（0-11，安装 brotli 时使用）
+    RESPONSE_CACHE_MAX_ENTRIES = 1000    # 按ETag缓存的序列化响应体最大条数
+    
+    # 分段计时：API响应附带 Server-Timing 头（各阶段和上游请求的耗时，头中包含上游主机名，
+    # 会暴露上游数据源，默认只在开发环境开启）
+    SERVER_TIMING_ENABLED = False
+    REQUEST_TRACE_MAX_ENTRIES = 2000     # 单个请求最多保留的计时记录数（批量查询每只股票约15条）
+    
+    # Prometheus 指标：/metrics 接口（请求、上游、缓存、线程池、数据库写入等累计指标）
+    METRICS_ENABLED = True
     
     # 日志配置
     LOG_LEVEL = 'INFO'
@@ -96,15 +200,19 @@ class DevelopmentConfig(Config):
     """开发环境配置"""
     DEBUG = True
     LOG_LEVEL = 'DEBUG'
+    SERVER_TIMING_ENABLED = True
     
 class ProductionConfig(Config):
     """生产环境配置"""
     DEBUG = False
     LOG_LEVEL = 'WARNING'
+    SHARED_SNAPSHOT_CACHE_ENABLED = True  # 生产环境使用 gunicorn 多个 worker 部署
     
 class TestingConfig(Config):
     """测试环境配置"""
     TESTING = True
+    WATCHLIST_REFRESH_ENABLED = False  # 测试环境不启动后台刷新
+    SYMBOL_MASTER_REFRESH_ENABLED = False  # 测试环境不从网络刷新证券代码表
     DATABASE_PATH = ':memory:'  # 使用内存数据库进行测试
     
 # 配置字典
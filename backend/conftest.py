@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""
+pytest 公共配置
+离线单元测试使用测试配置（TestingConfig）和临时数据库，避免写入 stock_data.db
+
+test_api.py、test_auth_flow.py 等脚本需要先启动服务（python run.py），单独运行
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault('FLASK_ENV', 'testing')
+
+from config import get_config
+
+# 测试期间的临时目录（解释器退出时删除）
+_test_dir = tempfile.TemporaryDirectory(prefix='stock-test-')
+
+config = get_config()
+config.DATABASE_PATH = os.path.join(_test_dir.name, 'stock_data.db')
+config.LOG_FILE = os.path.join(_test_dir.name, 'stock_api.log')
@@ -5,14 +5,32 @@
 """
 
 import sqlite3
+import json
 import logging
+import time
 from datetime import datetime
+from functools import wraps
 from config import get_config
+import metrics
 
 # 获取配置
 config = get_config()
 logger = logging.getLogger(__name__)
 
+def timed_write(f):
+    """记录写操作耗时（含打开连接和提交）的装饰器，按方法名计入 SQLite 写入延迟指标"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        start_time = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = f(*args, **kwargs)
+            outcome = 'ok'
+            return result
+        finally:
+            metrics.db_write_duration.observe(time.perf_counter() - start_time, f.__name__, outcome)
+    return decorated_function
+
 class DatabaseManager:
     """数据库管理器"""
     
@@ -149,6 +167,41 @@ class DatabaseManager:
                 )
             ''')
             
+            # 创建基本面数据表（每只股票保存最新一期财报对应的基本面数据）
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS fundamentals (
+                    stock_code TEXT PRIMARY KEY,
+                    roe REAL,
+                    industry TEXT DEFAULT '',
+                    dividend_ratio REAL,
+                    total_shares REAL,
+                    report_date TEXT,
+                    checked_time TIMESTAMP
+                )
+            ''')
+            
+            # 创建共享快照缓存表（行情、估值字段层，多进程部署时各进程共用）
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS snapshot_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    ttl REAL NOT NULL
+                )
+            ''')
+            
+            # 创建证券代码表（全部上市A股）
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS symbols (
+                    code TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    exchange TEXT NOT NULL,
+                    pinyin_initials TEXT DEFAULT '',
+                    industry TEXT DEFAULT '',
+                    updated_time TIMESTAMP
+                )
+            ''')
+            
             conn.commit()
             conn.close()
             logger.info("数据库初始化完成")
@@ -157,6 +210,7 @@ class DatabaseManager:
             logger.error(f"数据库初始化失败: {str(e)}")
             raise
     
+    @timed_write
     def add_to_watchlist(self, stock_code, stock_name, industry='', user_id=1):
         """添加股票到关注列表"""
         conn = None
@@ -185,6 +239,7 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
+    @timed_write
     def remove_from_watchlist(self, stock_code, user_id=1):
         """从关注列表删除股票"""
         conn = None
@@ -246,6 +301,28 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
+    def get_watched_stock_codes(self):
+        """获取所有用户关注列表中的股票代码（去重）"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT DISTINCT stock_code
+                FROM watchlist
+                ORDER BY stock_code
+            ''')
+            
+            return [row['stock_code'] for row in cursor.fetchall()]
+            
+        except Exception as e:
+            logger.error(f"获取关注股票代码失败: {str(e)}")
+            raise
+        finally:
+            if conn:
+                conn.close()
+    
     def is_in_watchlist(self, stock_code, user_id=1):
         """检查股票是否在关注列表中"""
         conn = None
@@ -265,6 +342,7 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
+    @timed_write
     def toggle_pin_stock(self, stock_code, user_id=1):
         """切换股票置顶状态"""
         conn = None
@@ -308,6 +386,7 @@ class DatabaseManager:
 
     # ==================== 用户管理方法 ====================
     
+    @timed_write
     def create_user(self, username, email, password_hash):
         """创建新用户"""
         conn = None
@@ -411,6 +490,7 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
+    @timed_write
     def update_last_login(self, user_id):
         """更新用户最后登录时间"""
         conn = None
@@ -438,6 +518,7 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
+    @timed_write
     def update_watchlist_item(self, stock_code, stock_name=None, industry=None):
         """更新关注列表项信息"""
         conn = None
@@ -488,6 +569,217 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
+    # ==================== 基本面数据方法 ====================
+    
+    def get_fundamentals(self, stock_code):
+        """获取本地保存的股票基本面数据"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT stock_code, roe, industry, dividend_ratio, total_shares,
+                       report_date, checked_time
+                FROM fundamentals
+                WHERE stock_code = ?
+            ''', (stock_code,))
+            
+            result = cursor.fetchone()
+            
+            if result:
+                return {
+                    'code': result['stock_code'],
+                    'roe': result['roe'],
+                    'industry': result['industry'],
+                    'dividend_ratio': result['dividend_ratio'],
+                    'total_shares': result['total_shares'],
+                    'report_date': result['report_date'],
+                    'checked_time': result['checked_time']
+                }
+            return None
+            
+        except Exception as e:
+            logger.error(f"获取基本面数据失败: {str(e)}")
+            raise
+        finally:
+            if conn:
+                conn.close()
+    
+    @timed_write
+    def save_fundamentals(self, stock_code, roe, industry, dividend_ratio, total_shares=None, report_date=None):
+        """保存股票基本面数据（覆盖旧数据），同时记录本次检查时间"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            cursor.execute('''
+                INSERT OR REPLACE INTO fundamentals
+                (stock_code, roe, industry, dividend_ratio, total_shares, report_date, checked_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (stock_code, roe, industry, dividend_ratio, total_shares, report_date, now))
+            
+            conn.commit()
+            logger.info(f"股票 {stock_code} 基本面数据保存成功（报告期 {report_date}）")
+            return True
+            
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            logger.error(f"保存基本面数据失败: {str(e)}")
+            raise
+        finally:
+            if conn:
+                conn.close()
+    
+    # ==================== 共享快照缓存方法 ====================
+    
+    def get_snapshot_cache(self, cache_keys):
+        """读取共享快照缓存项 {缓存键: {'data': 数据, 'fetched_at': 获取时间戳, 'ttl': 有效期(秒)}}（不检查是否过期）"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            placeholders = ','.join('?' * len(cache_keys))
+            cursor.execute(f'''
+                SELECT cache_key, data, fetched_at, ttl
+                FROM snapshot_cache
+                WHERE cache_key IN ({placeholders})
+            ''', list(cache_keys))
+            
+            return {
+                row['cache_key']: {
+                    'data': json.loads(row['data']),
+                    'fetched_at': row['fetched_at'],
+                    'ttl': row['ttl']
+                }
+                for row in cursor.fetchall()
+            }
+            
+        except Exception as e:
+            logger.error(f"读取共享快照缓存失败: {str(e)}")
+            raise
+        finally:
+            if conn:
+                conn.close()
+    
+    @timed_write
+    def save_snapshot_cache(self, cache_key, data, fetched_at, ttl):
+        """保存共享快照缓存项（覆盖旧数据）"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT OR REPLACE INTO snapshot_cache (cache_key, data, fetched_at, ttl)
+                VALUES (?, ?, ?, ?)
+            ''', (cache_key, json.dumps(data, ensure_ascii=False), fetched_at, ttl))
+            
+            conn.commit()
+            return True
+            
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            logger.error(f"保存共享快照缓存失败: {str(e)}")
+            raise
+        finally:
+            if conn:
+                conn.close()
+    
+    @timed_write
+    def clear_snapshot_cache(self):
+        """清空共享快照缓存，返回删除的条数"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('DELETE FROM snapshot_cache')
+            deleted_count = cursor.rowcount
+            
+            conn.commit()
+            return deleted_count
+            
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            logger.error(f"清空共享快照缓存失败: {str(e)}")
+            raise
+        finally:
+            if conn:
+                conn.close()
+    
+    # ==================== 证券代码表方法 ====================
+    
+    def get_symbols(self):
+        """获取全部证券代码"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT code, name, exchange, pinyin_initials, industry, updated_time
+                FROM symbols
+            ''')
+            
+            return [
+                {
+                    'code': row['code'],
+                    'name': row['name'],
+                    'exchange': row['exchange'],
+                    'pinyin': row['pinyin_initials'] or '',
+                    'industry': row['industry'] or '',
+                    'updated_time': row['updated_time']
+                }
+                for row in cursor.fetchall()
+            ]
+            
+        except Exception as e:
+            logger.error(f"获取证券代码表失败: {str(e)}")
+            raise
+        finally:
+            if conn:
+                conn.close()
+    
+    @timed_write
+    def replace_symbols(self, symbols):
+        """用完整列表替换证券代码表（单个事务内完成）"""
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            cursor.execute('DELETE FROM symbols')
+            cursor.executemany('''
+                INSERT OR REPLACE INTO symbols (code, name, exchange, pinyin_initials, industry, updated_time)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (symbol['code'], symbol['name'], symbol['exchange'], symbol.get('pinyin', ''),
+                 symbol.get('industry', ''), now)
+                for symbol in symbols
+            ])
+            
+            conn.commit()
+            logger.info(f"证券代码表更新成功，共 {len(symbols)} 条")
+            return len(symbols)
+            
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            logger.error(f"更新证券代码表失败: {str(e)}")
+            raise
+        finally:
+            if conn:
+                conn.close()
+    
+    @timed_write
     def log_api_call(self, endpoint, method, ip_address=None, user_agent=None, 
                      response_code=None, response_time_ms=None, error_message=None):
         """记录API调用日志"""
@@ -556,6 +848,7 @@ class DatabaseManager:
             if conn:
                 conn.close()
     
+    @timed_write
     def cleanup_old_logs(self, days=30):
         """清理旧的API日志"""
         conn = None
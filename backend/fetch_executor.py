@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+进程级上游请求线程池
+所有上游数据获取任务共享一个有界线程池（大小与HTTP连接池一致），
+按优先级调度：交互式详情请求 > 批量/关注列表 > 后台预取
+"""
+
+import concurrent.futures
+import contextvars
+import itertools
+import logging
+import queue
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from config import get_config
+
+# 获取配置
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# 优先级（数值越小越先执行）
+PRIORITY_INTERACTIVE = 0  # 交互式请求（股票详情等）
+PRIORITY_BATCH = 1        # 批量查询、关注列表
+PRIORITY_BACKGROUND = 2   # 后台预取、定时刷新
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_BATCH: 'batch',
+    PRIORITY_BACKGROUND: 'background'
+}
+
+
+class _FetchTask:
+    """线程池中的单个任务"""
+    
+    def __init__(self, func, args, kwargs, priority: int):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.context = contextvars.copy_context()  # 提交时的上下文（请求级计时记录等随任务传递）
+        self.future = concurrent.futures.Future()
+        self.submitted_at = time.time()
+        self.claimed = False
+
+
+class PriorityFetchExecutor:
+    """
+    带优先级的有界线程池
+    
+    - 任务默认继承提交线程当前任务的优先级（交互式请求内部提交的子任务仍是交互式）
+    - 任务在提交时的上下文（contextvars）中执行
+    - 等待结果时如果任务尚未开始，由等待线程直接执行，嵌套提交不会因线程池占满而死锁
+    - 导出各优先级的队列深度和排队等待时间
+    """
+    
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or config.FETCH_EXECUTOR_WORKERS
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._active_workers = 0
+        self._queued = {priority: 0 for priority in PRIORITY_NAMES}
+        self._wait_stats = {
+            priority: {'count': 0, 'total_wait': 0.0, 'max_wait': 0.0, 'inline_runs': 0}
+            for priority in PRIORITY_NAMES
+        }
+        
+        for i in range(self.max_workers):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f'fetch-executor-{i}',
+                daemon=True
+            )
+            worker.start()
+    
+    def current_priority(self) -> int:
+        """当前线程正在执行的任务优先级（非线程池线程为交互式）"""
+        return getattr(self._local, 'priority', PRIORITY_INTERACTIVE)
+    
+    def submit(self, func, *args, priority: Optional[int] = None, **kwargs) -> concurrent.futures.Future:
+        """提交任务，未指定优先级时继承当前任务的优先级"""
+        if priority is None:
+            priority = self.current_priority()
+        
+        task = _FetchTask(func, args, kwargs, priority)
+        task.future._fetch_task = task
+        with self._lock:
+            self._queued[priority] += 1
+        self._queue.put((priority, next(self._sequence), task))
+        return task.future
+    
+    def result(self, future: concurrent.futures.Future, timeout: Optional[float] = None) -> Any:
+        """等待任务结果；任务尚未开始时由当前线程直接执行（timeout 已用完时不再执行，直接超时）"""
+        if timeout is None or timeout > 0:
+            self.run_inline(future)
+        return future.result(timeout=timeout)
+    
+    def run_inline(self, future: concurrent.futures.Future) -> bool:
+        """如果任务尚未被工作线程认领，在当前线程执行它，返回是否执行"""
+        task = getattr(future, '_fetch_task', None)
+        if task is None or not self._claim(task):
+            return False
+        
+        with self._lock:
+            self._wait_stats[task.priority]['inline_runs'] += 1
+        self._execute(task)
+        return True
+    
+    def _claim(self, task: _FetchTask) -> bool:
+        """认领任务（工作线程和等待结果的线程只有一方能执行），已取消的任务返回False"""
+        with self._lock:
+            if task.claimed:
+                return False
+            task.claimed = True
+            self._queued[task.priority] -= 1
+        return task.future.set_running_or_notify_cancel()
+    
+    def _worker_loop(self) -> None:
+        """工作线程：按优先级取出任务执行"""
+        while True:
+            _, _, task = self._queue.get()
+            if not self._claim(task):
+                # 已被等待线程执行或已取消
+                continue
+            
+            wait_time = time.time() - task.submitted_at
+            with self._lock:
+                self._active_workers += 1
+                stats = self._wait_stats[task.priority]
+                stats['count'] += 1
+                stats['total_wait'] += wait_time
+                stats['max_wait'] = max(stats['max_wait'], wait_time)
+            try:
+                self._execute(task)
+            finally:
+                with self._lock:
+                    self._active_workers -= 1
+    
+    def _execute(self, task: _FetchTask) -> None:
+        """执行任务并设置结果，执行期间当前线程继承任务优先级"""
+        previous_priority = getattr(self._local, 'priority', None)
+        self._local.priority = task.priority
+        try:
+            task.future.set_result(task.context.run(task.func, *task.args, **task.kwargs))
+        except BaseException as e:
+            task.future.set_exception(e)
+        finally:
+            if previous_priority is None:
+                del self._local.priority
+            else:
+                self._local.priority = previous_priority
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """线程池统计：活跃线程数、各优先级队列深度和排队等待时间"""
+        with self._lock:
+            priorities = {}
+            for priority, name in PRIORITY_NAMES.items():
+                stats = self._wait_stats[priority]
+                priorities[name] = {
+                    'queue_depth': self._queued[priority],
+                    'started': stats['count'],
+                    'inline_runs': stats['inline_runs'],
+                    'avg_wait_ms': round(stats['total_wait'] / stats['count'] * 1000, 1) if stats['count'] else 0,
+                    'max_wait_ms': round(stats['max_wait'] * 1000, 1)
+                }
+            
+            return {
+                'max_workers': self.max_workers,
+                'active_workers': self._active_workers,
+                'queue_depth': sum(self._queued.values()),
+                'priorities': priorities
+            }
+
+
+# 创建全局线程池实例
+fetch_executor = PriorityFetchExecutor()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+网页流式扫描模块
+逐块读取上游网页响应，用预编译的字节正则直接在原始字节上查找所需字段，全部找到后立即停止下载；
+扫描时只保留当前数据块和块间重叠部分，内存占用与页面大小无关，也不需要把整页解码为字符串
+"""
+
+import logging
+import re
+from typing import Callable, Dict, Iterable, Optional, Pattern
+
+from config import get_config
+
+# 获取配置
+config = get_config()
+logger = logging.getLogger(__name__)
+
+
+def compile_gbk(pattern: str) -> Pattern[bytes]:
+    """
+    将正则编译为匹配GBK编码字节的模式（新浪、同花顺等页面为GBK编码）
+    
+    模式中的量词应有上限，单次匹配的最大长度不能超过 SCRAPE_OVERLAP_BYTES，
+    否则跨越数据块边界的匹配可能被遗漏。
+    """
+    return re.compile(pattern.encode('gbk'))
+
+
+def decode_gbk(value: bytes) -> str:
+    """将匹配到的GBK字节解码为字符串"""
+    return value.decode('gbk', errors='ignore')
+
+
+def scan_stream(chunks: Iterable[bytes], patterns: Dict[str, Pattern[bytes]],
+                stop: Optional[Callable[[Dict[str, bytes]], bool]] = None,
+                overlap: int = None, max_bytes: int = None) -> Dict[str, bytes]:
+    """
+    逐块扫描响应体，查找每个模式在整个页面中的第一次匹配
+    
+    每个数据块与上一块末尾 overlap 字节拼接后搜索；起点落在末尾 overlap 字节内的匹配可能不完整，
+    留到下一块（或页面结束时）再确认，因此结果与对整页执行 re.search 一致。
+    
+    Args:
+        chunks: 响应体数据块（如 response.iter_content()）
+        patterns: {字段名: 预编译的字节正则}，取第1个分组
+        stop: 可选的提前结束条件，参数为当前已匹配的结果，返回True时停止读取
+        overlap: 块间重叠字节数，默认 SCRAPE_OVERLAP_BYTES
+        max_bytes: 最多读取的字节数，默认 SCRAPE_MAX_BYTES
+    
+    Returns:
+        {字段名: 匹配到的字节}，未匹配的字段不在结果中
+    """
+    overlap = overlap or config.SCRAPE_OVERLAP_BYTES
+    max_bytes = max_bytes or config.SCRAPE_MAX_BYTES
+    matches = {}
+    buffer = b''
+    total_bytes = 0
+    
+    for chunk in chunks:
+        if not chunk:
+            continue
+        total_bytes += len(chunk)
+        buffer += chunk
+        
+        _search_buffer(buffer, patterns, matches, len(buffer) - overlap)
+        if len(matches) == len(patterns) or (stop and stop(matches)):
+            return matches
+        
+        if total_bytes >= max_bytes:
+            logger.warning(f"网页超过 {max_bytes} 字节仍未找到全部字段，停止读取")
+            break
+        buffer = buffer[-overlap:]
+    
+    # 页面结束：末尾重叠部分中的匹配也已完整
+    _search_buffer(buffer, patterns, matches, len(buffer))
+    return matches
+
+
+def _search_buffer(buffer: bytes, patterns: Dict[str, Pattern[bytes]], matches: Dict[str, bytes],
+                   limit: int) -> None:
+    """在缓冲区中查找尚未匹配的模式，只接受起点在 limit 之前的匹配"""
+    for name, pattern in patterns.items():
+        if name in matches:
+            continue
+        match = pattern.search(buffer)
+        if match and match.start() < limit:
+            matches[name] = match.group(1)
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP条件请求与响应压缩模块
+按缓存项版本生成的强ETag（StockService.get_cache_validator）处理条件请求，客户端缓存仍有效时返回 304 Not Modified；
+较大的JSON响应按 Accept-Encoding 协商 brotli / gzip 压缩；
+序列化后的响应体（及其压缩结果）按强ETag缓存，缓存命中时直接写出字节
+"""
+
+import gzip
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Any, Optional
+
+from flask import Response
+from werkzeug.http import http_date
+
+import metrics
+from config import get_config
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只使用 gzip
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库 json 序列化
+    orjson = None
+
+# 获取配置
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# 按优先顺序排列的可用压缩编码
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+class ResponseBodyCache:
+    """
+    按强ETag缓存序列化后的响应体
+    
+    强ETag相同即响应体逐字节相同，命中时无需重新组装数据和序列化；压缩结果在首次需要时生成并一并保存。
+    缓存项刷新后ETag随版本号变化，旧的响应体不会再被命中，按最近最少使用淘汰。
+    """
+    
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or config.RESPONSE_CACHE_MAX_ENTRIES
+        self._bodies = OrderedDict()  # ETag -> {编码: 响应体}，未压缩的响应体编码为 'identity'
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, etag: str) -> Optional[bytes]:
+        """读取未压缩的响应体，未缓存时返回None"""
+        with self._lock:
+            variants = self._bodies.get(etag)
+            if variants is None:
+                self.misses += 1
+                metrics.cache_misses.inc('response_body')
+                return None
+            self._bodies.move_to_end(etag)
+            self.hits += 1
+            metrics.cache_hits.inc('response_body')
+            return variants['identity']
+    
+    def get_encoded(self, etag: str, encoding: str) -> Optional[bytes]:
+        """读取压缩后的响应体（首次读取时压缩并保存），未缓存时返回None"""
+        with self._lock:
+            variants = self._bodies.get(etag)
+            if variants is None:
+                return None
+            body = variants.get(encoding)
+            identity = variants['identity']
+        
+        if body is None:
+            # 在锁外压缩，并发请求最多重复压缩一次
+            body = compress_body(identity, encoding)
+            with self._lock:
+                variants[encoding] = body
+        return body
+    
+    def put(self, etag: str, body: bytes) -> None:
+        """保存未压缩的响应体"""
+        with self._lock:
+            self._bodies[etag] = {'identity': body}
+            self._bodies.move_to_end(etag)
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+                self.evictions += 1
+                metrics.cache_evictions.inc('response_body')
+    
+    def clear(self) -> None:
+        """清空响应体缓存"""
+        with self._lock:
+            self.evictions += len(self._bodies)
+            metrics.cache_evictions.inc('response_body', amount=len(self._bodies))
+            self._bodies.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """响应体缓存统计"""
+        with self._lock:
+            entries = len(self._bodies)
+            total_bytes = sum(len(body) for variants in self._bodies.values() for body in variants.values())
+        
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'total_bytes': total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups * 100, 2) if lookups else 0,
+            'json_encoder': 'orjson' if orjson is not None else 'json'
+        }
+
+
+def _json_default(value: Any) -> Any:
+    """序列化标准类型以外的值：numpy 数值转为Python数值，日期与 Flask jsonify 一致使用 HTTP-date 格式"""
+    if hasattr(value, 'item'):
+        return value.item()
+    if isinstance(value, date):
+        return http_date(value)
+    return str(value)
+
+
+# 与 jsonify 输出一致：键按字母排序，日期交给 _json_default 处理（orjson 默认输出 RFC 3339）
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson is not None else 0
+
+
+def dumps_json(payload: Any) -> bytes:
+    """将响应数据序列化为UTF-8编码的JSON字节（优先使用 orjson，键顺序和日期格式与 jsonify 一致）"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload, default=_json_default, option=ORJSON_OPTIONS)
+        except TypeError:
+            # 超出 orjson 支持范围的值（如超过64位的整数）交给标准库处理
+            pass
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'), sort_keys=True, default=_json_default).encode('utf-8')
+
+
+def json_response(payload: Any, validator: Optional[Dict[str, Any]] = None) -> Response:
+    """
+    创建JSON响应
+    带校验信息时同时按ETag缓存序列化后的响应体，后续请求由 cached_response 直接写出；
+    校验信息必须由组装 payload 时实际使用的缓存项生成（StockService.make_cache_validator），
+    否则缓存的响应体可能与ETag对应的版本不一致
+    """
+    body = dumps_json(payload)
+    if validator is not None:
+        response_body_cache.put(validator['etag'], body)
+    return apply_validator(Response(body, mimetype='application/json'), validator)
+
+
+def cached_response(request, validator: Optional[Dict[str, Any]]) -> Optional[Response]:
+    """
+    由缓存直接得到的响应：客户端缓存仍有效时为 304，已缓存序列化响应体时直接写出字节；
+    两者都未命中时返回None，由调用方组装数据
+    """
+    if validator is None:
+        return None
+    
+    not_modified = not_modified_response(request, validator)
+    if not_modified is not None:
+        return not_modified
+    
+    body = response_body_cache.get(validator['etag'])
+    if body is None:
+        return None
+    # 压缩由 after_request 钩子（compress_response）使用已缓存的压缩结果完成
+    return apply_validator(Response(body, mimetype='application/json'), validator)
+
+
+def not_modified_response(request, validator: Optional[Dict[str, Any]]) -> Optional[Response]:
+    """
+    客户端缓存的表示仍是最新时返回 304 响应，否则返回None
+    
+    压缩后的响应使用带编码后缀的ETag（同一数据的不同编码是不同的表示），
+    因此 If-None-Match 与任一编码的ETag相同都视为未修改。
+    """
+    if validator is None or not request.if_none_match:
+        return None
+    
+    etag = validator['etag']
+    for candidate in (etag,) + tuple(f"{etag}-{encoding}" for encoding in SUPPORTED_ENCODINGS):
+        if request.if_none_match.contains(candidate):
+            response = Response(status=304)
+            response.set_etag(candidate)
+            response.last_modified = validator['last_modified']
+            response.vary.add('Accept-Encoding')
+            return response
+    return None
+
+
+def apply_validator(response: Response, validator: Optional[Dict[str, Any]]) -> Response:
+    """为响应设置ETag和Last-Modified"""
+    if validator is not None:
+        response.set_etag(validator['etag'])
+        response.last_modified = validator['last_modified']
+    return response
+
+
+def negotiate_encoding(request) -> Optional[str]:
+    """按客户端 Accept-Encoding 选择压缩编码，客户端不接受压缩时返回None"""
+    accepted = request.accept_encodings
+    for encoding in SUPPORTED_ENCODINGS:
+        if accepted[encoding] > 0:
+            return encoding
+    return None
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    """按指定编码压缩响应体"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=config.COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=config.COMPRESS_GZIP_LEVEL)
+
+
+def compress_response(request, response: Response) -> Response:
+    """
+    压缩较大的JSON响应（after_request 钩子中调用）
+    只处理 200 的JSON响应，小于 COMPRESS_MIN_SIZE 字节的响应不压缩
+    """
+    if response.mimetype != 'application/json':
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    
+    encoding = negotiate_encoding(request)
+    if encoding is None:
+        return response
+    
+    body = response.get_data()
+    if len(body) < config.COMPRESS_MIN_SIZE:
+        return response
+    
+    etag, weak = response.get_etag()
+    try:
+        # 强ETag对应的响应体已缓存时复用缓存的压缩结果
+        compressed = response_body_cache.get_encoded(etag, encoding) if etag and not weak else None
+        response.set_data(compressed if compressed is not None else compress_body(body, encoding))
+    except Exception as e:
+        logger.error(f"压缩响应失败: {e}")
+        return response
+    
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+
+# 创建全局响应体缓存实例
+response_body_cache = ResponseBodyCache()
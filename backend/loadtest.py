@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API压力测试脚本
+按场景模拟多个并发用户请求 /api/stocks/<code>、/api/stocks/batch、/api/watchlist 等接口，
+请求经过完整的装饰器链（rate_limit、log_api_call、token_required）和 after_request 压缩，
+按接口统计每秒请求数、延迟直方图和分位数、状态码及错误码分布
+
+默认在同一进程中创建应用，上游为本地行情模拟服务（market_simulator.py），数据库和日志使用临时文件；
+每个虚拟用户使用不同的客户端IP，限流按用户生效。指定 --url 时通过HTTP压测已启动的服务。
+
+用法:
+    python loadtest.py --scenario mixed_read --users 50 --duration 30
+    python loadtest.py --scenario watchlist_polling --users 200 --think-ms 2000
+    python loadtest.py --scenario batch_burst --users 20 --rate-limit 100000 --output result.json
+    python loadtest.py --url http://127.0.0.1:5000 --scenario mixed_read
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, List, Optional, Callable, NamedTuple
+
+import requests
+
+from config import get_config
+from market_simulator import MarketSimulator, MarketUniverse, LatencyProfile, start_simulator
+
+# 获取配置
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# 延迟直方图的桶上限（毫秒）
+HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+LOADTEST_PASSWORD = 'loadtest-password'
+
+
+class Request(NamedTuple):
+    """一次请求：endpoint 为统计用的接口名（路径模板）"""
+    endpoint: str
+    method: str
+    path: str
+    json: Optional[Dict[str, Any]] = None
+
+
+class Scenario(NamedTuple):
+    """压测场景：按权重随机选择的请求，以及每次请求后的思考时间"""
+    description: str
+    steps: List[tuple]          # [(权重, 生成请求的函数(user) -> Request)]
+    think_ms: float             # 默认思考时间（毫秒），实际在 0.5～1.5 倍之间随机
+    login: bool = False         # 是否需要注册登录并建立关注列表
+
+
+class InProcessTransport:
+    """通过 Flask 测试客户端在同一进程中调用应用（完整的WSGI请求处理）"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    def client(self, index: int):
+        # 每个虚拟用户使用不同的客户端IP（限流按IP计数）
+        return self.app.test_client(), {'REMOTE_ADDR': f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"}
+    
+    def send(self, client, request: Request, headers: Dict[str, str]):
+        test_client, environ = client
+        response = test_client.open(request.path, method=request.method, json=request.json,
+                                    headers=headers, environ_base=environ)
+        return response.status_code, response.headers, response.get_data()
+
+
+class HttpTransport:
+    """通过HTTP请求已启动的服务"""
+    
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+    
+    def client(self, index: int):
+        return requests.Session()
+    
+    def send(self, client, request: Request, headers: Dict[str, str]):
+        response = client.request(request.method, f"{self.base_url}{request.path}", json=request.json,
+                                  headers=headers, timeout=60)
+        return response.status_code, response.headers, response.content
+
+
+class VirtualUser:
+    """虚拟用户的会话状态"""
+    
+    def __init__(self, index: int, transport, codes: List[str], weights: List[float], seed: int):
+        self.index = index
+        self.transport = transport
+        self.client = transport.client(index)
+        self.rng = random.Random(seed * 100003 + index)
+        self.codes = codes
+        self.weights = weights
+        self.token = None
+        self.etags = {}  # 路径 -> 上次响应的ETag（轮询时带 If-None-Match）
+    
+    def pick_code(self) -> str:
+        """按 Zipf 分布选择股票（少数热门股票占大部分请求）"""
+        return self.rng.choices(self.codes, self.weights)[0]
+    
+    def send(self, request: Request, conditional: bool = False):
+        headers = {'Accept-Encoding': 'gzip, br'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        if conditional and request.path in self.etags:
+            headers['If-None-Match'] = self.etags[request.path]
+        status, response_headers, body = self.transport.send(self.client, request, headers)
+        if response_headers.get('ETag'):
+            self.etags[request.path] = response_headers['ETag']
+        return status, body
+    
+    def login(self, run_id: str, watchlist_size: int) -> None:
+        """注册用户并添加关注股票"""
+        username = f"lt{run_id}u{self.index}"
+        status, body = self.send(Request('setup', 'POST', '/api/auth/register', {
+            'username': username, 'email': f"{username}@loadtest.local", 'password': LOADTEST_PASSWORD
+        }))
+        if status != 200:
+            raise RuntimeError(f"注册压测用户失败 {username}: {status} {body[:200]!r}")
+        self.token = json.loads(body)['data']['token']
+        for code in self.rng.sample(self.codes, min(watchlist_size, len(self.codes))):
+            self.send(Request('setup', 'POST', '/api/watchlist', {'code': code}))
+
+
+# ==================== 场景 ====================
+
+def stock_detail(user: VirtualUser) -> Request:
+    return Request('GET /api/stocks/<code>', 'GET', f"/api/stocks/{user.pick_code()}")
+
+
+def stock_history(user: VirtualUser) -> Request:
+    period = user.rng.choice(['1m', '3m', '1y'])
+    return Request('GET /api/stocks/<code>/history', 'GET', f"/api/stocks/{user.pick_code()}/history?period={period}")
+
+
+def market_overview(user: VirtualUser) -> Request:
+    return Request('GET /api/market/overview', 'GET', '/api/market/overview')
+
+
+def stock_batch(user: VirtualUser) -> Request:
+    codes = list({user.pick_code() for _ in range(20)})
+    return Request('POST /api/stocks/batch', 'POST', '/api/stocks/batch', {'codes': codes})
+
+
+def watchlist(user: VirtualUser) -> Request:
+    return Request('GET /api/watchlist', 'GET', '/api/watchlist')
+
+
+SCENARIOS = {
+    'mixed_read': Scenario('个股详情、历史数据和市场概览的混合读取',
+                           [(60, stock_detail), (25, stock_history), (15, market_overview)], think_ms=1500),
+    'watchlist_polling': Scenario('登录用户关注若干股票后定时轮询关注列表（带 If-None-Match），偶尔查看个股',
+                                  [(90, watchlist), (10, stock_detail)], think_ms=5000, login=True),
+    'batch_burst': Scenario('无间隔的批量查询（每次最多20只）', [(100, stock_batch)], think_ms=0)
+}
+
+# 轮询类请求带 If-None-Match
+CONDITIONAL_ENDPOINTS = {'GET /api/watchlist', 'GET /api/market/overview'}
+
+
+# ==================== 统计 ====================
+
+class EndpointStats:
+    """单个接口的统计"""
+    
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = Counter()
+    
+    def record(self, latency: float, status: Optional[int], error: Optional[str]) -> None:
+        self.latencies.append(latency)
+        self.statuses[str(status) if status is not None else 'exception'] += 1
+        if error:
+            self.errors[error] += 1
+    
+    def summary(self, duration: float) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        count = len(ordered)
+        
+        def pct(value: float) -> float:
+            return round(ordered[min(count - 1, int(count * value / 100))] * 1000, 2) if count else 0.0
+        
+        histogram = Counter()
+        for latency in ordered:
+            bucket = next((f"<={bound}ms" for bound in HISTOGRAM_BUCKETS_MS if latency * 1000 <= bound), '+Inf')
+            histogram[bucket] += 1
+        return {
+            'requests': count,
+            'rps': round(count / duration, 2),
+            'p50_ms': pct(50),
+            'p90_ms': pct(90),
+            'p99_ms': pct(99),
+            'max_ms': round(ordered[-1] * 1000, 2) if count else 0.0,
+            'statuses': dict(self.statuses),
+            'errors': dict(self.errors),
+            'histogram': {bucket: histogram[bucket] for bucket in
+                          [f"<={bound}ms" for bound in HISTOGRAM_BUCKETS_MS] + ['+Inf'] if histogram[bucket]}
+        }
+
+
+def error_label(status: int, body: bytes) -> Optional[str]:
+    """错误响应的分类：接口返回的 error_code，没有时为 HTTP状态码"""
+    if status < 400:
+        return None
+    try:
+        payload = json.loads(body)
+        return payload.get('error_code') or f"HTTP_{status}: {payload.get('message', '')}"
+    except ValueError:
+        return f"HTTP_{status}"
+
+
+class LoadTest:
+    """按场景运行压测"""
+    
+    def __init__(self, args, transport):
+        self.args = args
+        self.transport = transport
+        self.scenario = SCENARIOS[args.scenario]
+        self.stats = {}
+        self._lock = threading.Lock()
+        
+        universe = MarketUniverse(size=args.symbols, seed=args.seed)
+        self.codes = [stock['code'] for stock in universe.stocks.values()][:args.codes]
+        self.weights = [1 / (rank + 1) for rank in range(len(self.codes))]
+    
+    def record(self, endpoint: str, latency: float, status: Optional[int], error: Optional[str]) -> None:
+        with self._lock:
+            self.stats.setdefault(endpoint, EndpointStats()).record(latency, status, error)
+    
+    def run_user(self, user: VirtualUser, start_barrier: threading.Barrier, deadline_holder: list) -> None:
+        steps = self.scenario.steps
+        weights = [weight for weight, _ in steps]
+        think = (self.args.think_ms if self.args.think_ms is not None else self.scenario.think_ms) / 1000
+        start_barrier.wait()
+        deadline = deadline_holder[0]
+        
+        while time.perf_counter() < deadline:
+            request = user.rng.choices(steps, weights)[0][1](user)
+            start = time.perf_counter()
+            try:
+                status, body = user.send(request, conditional=request.endpoint in CONDITIONAL_ENDPOINTS)
+                self.record(request.endpoint, time.perf_counter() - start, status, error_label(status, body))
+            except Exception as e:
+                self.record(request.endpoint, time.perf_counter() - start, None, type(e).__name__)
+            if think > 0:
+                time.sleep(min(think * user.rng.uniform(0.5, 1.5), max(0, deadline - time.perf_counter())))
+    
+    def run(self) -> Dict[str, Any]:
+        users = [VirtualUser(index, self.transport, self.codes, self.weights, self.args.seed)
+                 for index in range(self.args.users)]
+        if self.scenario.login:
+            run_id = f"{int(time.time()) % 100000:05d}"
+            print(f"注册 {len(users)} 个压测用户 ...", file=sys.stderr)
+            setup_threads = [threading.Thread(target=user.login, args=(run_id, self.args.watchlist_size))
+                             for user in users]
+            for thread in setup_threads:
+                thread.start()
+            for thread in setup_threads:
+                thread.join()
+        
+        deadline_holder = [0.0]
+        start_barrier = threading.Barrier(len(users) + 1)
+        threads = [threading.Thread(target=self.run_user, args=(user, start_barrier, deadline_holder), daemon=True)
+                   for user in users]
+        for thread in threads:
+            thread.start()
+        print(f"场景 {self.args.scenario}: {self.scenario.description}，{len(users)} 个用户，"
+              f"{self.args.duration} 秒 ...", file=sys.stderr)
+        start = time.perf_counter()
+        deadline_holder[0] = start + self.args.duration
+        start_barrier.wait()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        
+        endpoints = {name: stats.summary(elapsed) for name, stats in sorted(self.stats.items())}
+        total = EndpointStats()
+        for stats in self.stats.values():
+            total.latencies.extend(stats.latencies)
+            total.statuses.update(stats.statuses)
+            total.errors.update(stats.errors)
+        return {
+            'scenario': self.args.scenario,
+            'users': len(users),
+            'duration_seconds': round(elapsed, 2),
+            'total': total.summary(elapsed),
+            'endpoints': endpoints
+        }
+
+
+def _ljust(text: str, width: int) -> str:
+    """按显示宽度左对齐（中文字符占两列）"""
+    return text + ' ' * max(0, width - len(text.encode('gbk')))
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"\n场景 {result['scenario']}，{result['users']} 个用户，{result['duration_seconds']} 秒")
+    header = f"{_ljust('接口', 34)}{'请求数':>8}{'RPS':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  状态码"
+    print(header)
+    print('-' * len(header.encode('gbk')))
+    for name, summary in list(result['endpoints'].items()) + [('合计', result['total'])]:
+        statuses = ' '.join(f"{code}:{count}" for code, count in sorted(summary['statuses'].items()))
+        print(f"{_ljust(name, 34)}{summary['requests']:>8}{summary['rps']:>9}{summary['p50_ms']:>9}"
+              f"{summary['p90_ms']:>9}{summary['p99_ms']:>9}{summary['max_ms']:>9}  {statuses}")
+    
+    for name, summary in result['endpoints'].items():
+        print(f"\n{name} 延迟分布:")
+        requests_count = summary['requests'] or 1
+        for bucket, count in summary['histogram'].items():
+            print(f"  {bucket:>10} {count:>7} {'#' * max(1, round(count / requests_count * 50))}")
+        if summary['errors']:
+            print('  错误: ' + ', '.join(f"{error} × {count}" for error, count in summary['errors'].items()))
+
+
+def create_in_process_app(args, temp_dir):
+    """启动本地上游模拟服务并创建应用（数据库、日志放在临时目录 temp_dir 中，由调用方负责删除）"""
+    simulator = MarketSimulator(
+        MarketUniverse(size=args.symbols, seed=args.seed),
+        default_profile=LatencyProfile(args.latency_ms, args.latency_sigma, args.error_rate)
+    )
+    server = start_simulator(simulator=simulator)
+    host, port = server.server_address[:2]
+    
+    config.UPSTREAM_SIMULATOR_URL = f"http://{host}:{port}"
+    config.DATABASE_PATH = os.path.join(temp_dir, 'loadtest.db')
+    config.LOG_FILE = os.path.join(temp_dir, 'loadtest.log')
+    config.SYMBOL_MASTER_REFRESH_ENABLED = False  # 压测场景不涉及代码表，避免后台刷新占用上游
+    if args.rate_limit is not None:
+        config.RATE_LIMIT_PER_MINUTE = args.rate_limit
+    
+    from app import create_app
+    return create_app(), simulator
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API压力测试（默认使用本地上游模拟服务）')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed_read', help='压测场景')
+    parser.add_argument('--users', type=int, default=50, help='并发虚拟用户数')
+    parser.add_argument('--duration', type=float, default=30, help='持续时间（秒）')
+    parser.add_argument('--think-ms', type=float, help='覆盖场景的思考时间（毫秒）')
+    parser.add_argument('--codes', type=int, default=300, help='请求的股票数量（按 Zipf 分布选择）')
+    parser.add_argument('--watchlist-size', type=int, default=10, help='每个登录用户关注的股票数')
+    parser.add_argument('--url', help='压测已启动的服务（如 http://127.0.0.1:5000），不指定时在进程内创建应用')
+    parser.add_argument('--rate-limit', type=int, help='进程内应用的每分钟限流次数（默认使用配置值）')
+    parser.add_argument('--symbols', type=int, default=5000, help='模拟证券数量')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    parser.add_argument('--latency-ms', type=float, default=30, help='模拟上游延迟中位数（毫秒）')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='模拟上游延迟分布的 sigma')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟上游错误率')
+    parser.add_argument('--output', help='结果JSON文件')
+    args = parser.parse_args()
+    
+    # 先于应用配置日志，压测期间只输出警告和错误
+    logging.basicConfig(level=logging.WARNING)
+    simulator = None
+    temp_dir = None
+    if args.url:
+        transport = HttpTransport(args.url)
+    else:
+        temp_dir = tempfile.TemporaryDirectory(prefix='stock-loadtest-')
+        app, simulator = create_in_process_app(args, temp_dir.name)
+        transport = InProcessTransport(app)
+    
+    try:
+        result = LoadTest(args, transport).run()
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+    if simulator is not None:
+        result['upstream'] = simulator.get_stats()
+    print_report(result)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,566 @@
+# -*- coding: utf-8 -*-
+"""
+上游行情模拟服务
+在本地HTTP服务中模拟腾讯（实时行情、K线）、新浪（实时行情、K线、财务摘要）、东方财富（push2 个股/列表、datacenter 财务主表）、
+雪球和同花顺的响应格式，数据来自按随机种子生成的证券集合（默认5000只），
+延迟分布、错误率和页面大小均可配置，用于在没有网络的环境中对API做大规模压测和容量评估
+
+用法:
+    python market_simulator.py --symbols 5000 --port 18800 --latency-ms 40 --error-rate 0.01
+    STOCK_UPSTREAM_SIMULATOR=http://127.0.0.1:18800 python run.py
+
+设置 STOCK_UPSTREAM_SIMULATOR 后，StockService 的上游请求（含新浪行情会话）由 SimulatorRedirectAdapter
+改写为 {模拟服务地址}/{原主机}{原路径}，模拟服务按原主机分发
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from requests.adapters import HTTPAdapter
+
+from config import get_config
+
+# 获取配置
+config = get_config()
+logger = logging.getLogger(__name__)
+
+INDUSTRIES = ['银行', '证券', '保险', '白酒', '医药制造', '半导体', '电池', '光伏设备', '汽车整车',
+              '房地产开发', '电力', '煤炭开采', '化学制品', '软件开发', '通信设备', '食品加工']
+
+# 市场概览使用的指数
+INDICES = {
+    'sh000001': ('上证指数', 3300.0),
+    'sz399001': ('深证成指', 10500.0),
+    'sz399006': ('创业板指', 2150.0)
+}
+
+# 各市场的代码段（前缀, 起始代码, 结束代码（不含））；各段互不重叠，模拟证券数量不能超过各段容量之和
+CODE_RANGES = [
+    ('sh', 600000, 602000), ('sh', 603000, 606000), ('sh', 688000, 689000),
+    ('sz', 1, 1000), ('sz', 2000, 5000), ('sz', 300000, 302000),
+    ('bj', 830000, 840000), ('bj', 920000, 921000)
+]
+
+
+class LatencyProfile:
+    """单个上游主机的响应特征：对数正态延迟分布和错误率"""
+    
+    def __init__(self, median_ms: float = 30, sigma: float = 0.5, error_rate: float = 0.0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+    
+    @classmethod
+    def parse(cls, value: str) -> Tuple[str, 'LatencyProfile']:
+        """解析命令行格式 主机=中位延迟毫秒:sigma:错误率（后两项可省略）"""
+        host, spec = value.split('=', 1)
+        parts = [float(part) for part in spec.split(':')]
+        return host, cls(*parts)
+    
+    def sample_delay(self, rng: random.Random) -> float:
+        """抽样一次响应延迟（秒）"""
+        if self.median_ms <= 0:
+            return 0.0
+        return rng.lognormvariate(math.log(self.median_ms / 1000), self.sigma) if self.sigma > 0 else self.median_ms / 1000
+    
+    def sample_error(self, rng: random.Random) -> bool:
+        """抽样本次请求是否返回错误"""
+        return self.error_rate > 0 and rng.random() < self.error_rate
+
+
+class MarketUniverse:
+    """按随机种子生成的模拟证券集合（同一种子得到相同的代码、名称和基本面）"""
+    
+    def __init__(self, size: int = 5000, seed: int = 1):
+        self.seed = seed
+        self.stocks = {}  # 带市场前缀代码 -> 证券信息
+        self.by_code = {}  # 不带前缀的代码 -> 证券信息（各代码段互不重叠，代码唯一）
+        rng = random.Random(seed)
+        ranges = [
+            (market, start + offset)
+            for (market, start, _), count in zip(CODE_RANGES, self._allocate(size))
+            for offset in range(count)
+        ]
+        for index, (market, number) in enumerate(ranges):
+            code = f"{number:06d}"
+            eps = round(rng.uniform(0.1, 5.0), 2)
+            roe = round(rng.uniform(3.0, 30.0), 2)
+            self.stocks[f"{market}{code}"] = {
+                'code': code,
+                'market': market,
+                'name': f"模拟{INDUSTRIES[index % len(INDUSTRIES)][:2]}{index:04d}",
+                'industry': INDUSTRIES[index % len(INDUSTRIES)],
+                'base_price': round(eps * rng.uniform(5, 40), 2),
+                'total_shares': rng.randint(1, 500) * 10 ** 7,
+                'float_ratio': rng.uniform(0.3, 1.0),
+                'eps': eps,
+                'roe': roe,
+                'bps': round(eps / roe * 100, 2),
+                'dividend_per_share': round(eps * rng.uniform(0.1, 0.6), 3),
+                'phase': rng.uniform(0, 2 * math.pi)
+            }
+            self.by_code[code] = self.stocks[f"{market}{code}"]
+    
+    @staticmethod
+    def _allocate(size: int) -> List[int]:
+        """各代码段的证券数：尽量均分，容量不足的代码段填满后由其余代码段分摊"""
+        capacities = [end - start for _, start, end in CODE_RANGES]
+        if size > sum(capacities):
+            raise ValueError(f"模拟证券数量 {size} 超过代码段容量 {sum(capacities)}")
+        
+        counts = [0] * len(CODE_RANGES)
+        remaining = size
+        while remaining:
+            open_ranges = [index for index, capacity in enumerate(capacities) if counts[index] < capacity]
+            share = -(-remaining // len(open_ranges))
+            for index in open_ranges:
+                take = min(share, capacities[index] - counts[index], remaining)
+                counts[index] += take
+                remaining -= take
+        return counts
+    
+    def get(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """按带市场前缀代码查找证券，指数也作为证券返回"""
+        stock = self.stocks.get(symbol)
+        if stock is None and symbol in INDICES:
+            name, base_price = INDICES[symbol]
+            stock = {'code': symbol[2:], 'market': symbol[:2], 'name': name, 'industry': '指数',
+                     'base_price': base_price, 'total_shares': 0, 'float_ratio': 1.0, 'eps': 0, 'roe': 0,
+                     'bps': 0, 'dividend_per_share': 0, 'phase': 0.0}
+        return stock
+    
+    def get_by_code(self, code: str, market: str = None) -> Optional[Dict[str, Any]]:
+        """按不带前缀的代码查找证券（不含指数），指定 market 时市场不符返回None"""
+        stock = self.by_code.get(code)
+        if stock is None or (market and stock['market'] != market):
+            return None
+        return stock
+    
+    def price(self, stock: Dict[str, Any], moment: float) -> float:
+        """当前价格：围绕基准价按10分钟周期小幅波动（同一秒内不变）"""
+        return round(stock['base_price'] * (1 + 0.03 * math.sin(int(moment) / 95.5 + stock['phase'])), 2)
+    
+    def daily_bars(self, stock: Dict[str, Any], days: int) -> List[Tuple[str, float, float, float, float, int]]:
+        """最近 days 个交易日（周一至周五）的日K线 [(日期, 开, 收, 高, 低, 成交量)]，按日期升序"""
+        rng = random.Random(zlib.crc32(f"{self.seed}:{stock['market']}{stock['code']}".encode()))
+        dates = []
+        day = datetime.now().date()
+        while len(dates) < days:
+            if day.weekday() < 5:
+                dates.append(day)
+            day -= timedelta(days=1)
+        
+        bars = []
+        close = stock['base_price']
+        for day in reversed(dates):
+            open_price = close
+            close = round(max(0.5, open_price * (1 + rng.gauss(0, 0.02))), 2)
+            high = round(max(open_price, close) * (1 + rng.uniform(0, 0.01)), 2)
+            low = round(min(open_price, close) * (1 - rng.uniform(0, 0.01)), 2)
+            bars.append((day.isoformat(), open_price, close, high, low, rng.randint(10 ** 4, 10 ** 7)))
+        return bars
+
+
+class MarketSimulator:
+    """模拟各上游接口的响应"""
+    
+    def __init__(self, universe: MarketUniverse, default_profile: LatencyProfile = None,
+                 host_profiles: Dict[str, LatencyProfile] = None, html_padding_kb: int = 100,
+                 kline_days: int = 640):
+        self.universe = universe
+        self.default_profile = default_profile or LatencyProfile()
+        self.host_profiles = host_profiles or {}
+        self.html_padding_kb = html_padding_kb
+        self.kline_days = kline_days
+        self._rng = random.Random(universe.seed)
+        self._lock = threading.Lock()
+        self.request_counts = {}
+        self.error_counts = {}
+        
+        self.routes = {
+            'qt.gtimg.cn': self.tencent_quote,
+            'web.ifzq.gtimg.cn': self.tencent_kline,
+            'hq.sinajs.cn': self.sina_quote,
+            'money.finance.sina.com.cn': self.sina_money,
+            'push2.eastmoney.com': self.eastmoney_push2,
+            'datacenter-web.eastmoney.com': self.eastmoney_datacenter,
+            'stock.xueqiu.com': self.xueqiu_indicator,
+            'basic.10jqka.com.cn': self.ths_finance
+        }
+    
+    def profile_for(self, host: str) -> LatencyProfile:
+        return self.host_profiles.get(host, self.default_profile)
+    
+    def handle(self, host: str, path: str, query: Dict[str, List[str]]) -> Tuple[int, str, bytes, float]:
+        """
+        处理一次模拟请求
+        
+        Returns:
+            (状态码, Content-Type, 响应体, 响应前等待的秒数)
+        """
+        profile = self.profile_for(host)
+        with self._lock:
+            self.request_counts[host] = self.request_counts.get(host, 0) + 1
+            delay = profile.sample_delay(self._rng)
+            failed = profile.sample_error(self._rng)
+            if failed:
+                self.error_counts[host] = self.error_counts.get(host, 0) + 1
+        
+        if failed:
+            return 503, 'text/plain; charset=utf-8', b'simulated upstream error', delay
+        
+        route = self.routes.get(host)
+        if route is None:
+            return 404, 'text/plain; charset=utf-8', b'not found', delay
+        
+        status, content_type, body = route(path, query)
+        return status, content_type, body, delay
+    
+    def _json(self, data: Any) -> Tuple[int, str, bytes]:
+        return 200, 'application/json; charset=utf-8', json.dumps(data, ensure_ascii=False).encode('utf-8')
+    
+    def _gbk(self, text: str, content_type: str = 'text/plain') -> Tuple[int, str, bytes]:
+        return 200, f'{content_type}; charset=GBK', text.encode('gbk')
+    
+    def _padding(self, size_kb: float) -> str:
+        """填充的表格行（模拟财务页面中的其他报告期和指标）"""
+        row = '<tr><td class="tl">其他指标</td><td class="tr">1,234.56</td></tr>\n'
+        return row * int(size_kb * 1024 / len(row.encode('gbk')))
+    
+    def _report_date(self) -> str:
+        """最近一个已披露的报告期（季度末一个月后视为已披露）"""
+        day = datetime.now().date() - timedelta(days=31)
+        quarter_end_month = (day.month - 1) // 3 * 3
+        if quarter_end_month == 0:
+            return f"{day.year - 1}-12-31 00:00:00"
+        end = datetime(day.year, quarter_end_month + 1, 1) - timedelta(days=1)
+        return end.strftime('%Y-%m-%d 00:00:00')
+    
+    # ==================== 腾讯 ====================
+    
+    def tencent_quote(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, str, bytes]:
+        """qt.gtimg.cn/q=sh600000,sz000001 （~ 分隔的88个字段）"""
+        symbols = path.lstrip('/').split('=', 1)[-1].split(',')
+        now = time.time()
+        lines = []
+        for symbol in symbols:
+            stock = self.universe.get(symbol)
+            if stock is None:
+                lines.append('v_pv_none_match="1";\n')
+                continue
+            
+            price = self.universe.price(stock, now)
+            close = stock['base_price']
+            fields = ['0'] * 88
+            fields[0] = {'sh': '1', 'sz': '51', 'bj': '62'}.get(stock['market'], '51')
+            fields[1] = stock['name']
+            fields[2] = stock['code']
+            fields[3] = f"{price:.2f}"
+            fields[4] = f"{close:.2f}"
+            fields[5] = f"{close:.2f}"
+            fields[30] = datetime.now().strftime('%Y%m%d%H%M%S')
+            fields[31] = f"{price - close:.2f}"
+            fields[32] = f"{(price - close) / close * 100:.2f}"
+            fields[33] = f"{max(price, close):.2f}"
+            fields[34] = f"{min(price, close):.2f}"
+            fields[35] = f"{price:.2f}/100/{price * 100:.0f}"
+            fields[38] = f"{stock['float_ratio']:.2f}"
+            fields[39] = f"{price / stock['eps']:.2f}" if stock['eps'] else ''
+            total_value = price * stock['total_shares'] / 10 ** 8
+            fields[44] = f"{total_value * stock['float_ratio']:.2f}"
+            fields[45] = f"{total_value:.2f}"
+            fields[46] = f"{price / stock['bps']:.2f}" if stock['bps'] else ''
+            fields[47] = f"{close * 1.1:.2f}"
+            fields[48] = f"{close * 0.9:.2f}"
+            fields[72] = f"{stock['total_shares'] * stock['float_ratio']:.0f}"
+            fields[73] = str(stock['total_shares'])
+            lines.append(f'v_{symbol}="{"~".join(fields)}";\n')
+        return self._gbk(''.join(lines))
+    
+    def tencent_kline(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, str, bytes]:
+        """web.ifzq.gtimg.cn/appstock/app/fqkline/get?param=sh600000,day,开始,结束,640,qfq&_var=kline_dayqfq"""
+        param = query.get('param', [''])[0].split(',')
+        symbol = param[0]
+        limit = int(param[4]) if len(param) > 4 and param[4].isdigit() else self.kline_days
+        stock = self.universe.get(symbol)
+        
+        data = {}
+        if stock is not None:
+            start = param[2] if len(param) > 2 else ''
+            bars = [bar for bar in self.universe.daily_bars(stock, min(limit, self.kline_days)) if bar[0] >= start]
+            data[symbol] = {'day': [[day, f"{o:.2f}", f"{c:.2f}", f"{h:.2f}", f"{l:.2f}", str(v)]
+                                    for day, o, c, h, l, v in bars]}
+        var_name = query.get('_var', ['kline_dayqfq'])[0]
+        body = f"{var_name}={json.dumps({'code': 0, 'msg': '', 'data': data}, ensure_ascii=False)}"
+        return 200, 'text/plain; charset=utf-8', body.encode('utf-8')
+    
+    # ==================== 新浪 ====================
+    
+    def sina_quote(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, str, bytes]:
+        """hq.sinajs.cn/rn=时间戳&list=sh600000,sz000001 （easyquotation 的新浪行情格式）"""
+        params = parse_qs(path.lstrip('/'))
+        symbols = params.get('list', [''])[0].split(',')
+        now = time.time()
+        date_str = datetime.now().strftime('%Y-%m-%d')
+        time_str = datetime.now().strftime('%H:%M:%S')
+        lines = []
+        for symbol in symbols:
+            stock = self.universe.get(symbol)
+            if stock is None:
+                lines.append(f'var hq_str_{symbol}="";\n')
+                continue
+            
+            price = self.universe.price(stock, now)
+            close = stock['base_price']
+            book = []
+            for level in range(5):
+                book += [str(100 * (level + 1)), f"{price - 0.01 * (level + 1):.2f}"]
+            for level in range(5):
+                book += [str(100 * (level + 1)), f"{price + 0.01 * (level + 1):.2f}"]
+            fields = [stock['name'], f"{close:.2f}", f"{close:.2f}", f"{price:.2f}", f"{max(price, close):.2f}",
+                      f"{min(price, close):.2f}", f"{price - 0.01:.2f}", f"{price + 0.01:.2f}", '1000000',
+                      f"{price * 1000000:.2f}"] + book + [date_str, time_str, '00']
+            lines.append(f'var hq_str_{symbol}="{",".join(fields)}";\n')
+        return self._gbk(''.join(lines))
+    
+    def sina_money(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, str, bytes]:
+        """新浪财经：K线接口和财务摘要页面"""
+        if 'CN_MarketData.getKLineData' in path:
+            stock = self.universe.get(query.get('symbol', [''])[0])
+            if stock is None:
+                return self._json(None)
+            days = min(int(query.get('datalen', ['250'])[0]), self.kline_days)
+            return self._json([
+                {'day': day, 'open': f"{o:.2f}", 'high': f"{h:.2f}", 'low': f"{l:.2f}", 'close': f"{c:.2f}", 'volume': str(v)}
+                for day, o, c, h, l, v in self.universe.daily_bars(stock, days)
+            ])
+        
+        if 'vFD_FinanceSummary' in path:
+            code = path.rsplit('/', 1)[-1].split('.')[0]
+            stock = self.universe.get_by_code(code)
+            if stock is None:
+                return 404, 'text/html; charset=GBK', b''
+            # 万元；最近一期位于页面开头，其后为历史报告期
+            net_assets = stock['bps'] * stock['total_shares'] / 10 ** 4
+            net_profit = stock['eps'] * stock['total_shares'] / 10 ** 4
+            page = (
+                '<html><head><title>财务摘要</title></head><body><table id="FundHoldSharesTable">'
+                f'<tr><td>截止日期</td><td>{self._report_date()[:10]}</td></tr>'
+                f'<tr><td title="资产总计" >{net_assets * 2.5:,.2f}</td></tr>'
+                f'<tr><td title="净利润" >{net_profit:,.2f}</td></tr>'
+                f'{self._padding(self.html_padding_kb)}</table></body></html>'
+            )
+            return self._gbk(page, 'text/html')
+        
+        return 404, 'text/plain; charset=utf-8', b'not found'
+    
+    # ==================== 东方财富 ====================
+    
+    def eastmoney_push2(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, str, bytes]:
+        """push2：个股数据（stock/get）和沪深A股列表（clist/get）"""
+        if path.endswith('/stock/get'):
+            # secid 市场：1 为上交所，0 为深交所和北交所
+            market, _, code = query.get('secid', [''])[0].partition('.')
+            stock = self.universe.get_by_code(code)
+            if stock is not None and (stock['market'] == 'sh') != (market == '1'):
+                stock = None
+            if stock is None:
+                return self._json({'rc': 0, 'data': None})
+            price = self.universe.price(stock, time.time())
+            return self._json({'rc': 0, 'data': {
+                'f116': stock['total_shares'],
+                'f117': round(price * stock['total_shares'], 2),
+                'f127': stock['industry']
+            }})
+        
+        if path.endswith('/clist/get'):
+            page = int(query.get('pn', ['1'])[0])
+            page_size = int(query.get('pz', ['100'])[0])
+            stocks = list(self.universe.stocks.values())
+            rows = stocks[(page - 1) * page_size:page * page_size]
+            return self._json({'rc': 0, 'data': {
+                'total': len(stocks),
+                'diff': [{'f12': stock['code'], 'f14': stock['name'], 'f100': stock['industry']} for stock in rows]
+            }})
+        
+        return 404, 'text/plain; charset=utf-8', b'not found'
+    
+    def eastmoney_datacenter(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, str, bytes]:
+        """datacenter 财务主表（RPT_DMSK_FN_MAIN）最新一期"""
+        secucode = query.get('filter', [''])[0].split('"')[1:2]
+        code, _, market = (secucode[0] if secucode else '').partition('.')
+        stock = self.universe.get(f"{market.lower()}{code}")
+        if stock is None:
+            return self._json({'result': None, 'success': False, 'message': '返回数据为空', 'code': 9201})
+        return self._json({'result': {'pages': 1, 'count': 1, 'data': [{
+            'SECUCODE': f"{code}.{market}",
+            'REPORT_DATE': self._report_date(),
+            'ROEJQ': stock['roe'],
+            'EPSJB': stock['eps'],
+            'MGJYXJJE': stock['dividend_per_share']
+        }]}, 'success': True, 'code': 0})
+    
+    # ==================== 雪球、同花顺 ====================
+    
+    def xueqiu_indicator(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, str, bytes]:
+        """雪球财务指标"""
+        symbol = query.get('symbol', [''])[0].lower()
+        stock = self.universe.get(symbol)
+        if stock is None:
+            return self._json({'data': {'list': []}, 'error_code': 0})
+        return self._json({'data': {'list': [{'report_name': self._report_date()[:10], 'avg_roe': [stock['roe'], 0.05]}]},
+                           'error_code': 0})
+    
+    def ths_finance(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, str, bytes]:
+        """同花顺财务页面（ROE位于页面中部）"""
+        code = path.strip('/').split('/')[0]
+        stock = self.universe.get_by_code(code)
+        if stock is None:
+            return 404, 'text/html; charset=GBK', b''
+        half = self.html_padding_kb / 2
+        page = (
+            '<html><head><title>财务分析</title></head><body><table>'
+            f'{self._padding(half)}'
+            f'<tr><td class="tl">净资产收益率</td><td class="tr">{stock["roe"]:.2f}%</td></tr>'
+            f'{self._padding(half)}</table></body></html>'
+        )
+        return self._gbk(page, 'text/html')
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """模拟服务统计"""
+        with self._lock:
+            return {
+                'symbols': len(self.universe.stocks),
+                'request_counts': dict(self.request_counts),
+                'error_counts': dict(self.error_counts)
+            }
+
+
+class SimulatorRequestHandler(BaseHTTPRequestHandler):
+    """模拟服务请求处理：路径的第一段为原上游主机"""
+    
+    protocol_version = 'HTTP/1.1'  # 支持长连接，与真实上游一致
+    simulator = None  # MarketSimulator，由 create_simulator_server 设置
+    
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == '/_stats':
+            status, content_type, body = self.simulator._json(self.simulator.get_stats())
+            delay = 0
+        else:
+            host, _, path = parts.path.lstrip('/').partition('/')
+            status, content_type, body, delay = self.simulator.handle(host, f"/{path}", parse_qs(parts.query))
+        
+        if delay > 0:
+            time.sleep(delay)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except ConnectionError:
+            # 客户端已断开（如流式扫描提前结束）
+            self.close_connection = True
+    
+    def log_message(self, format, *args):
+        logger.debug(f"模拟上游请求 {self.path}: " + format % args)
+
+
+class SimulatorServer(ThreadingHTTPServer):
+    """模拟服务（每个连接一个线程）"""
+    
+    daemon_threads = True
+    
+    def handle_error(self, request, client_address):
+        # 流式读取网页时客户端找到字段后会提前断开连接，属于正常情况
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+def create_simulator_server(host: str = '127.0.0.1', port: int = 18800, simulator: MarketSimulator = None,
+                            **universe_kwargs) -> SimulatorServer:
+    """创建模拟服务（port 为0时自动分配端口，见 server.server_address）"""
+    simulator = simulator or MarketSimulator(MarketUniverse(**universe_kwargs))
+    handler = type('BoundSimulatorRequestHandler', (SimulatorRequestHandler,), {'simulator': simulator})
+    return SimulatorServer((host, port), handler)
+
+
+def start_simulator(host: str = '127.0.0.1', port: int = 0, simulator: MarketSimulator = None,
+                    **universe_kwargs) -> SimulatorServer:
+    """在后台线程中启动模拟服务（供压测脚本在同一进程中使用），返回服务实例"""
+    server = create_simulator_server(host, port, simulator, **universe_kwargs)
+    threading.Thread(target=server.serve_forever, name='market-simulator', daemon=True).start()
+    logger.info(f"上游行情模拟服务已启动: http://{server.server_address[0]}:{server.server_address[1]}")
+    return server
+
+
+class SimulatorRedirectAdapter(HTTPAdapter):
+    """把上游请求改写到模拟服务的传输适配器：{模拟服务地址}/{原主机}{原路径}?{原参数}"""
+    
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip('/')
+    
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request = request.copy()
+        request.url = f"{self.base_url}/{parts.hostname}{parts.path}{'?' + parts.query if parts.query else ''}"
+        return super().send(request, **kwargs)
+
+
+def create_simulator_adapter(**kwargs) -> Optional[SimulatorRedirectAdapter]:
+    """按配置创建指向模拟服务的适配器；未配置 UPSTREAM_SIMULATOR_URL 时返回None"""
+    if not config.UPSTREAM_SIMULATOR_URL:
+        return None
+    
+    logger.info(f"上游请求改写到模拟服务 {config.UPSTREAM_SIMULATOR_URL}")
+    return SimulatorRedirectAdapter(config.UPSTREAM_SIMULATOR_URL, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='上游行情模拟服务')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=18800, help='监听端口')
+    parser.add_argument('--symbols', type=int, default=5000, help='模拟证券数量（不超过各代码段容量之和 22999）')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子（相同种子生成相同的证券集合）')
+    parser.add_argument('--latency-ms', type=float, default=30, help='默认延迟中位数（毫秒）')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='对数正态延迟分布的 sigma（0 为固定延迟）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='默认错误率（返回503的比例）')
+    parser.add_argument('--host-profile', action='append', default=[],
+                        help='单个主机的响应特征 主机=中位延迟毫秒:sigma:错误率，可重复，如 qt.gtimg.cn=15:0.3:0.01')
+    parser.add_argument('--html-padding-kb', type=float, default=100, help='财务页面中其他内容的大小（KB）')
+    parser.add_argument('--kline-days', type=int, default=640, help='K线最多返回的交易日数')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    simulator = MarketSimulator(
+        MarketUniverse(size=args.symbols, seed=args.seed),
+        default_profile=LatencyProfile(args.latency_ms, args.latency_sigma, args.error_rate),
+        host_profiles=dict(LatencyProfile.parse(value) for value in args.host_profile),
+        html_padding_kb=args.html_padding_kb,
+        kline_days=args.kline_days
+    )
+    server = create_simulator_server(args.host, args.port, simulator)
+    print(f"上游行情模拟服务: http://{args.host}:{args.port}（{args.symbols} 只证券）")
+    print(f"启动API前设置: STOCK_UPSTREAM_SIMULATOR=http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus 指标模块
+以 Prometheus 文本格式（0.0.4）导出累计计数器和直方图，由 /metrics 接口提供：
+- API请求次数和延迟（按接口）、频率限制拒绝次数
+- 上游请求次数（按主机和结果）和延迟、熔断器状态
+- 各类缓存的命中、未命中和淘汰次数（按缓存键类别）
+- 上游请求线程池队列深度、SQLite 写入延迟
+
+记录操作只做一次字典查找和计数（直方图另加一次二分查找），可在生产环境常开；
+线程池、熔断器等已有统计的组件在抓取时读取其当前状态，不在请求路径上重复记录
+"""
+
+import bisect
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple, Callable, Iterable
+
+from config import get_config
+from upstream import upstream_registry, CircuitBreaker
+from fetch_executor import fetch_executor
+
+# 获取配置
+config = get_config()
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 未匹配任何路由的请求使用的接口标签（路由的 endpoint 名称都带蓝图前缀，不会与之重名）
+UNMATCHED_ENDPOINT = 'unmatched'
+
+# 熔断器状态的数值表示
+BREAKER_STATE_VALUES = {
+    CircuitBreaker.CLOSED: 0,
+    CircuitBreaker.HALF_OPEN: 1,
+    CircuitBreaker.OPEN: 2
+}
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """累计计数器（按标签值分序列）"""
+    
+    TYPE = 'counter'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # 标签值元组 -> 计数
+        self._lock = threading.Lock()
+    
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Histogram:
+    """
+    累计直方图（按标签值分序列）
+    与 upstream.LatencyHistogram 的滑动窗口不同，这里的分桶计数从进程启动起累计，分位数由 Prometheus 端计算
+    """
+    
+    TYPE = 'histogram'
+    
+    # 分桶上界（秒），覆盖本地阶段（亚毫秒）到慢速上游请求
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets or self.BUCKETS)
+        self._series = {}  # 标签值元组 -> [各桶计数（非累计，最后一个为 +Inf）, 总和]
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, *labelvalues) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        
+        lines = []
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(round(total, 6))}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+    除直接记录的计数器和直方图外，可注册采集函数在抓取时读取组件的当前状态，
+    采集函数返回 [(指标名, 类型, 说明, [(标签字典, 值), ...]), ...]
+    """
+    
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+    
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = None) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+    
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+    
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+    
+    def render(self) -> str:
+        """生成 Prometheus 文本格式的全部指标"""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            lines.extend(metric.render())
+        
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.error(f"采集指标失败: {e}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    label_text = _format_labels(tuple(labels), tuple(labels.values()))
+                    lines.append(f"{name}{label_text} {_format_value(value)}")
+        
+        return '\n'.join(lines) + '\n'
+
+
+# 创建全局指标注册表实例
+metrics_registry = MetricsRegistry()
+
+# ==================== 指标定义 ====================
+
+api_requests = metrics_registry.counter(
+    'stock_api_requests_total', 'API请求次数', ('endpoint', 'method', 'status'))
+api_request_duration = metrics_registry.histogram(
+    'stock_api_request_duration_seconds', 'API请求处理耗时（秒）', ('endpoint',))
+rate_limited_requests = metrics_registry.counter(
+    'stock_api_rate_limited_total', '因请求频率限制被拒绝的请求次数', ('endpoint',))
+
+upstream_requests = metrics_registry.counter(
+    'stock_api_upstream_requests_total', '上游请求次数（outcome 为 ok/error/timeout/skipped/http_<状态码>）', ('host', 'outcome'))
+upstream_request_duration = metrics_registry.histogram(
+    'stock_api_upstream_request_duration_seconds', '上游请求耗时（秒，不含熔断跳过的请求）', ('host',))
+
+cache_hits = metrics_registry.counter(
+    'stock_api_cache_hits_total', '缓存命中次数', ('family',))
+cache_misses = metrics_registry.counter(
+    'stock_api_cache_misses_total', '缓存未命中次数（不存在或已过期）', ('family',))
+cache_evictions = metrics_registry.counter(
+    'stock_api_cache_evictions_total', '缓存淘汰次数（容量淘汰或手动清空）', ('family',))
+
+db_write_duration = metrics_registry.histogram(
+    'stock_api_db_write_duration_seconds', 'SQLite 写操作耗时（秒，含打开连接和提交）', ('operation', 'outcome'))
+
+
+def observe_request(endpoint: Optional[str], method: str, status: int, duration: float) -> None:
+    """记录一次API请求（未匹配任何路由时 endpoint 为 None，计入 unmatched）"""
+    endpoint = endpoint or UNMATCHED_ENDPOINT
+    api_requests.inc(endpoint, method, status)
+    api_request_duration.observe(duration, endpoint)
+
+
+def observe_upstream(host: str, duration: float, outcome: str) -> None:
+    """记录一次上游请求（熔断跳过的请求只计数）"""
+    upstream_requests.inc(host, outcome)
+    if outcome != 'skipped':
+        upstream_request_duration.observe(duration, host)
+
+
+def record_cache_lookup(family: str, hit: bool) -> None:
+    """记录一次缓存查找"""
+    if hit:
+        cache_hits.inc(family)
+    else:
+        cache_misses.inc(family)
+
+
+def _collect_executor():
+    """上游请求线程池：活跃线程数和各优先级队列深度"""
+    stats = fetch_executor.get_stats()
+    return [
+        ('stock_api_executor_workers', 'gauge', '上游请求线程池线程数',
+         [({'state': 'active'}, stats['active_workers']), ({'state': 'max'}, stats['max_workers'])]),
+        ('stock_api_executor_queue_depth', 'gauge', '上游请求线程池排队任务数',
+         [({'priority': name}, item['queue_depth']) for name, item in stats['priorities'].items()]),
+        ('stock_api_executor_tasks_started_total', 'counter',
+         '上游请求线程池已开始执行的任务数（runner=worker 由工作线程执行，inline 由等待结果的线程直接执行）',
+         [({'priority': name, 'runner': 'worker'}, item['started']) for name, item in stats['priorities'].items()]
+         + [({'priority': name, 'runner': 'inline'}, item['inline_runs']) for name, item in stats['priorities'].items()])
+    ]
+
+
+def _collect_upstream_breakers():
+    """上游熔断器状态（0 关闭、1 半开、2 打开）和健康评分"""
+    stats = upstream_registry.get_stats()
+    return [
+        ('stock_api_upstream_breaker_state', 'gauge', '上游熔断器状态（0 正常、1 半开、2 熔断）',
+         [({'host': host}, BREAKER_STATE_VALUES.get(item['state'], 0)) for host, item in sorted(stats.items())]),
+        ('stock_api_upstream_health_score', 'gauge', '上游健康评分（0-100）',
+         [({'host': host}, item['health_score']) for host, item in sorted(stats.items())])
+    ]
+
+
+metrics_registry.register_collector(_collect_executor)
+metrics_registry.register_collector(_collect_upstream_breakers)
+
+
+def render_metrics() -> str:
+    """Prometheus 文本格式的全部指标"""
+    return metrics_registry.render()
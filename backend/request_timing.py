@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+请求分段计时模块
+记录快照链路各阶段（缓存检查、各字段组、ROE各数据源、基本面库、衍生指标）和每次上游请求的耗时、结果和数据源：
+- 所有记录按阶段和上游主机汇总（次数、结果分布、数据源分布、分位延迟），通过 /api/stats 导出
+- 当前请求的记录保存在 ContextVar 中（线程池任务在提交时的上下文中执行，子任务的记录归入发起请求），
+  用于生成 Server-Timing 响应头
+"""
+
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Any, Optional
+
+import metrics
+from config import get_config
+from upstream import LatencyHistogram
+
+# 获取配置
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# 结果分类
+OUTCOME_OK = 'ok'
+OUTCOME_ERROR = 'error'
+OUTCOME_TIMEOUT = 'timeout'
+OUTCOME_SKIPPED = 'skipped'    # 熔断中，请求被跳过
+OUTCOME_DEFAULT = 'default'    # 未取得数据，使用了默认值
+
+_current_trace = ContextVar('request_trace', default=None)
+_current_stage = ContextVar('timing_stage', default=None)
+
+
+class TimingHistogram(LatencyHistogram):
+    """阶段耗时直方图（缓存检查、衍生指标等本地阶段通常在毫秒以内，增加更细的分桶）"""
+    
+    BUCKET_BOUNDS_MS = [0.5, 1, 2, 5] + LatencyHistogram.BUCKET_BOUNDS_MS
+
+
+class TimingStats:
+    """单个阶段或上游主机的累计统计"""
+    
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.latency = TimingHistogram()
+        self.outcomes = {}
+        self.sources = {}
+    
+    def add(self, duration: float, outcome: str, source: Optional[str]) -> None:
+        # 每个阶段都会调用，保持在微秒级（普通字典计数比 Counter 快）
+        self.count += 1
+        self.total_seconds += duration
+        if duration > self.max_seconds:
+            self.max_seconds = duration
+        self.latency.add(duration)
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        if source:
+            self.sources[source] = self.sources.get(source, 0) + 1
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_seconds / self.count * 1000, 2) if self.count else 0,
+            'max_ms': round(self.max_seconds * 1000, 2),
+            'p50_ms': round(self.latency.percentile(50) * 1000, 1),
+            'p99_ms': round(self.latency.percentile(99) * 1000, 1),
+            'outcomes': dict(self.outcomes),
+            'sources': dict(self.sources)
+        }
+
+
+class TimingRegistry:
+    """按阶段和上游主机汇总的计时统计"""
+    
+    def __init__(self):
+        self._stages = {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+    
+    def record_stage(self, name: str, duration: float, outcome: str = OUTCOME_OK, source: Optional[str] = None) -> None:
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = TimingStats()
+            stats.add(duration, outcome, source)
+    
+    def record_upstream(self, host: str, duration: float, outcome: str) -> None:
+        with self._lock:
+            stats = self._hosts.get(host)
+            if stats is None:
+                stats = self._hosts[host] = TimingStats()
+            stats.add(duration, outcome, None)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """各阶段和各上游主机的计时统计"""
+        with self._lock:
+            return {
+                'stages': {name: stats.to_dict() for name, stats in sorted(self._stages.items())},
+                'upstream_hosts': {host: stats.to_dict() for host, stats in sorted(self._hosts.items())}
+            }
+    
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._hosts.clear()
+
+
+class RequestTrace:
+    """单个API请求的计时记录"""
+    
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._entries = []  # (指标名, 耗时秒, 结果, 数据源)
+        self._lock = threading.Lock()
+        self.dropped = 0
+    
+    def add(self, metric: str, duration: float, outcome: str, source: Optional[str]) -> None:
+        with self._lock:
+            if len(self._entries) >= config.REQUEST_TRACE_MAX_ENTRIES:
+                self.dropped += 1
+                return
+            self._entries.append((metric, duration, outcome, source))
+    
+    def server_timing(self) -> str:
+        """
+        生成 Server-Timing 头：同名记录合并（耗时相加，描述中给出次数和非 ok 的结果、数据源），
+        并附加请求总耗时 total。并发执行的阶段耗时之和可能大于 total。
+        """
+        merged = {}
+        with self._lock:
+            entries = list(self._entries)
+        for metric, duration, outcome, source in entries:
+            item = merged.setdefault(metric, {'duration': 0.0, 'count': 0, 'labels': []})
+            item['duration'] += duration
+            item['count'] += 1
+            for label in (outcome if outcome != OUTCOME_OK else None, source):
+                if label and label not in item['labels']:
+                    item['labels'].append(label)
+        
+        parts = []
+        for metric, item in merged.items():
+            labels = item['labels'] + ([f"x{item['count']}"] if item['count'] > 1 else [])
+            desc = f';desc="{" ".join(labels)}"' if labels else ''
+            parts.append(f"{metric};dur={item['duration'] * 1000:.1f}{desc}")
+        parts.append(f"total;dur={(time.perf_counter() - self.started_at) * 1000:.1f}")
+        return ', '.join(parts)
+
+
+class stage:
+    """
+    记录一个阶段耗时的上下文管理器；阶段内抛出异常时结果为 error，阶段内的代码可设置结果和数据源
+    
+    用法:
+        with request_timing.stage('roe') as record:
+            ...
+            record.source = 'eastmoney'
+    
+    （按类实现而不是生成器，每个阶段的额外开销在数微秒以内）
+    """
+    
+    __slots__ = ('name', 'outcome', 'source', '_token', '_start_time')
+    
+    def __init__(self, name: str, source: Optional[str] = None):
+        self.name = name
+        self.outcome = OUTCOME_OK
+        self.source = source
+    
+    def __enter__(self) -> 'stage':
+        self._token = _current_stage.set(self)
+        self._start_time = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        duration = time.perf_counter() - self._start_time
+        _current_stage.reset(self._token)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.outcome = OUTCOME_ERROR
+        timing_registry.record_stage(self.name, duration, self.outcome, self.source)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(self.name, duration, self.outcome, self.source)
+
+
+def set_source(source: str) -> None:
+    """设置当前阶段的数据源（不在阶段内时忽略）"""
+    record = _current_stage.get()
+    if record is not None:
+        record.source = source
+
+
+def set_outcome(outcome: str) -> None:
+    """设置当前阶段的结果（不在阶段内时忽略）"""
+    record = _current_stage.get()
+    if record is not None:
+        record.outcome = outcome
+
+
+def record_upstream(host: str, duration: float, outcome: str) -> None:
+    """记录一次上游请求（同时计入 Prometheus 指标）"""
+    timing_registry.record_upstream(host, duration, outcome)
+    metrics.observe_upstream(host, duration, outcome)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(f"upstream.{host}", duration, outcome, None)
+
+
+def start_trace() -> RequestTrace:
+    """开始记录当前请求（替换线程中可能残留的上一个请求的记录）"""
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def end_trace() -> None:
+    """结束当前请求的记录"""
+    _current_trace.set(None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def get_stats() -> Dict[str, Any]:
+    """各阶段和各上游主机的计时统计"""
+    return timing_registry.get_stats()
+
+
+# 创建全局计时统计实例
+timing_registry = TimingRegistry()
@@ -28,6 +28,7 @@ def main():
     print(f"📚 API接口列表:")
     print(f"   - GET  /api/health                    # 健康检查")
     print(f"   - GET  /api/stocks/search?keyword=XX  # 股票搜索")
+    print(f"   - GET  /api/stocks/suggest?keyword=XX # 联想输入")
     print(f"   - GET  /api/stocks/{{code}}             # 股票详情")
     print(f"   - GET  /api/stocks/{{code}}/history     # 历史数据")
     print(f"   - POST /api/stocks/batch              # 批量查询")
@@ -4,58 +4,170 @@ import re
 import pandas as pd
 import time
 import json
+import hashlib
+import itertools
+import os
 from bs4 import BeautifulSoup
 import warnings
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from datetime import datetime, timedelta, date, timezone
+from typing import Dict, List, Optional, Any, Tuple
 import concurrent.futures
+import contextvars
 import threading
 
+from config import get_config
+from database import db_manager
+from upstream import upstream_registry, UpstreamUnavailableError
+from fetch_executor import fetch_executor, PRIORITY_BATCH, PRIORITY_BACKGROUND
+from async_fetch import create_async_backend
+from cassette import create_cassette_adapter
+from market_simulator import create_simulator_adapter
+from trading_calendar import trading_calendar
+from symbol_master import symbol_master, exchange_of
+from html_scan import compile_gbk, decode_gbk, scan_stream
+from tencent_quote import TencentQuote, parse_tencent_quotes
+import request_timing
+import metrics
+
 warnings.filterwarnings('ignore')
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 当前获取的截止时间（time.time() 时间戳）：线程池任务在提交时的上下文中执行，
+# 任务由等待结果的线程直接执行时其中的上游请求同样受此限制
+_fetch_deadline = contextvars.ContextVar('fetch_deadline', default=None)
+
+# 获取配置
+config = get_config()
+
+# 网页抓取字段的预编译字节正则（页面为GBK编码，量词有上限以便流式扫描）
+SINA_FINANCE_SUMMARY_PATTERNS = {
+    'net_profit': compile_gbk(r'净利润[^>]{0,200}>([^<]{0,64})</td>'),   # 净利润（万元）
+    'net_assets': compile_gbk(r'资产总计[^>]{0,200}>([^<]{0,64})</td>')   # 资产总计（万元）
+}
+# 同花顺ROE按顺序取第一个合理的值
+THS_ROE_PATTERNS = {
+    'roe_cell': compile_gbk(r'净资产收益率[^>]{0,200}>([^<]{0,64})</td>'),
+    'roe_label': compile_gbk(r'ROE[^>]{0,200}>([^<]{0,64})</td>'),
+    'roe_text': compile_gbk(r'净资产收益率.{0,300}?(\d{1,8}\.?\d{0,8})%')
+}
+
+class SnapshotFetchPlan:
+    """
+    单只股票快照的上游请求计划
+
+    同一次快照中，每个不同的上游资源（腾讯行情、新浪行情、东方财富个股、
+    东方财富财务主表）只请求一次，解析后的结果共享给所有字段提取器。
+    """
+    
+    def __init__(self, code: str):
+        self.code = code
+        self._results = {}  # key -> 解析后的上游数据
+        self._key_locks = {}  # key -> 该资源的请求锁（并发提取器共享同一次请求）
+        self._lock = threading.Lock()
+        self.request_count = 0  # 本次快照实际发出的上游请求数
+    
+    def fetch(self, key: str, loader, *args) -> Any:
+        """获取上游资源，已请求过的直接返回共享结果"""
+        with self._lock:
+            if key in self._results:
+                return self._results[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        
+        with key_lock:
+            with self._lock:
+                if key in self._results:
+                    return self._results[key]
+            
+            value = loader(*args)
+            with self._lock:
+                self._results[key] = value
+                self.request_count += 1
+            return value
+    
+    def prime(self, key: str, value: Any) -> None:
+        """预先填充上游数据（例如批量行情已取得的结果）"""
+        with self._lock:
+            self._results.setdefault(key, value)
+    
+    def peek(self, key: str, default: Any = None) -> Any:
+        """读取已取得的上游数据，不发起请求"""
+        with self._lock:
+            return self._results.get(key, default)
+
+
 class StockService:
     """股票数据服务类 - 基于 stock_comp.py 的实现"""
     
+    # 快照分层缓存：字段层 -> 所含字段组（各层有效期见 config.SNAPSHOT_CACHE_TTLS）
+    SNAPSHOT_TIERS = {
+        'quote': ['basic'],                                    # 行情（秒级变化）
+        'valuation': ['valuation'],                            # 估值（分钟级变化）
+        'fundamentals': ['roe', 'industry', 'dividend_ratio']  # 基本面（随财报变化）
+    }
+    # 写入进程间共享快照缓存的字段层（基本面层已保存在本地基本面库中）
+    SHARED_SNAPSHOT_TIERS = ('quote', 'valuation')
+    
     def __init__(self):
         self.eq_sina = easyquotation.use('sina')
         self.cache = {}  # 简单的内存缓存
+        # 缓存项版本号（每次写入递增）；进程标识保证重启或多进程部署时版本号不会与旧ETag重合
+        self._cache_versions = itertools.count(1)
+        self._cache_epoch = f"{os.getpid()}-{int(time.time() * 1000)}"
         self.cache_timeout = 120  # 缓存超时时间（秒）
+        self.quote_batch_size = 60  # 批量行情每次请求的最大股票数
+        self.field_group_timeout = 10  # 单只股票字段组并发获取的总超时（秒）
         self.session = requests.Session()  # 复用连接
-        # 设置连接池参数
-        adapter = requests.adapters.HTTPAdapter(
-            pool_connections=10,
-            pool_maxsize=20,
-            max_retries=1
-        )
-        self.session.mount('http://', adapter)
-        self.session.mount('https://', adapter)
+        # 设置连接池参数（进程级线程池 fetch_executor 的大小与 pool_maxsize 一致）
+        pool_kwargs = {
+            'pool_connections': config.HTTP_POOL_CONNECTIONS,
+            'pool_maxsize': config.HTTP_POOL_MAXSIZE,
+            'max_retries': 1
+        }
+        self.upstream_attempts = 1 + pool_kwargs['max_retries']  # 连接池对读超时也会重试，单次请求最多尝试的次数
+        # 启用上游请求录制/回放（config.CASSETTE_MODE）或模拟服务（config.UPSTREAM_SIMULATOR_URL）时使用对应的适配器，
+        # 新浪行情（easyquotation）的会话也一并挂载；两者都启用时录制模拟服务的响应
+        simulator_adapter = create_simulator_adapter(**pool_kwargs)
+        self.cassette = create_cassette_adapter(transport=simulator_adapter, **pool_kwargs)
+        upstream_adapter = self.cassette or simulator_adapter
+        adapter = upstream_adapter or requests.adapters.HTTPAdapter(**pool_kwargs)
+        sessions = [self.session]
+        if upstream_adapter:
+            sessions.append(self.eq_sina._session)
+        for session in sessions:
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        # 可选的异步请求后端（config.FETCH_BACKEND = 'async' 时启用；录制/回放和模拟服务只作用于同步会话，此时不启用）
+        self.async_backend = None if upstream_adapter else create_async_backend()
+        # 搜索结果后台预取中的股票代码
+        self._prefetching = set()
+        self._prefetch_lock = threading.Lock()
     
-    def search_stocks(self, keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """搜索股票 - 返回11个字段的完整数据"""
+    def search_stocks(self, keyword: str, limit: int = 10, enrich: bool = False) -> List[Dict[str, Any]]:
+        """
+        搜索股票（两阶段）
+        
+        默认只返回证券代码表中的代码、名称、交易所、行业，加上一次批量行情请求得到的
+        当前价格和涨跌幅，并在后台预取排名靠前结果的完整数据；
+        enrich=True 时通过批量查询返回11个字段的完整数据。
+        """
         try:
             logger.info(f"搜索股票关键词: {keyword}")
             
-            # 简单的股票代码匹配逻辑
-            stock_codes = self._get_stock_codes_by_keyword(keyword, limit)
-            
-            if not stock_codes:
+            symbols = self._search_symbols(keyword, limit)
+            if not symbols:
                 logger.warning(f"未找到匹配的股票: {keyword}")
                 return []
             
-            # 获取完整的11个字段数据
-            results = []
-            for code in stock_codes:
-                stock_data = self.get_stock_complete_data(code)
-                if stock_data:
-                    results.append(stock_data)
-                    
-                if len(results) >= limit:
-                    break
+            codes = [symbol['code'] for symbol in symbols]
+            if enrich:
+                results = self.get_batch_stocks(codes)
+            else:
+                results = self._build_search_hits(symbols)
+                self._prefetch_search_hits(codes[:config.SEARCH_PREFETCH_TOP_N])
             
             logger.info(f"搜索完成，返回 {len(results)} 条结果")
             return results
@@ -64,33 +176,137 @@ class StockService:
             logger.error(f"搜索股票失败: {e}")
             return []
     
-    def get_stock_complete_data(self, code: str) -> Optional[Dict[str, Any]]:
-        """获取单只股票的完整11个字段数据"""
+    def _build_search_hits(self, symbols: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """轻量搜索结果：代码表信息 + 一次批量行情（不请求腾讯估值字段）"""
+        quotes = self.get_batch_quotes([symbol['code'] for symbol in symbols], with_valuation=False)
+        
+        results = []
+        for symbol in symbols:
+            quote = quotes.get(symbol['code'], {})
+            name = symbol['name'] or quote.get('name', '')
+            if not name:
+                # 代码表和行情都没有该代码，视为不存在
+                continue
+            
+            results.append({
+                'code': symbol['code'],
+                'name': name,
+                'exchange': symbol['exchange'],
+                'industry': symbol['industry'],
+                'current_price': quote.get('current_price', 0),
+                'change_percent': quote.get('change_percent', 0),
+                'change_amount': quote.get('change_amount', 0)
+            })
+        return results
+    
+    def _prefetch_search_hits(self, codes: List[str]) -> None:
+        """在后台优先级下预取搜索结果的完整数据（已在预取中的代码跳过）"""
+        with self._prefetch_lock:
+            codes = [code for code in codes if code not in self._prefetching]
+            self._prefetching.update(codes)
+        if not codes:
+            return
+        
+        def prefetch():
+            try:
+                self.get_batch_stocks(codes)
+            finally:
+                with self._prefetch_lock:
+                    self._prefetching.difference_update(codes)
+        
+        fetch_executor.submit(prefetch, priority=PRIORITY_BACKGROUND)
+    
+    def get_stock_complete_data(self, code: str, plan: Optional[SnapshotFetchPlan] = None,
+                                refresh_ahead: float = 0) -> Optional[Dict[str, Any]]:
+        """
+        获取单只股票的完整11个字段数据
+        
+        Args:
+            code: 股票代码
+            plan: 可选的请求计划（批量查询时预先填充了批量行情结果）
+            refresh_ahead: 提前刷新时间（秒），将在该时间内过期的字段层也重新获取（后台刷新使用）
+        """
+        return self.get_stock_snapshot(code, plan, refresh_ahead)[0]
+    
+    def get_stock_snapshot(self, code: str, plan: Optional[SnapshotFetchPlan] = None,
+                           refresh_ahead: float = 0, cached_tiers: Optional[Dict[str, Dict[str, Any]]] = None
+                           ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """
+        获取单只股票的完整数据，以及组装时实际使用的各字段层缓存项 {缓存键: 缓存项}
+        
+        调用方用返回的缓存项生成ETag（make_cache_validator），保证ETag与响应内容来自同一组缓存版本；
+        获取失败时返回 (None, {})
+        
+        Args:
+            cached_tiers: 调用方已用 _get_cached_tiers 读取的有效字段层缓存项（批量查询时传入），
+                          传入时不再重复读取缓存，缓存命中/未命中也不会重复计数
+        """
+        # 整体耗时计入 snapshot 阶段（数据源为 cache 或 upstream），各字段组和上游请求另行计时
+        with request_timing.stage('snapshot') as record:
+            stock_info, entries = self._build_stock_snapshot(code, plan, refresh_ahead, cached_tiers)
+            if stock_info is None:
+                record.outcome = request_timing.OUTCOME_ERROR
+            return stock_info, entries
+    
+    def _build_stock_snapshot(self, code: str, plan: Optional[SnapshotFetchPlan], refresh_ahead: float,
+                              cached_tiers: Optional[Dict[str, Dict[str, Any]]] = None
+                              ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """组装单只股票快照（过期字段层从上游重新获取），同时返回所用的各字段层缓存项"""
         try:
             logger.info(f"获取股票 {code} 的完整数据")
             
-            # 检查缓存
-            cache_key = f"stock_complete_{code}"
-            if self._is_cache_valid(cache_key):
+            # 检查分层缓存，只重新获取已过期的字段层
+            if cached_tiers is not None:
+                entries = dict(cached_tiers)
+            else:
+                with request_timing.stage('cache_lookup'):
+                    entries = self._get_cached_tiers(code, refresh_ahead)
+            tiers = {tier: entry['data'] for tier, entry in entries.items()}
+            stale_tiers = [tier for tier in self.SNAPSHOT_TIERS if tier not in tiers]
+            request_timing.set_source('upstream' if stale_tiers else 'cache')
+            
+            plan = plan or SnapshotFetchPlan(code)
+            if stale_tiers:
+                # 1-3. 并发获取过期字段层的字段组（同一快照中每个上游资源只请求一次）
+                stale_groups = [group for tier in stale_tiers for group in self.SNAPSHOT_TIERS[tier]]
+                fetched = self._fetch_field_groups(code, plan, stale_groups)
+                for tier in stale_tiers:
+                    tiers[tier] = {group: fetched[group] for group in self.SNAPSHOT_TIERS[tier]}
+                if 'fundamentals' in stale_tiers:
+                    with request_timing.stage('fundamentals_store'):
+                        tiers['fundamentals'] = self._resolve_fundamentals_tier(code, tiers['fundamentals'], plan)
+            else:
                 logger.info(f"使用缓存数据: {code}")
-                return self.cache[cache_key]['data']
             
-            # 1. 基础行情数据（股票名称、当前价格）
-            basic_data = self._get_basic_data(code)
+            groups = {}
+            for values in tiers.values():
+                groups.update(values)
+            
+            # 基础行情数据（股票名称、当前价格）
+            basic_data = groups['basic']
             if not basic_data:
                 logger.warning(f"股票 {code} 基础数据获取失败")
-                return None
+                return None, {}
             
-            # 2. 估值数据（市盈率TTM、市净率、总市值）
-            valuation_data = self._get_valuation_data(code)
+            # 缓存新获取的字段层
+            for tier in stale_tiers:
+                entries[tier] = self._cache_tier(code, tier, tiers[tier])
             
-            # 3. 财务数据（ROE、行业、股利支付率）
-            financial_data = self._get_financial_data(code)
+            # 估值数据（市盈率TTM、市净率、总市值）
+            valuation_data = groups['valuation']
+            
+            # 财务数据（ROE、行业、股利支付率）
+            financial_data = {
+                'roe': groups['roe'] or self._get_industry_average_roe(groups['industry']),
+                'industry': groups['industry'],
+                'dividend_ratio': groups['dividend_ratio']
+            }
             
             # 4. 计算衍生指标（市赚率、修正系数、修正市赚率、理论股价）
-            derived_data = self._calculate_derived_indicators(
-                basic_data, valuation_data, financial_data
-            )
+            with request_timing.stage('derived'):
+                derived_data = self._calculate_derived_indicators(
+                    basic_data, valuation_data, financial_data
+                )
             
             # 5. 合并所有数据为11个字段（按用户要求格式化）
             stock_info = {
@@ -110,195 +326,723 @@ class StockService:
                 'theoretical_price': derived_data['theoretical_price'],  # 理论股价
                 'change_percent': basic_data.get('change_percent', 0),
                 'change_amount': basic_data.get('change_amount', 0),
-                'timestamp': datetime.now().isoformat()
+                # 数据时间为各字段层最近一次获取的时间，缓存未刷新时快照内容保持不变（ETag依赖这一点）
+                'timestamp': max(entry['timestamp'] for entry in entries.values()).isoformat()
             }
             
-            # 缓存结果
-            self._set_cache(cache_key, stock_info)
-            
-            logger.info(f"股票 {code} 数据获取成功")
-            return stock_info
+            logger.info(
+                f"股票 {code} 数据获取成功，刷新字段层 {stale_tiers or '无'}，"
+                f"上游请求 {plan.request_count} 次"
+            )
+            return stock_info, {f"stock_{tier}_{code}": entries[tier] for tier in self.SNAPSHOT_TIERS}
             
         except Exception as e:
             logger.error(f"获取股票 {code} 数据失败: {e}")
+            return None, {}
+    
+    def snapshot_cache_keys(self, code: str) -> List[str]:
+        """股票快照各字段层的缓存键"""
+        return [f"stock_{tier}_{code}" for tier in self.SNAPSHOT_TIERS]
+    
+    def _get_cached_tiers(self, code: str, refresh_ahead: float = 0) -> Dict[str, Dict[str, Any]]:
+        """
+        读取仍在有效期内的快照字段层缓存项 {字段层: 缓存项}（缓存项含数据、获取时间和版本号）
+        内存中没有基本面层时，从本地基本面库加载（无需检查新财报时直接使用）
+        
+        Args:
+            refresh_ahead: 将在该时间（秒）内过期的字段层视为已过期
+        """
+        # 每个缓存项只读取一次：判断有效期和使用的数据、版本号来自同一个缓存项
+        check_time = datetime.now() + timedelta(seconds=refresh_ahead)
+        entries = {}
+        for tier in self.SNAPSHOT_TIERS:
+            entry = self.cache.get(f"stock_{tier}_{code}")
+            hit = entry is not None and self._is_cache_entry_valid(entry, check_time)
+            metrics.record_cache_lookup(tier, hit)
+            if hit:
+                entries[tier] = entry
+        
+        shared_missing = [tier for tier in self.SHARED_SNAPSHOT_TIERS if tier not in entries]
+        if config.SHARED_SNAPSHOT_CACHE_ENABLED and shared_missing:
+            entries.update(self._load_shared_tiers(code, shared_missing, check_time))
+        
+        if 'fundamentals' not in entries:
+            record = self._get_stored_fundamentals(code)
+            stored_valid = bool(record) and not self._fundamentals_need_refresh(record)
+            metrics.record_cache_lookup('fundamentals_store', stored_valid)
+            if stored_valid:
+                values = self._stored_fundamentals_values(record)
+                entries['fundamentals'] = self._set_cache(
+                    f"stock_fundamentals_{code}", values, config.SNAPSHOT_CACHE_TTLS['fundamentals'])
+        
+        return entries
+    
+    def _load_shared_tiers(self, code: str, tiers: List[str], check_time: datetime) -> Dict[str, Dict[str, Any]]:
+        """
+        从进程间共享快照缓存读取字段层，在 check_time 时仍有效的写入本进程内存缓存（保留原获取时间和有效期）
+        多进程部署时其他进程（如执行后台刷新的进程）获取的数据因此不必重新请求上游
+        """
+        cache_keys = {f"stock_{tier}_{code}": tier for tier in tiers}
+        try:
+            stored = db_manager.get_snapshot_cache(list(cache_keys))
+        except Exception as e:
+            logger.error(f"读取共享快照缓存失败 {code}: {e}")
+            stored = {}
+        
+        entries = {}
+        for cache_key, tier in cache_keys.items():
+            item = stored.get(cache_key)
+            hit = item is not None and (
+                check_time - datetime.fromtimestamp(item['fetched_at'])).total_seconds() < item['ttl']
+            metrics.record_cache_lookup('snapshot_store', hit)
+            if hit:
+                entries[tier] = self._set_cache(cache_key, item['data'], item['ttl'],
+                                                timestamp=datetime.fromtimestamp(item['fetched_at']))
+        return entries
+    
+    def _is_tier_complete(self, tier: str, values: Dict[str, Any]) -> bool:
+        """字段层数据是否完整（不含ROE取不到、行业未知、估值全为0等降级默认值）"""
+        if tier == 'valuation':
+            return any(values['valuation'].values())
+        if tier == 'fundamentals':
+            return values['roe'] > 0 and values['industry'] != '未知行业'
+        return bool(values['basic'])
+    
+    def _cache_tier(self, code: str, tier: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        缓存快照字段层，返回写入的缓存项
+        
+        数据完整时使用该层的有效期（行情和估值在非交易时段不会变化，有效期延长到下一次开盘）；
+        含降级默认值时最多缓存 cache_timeout 秒，避免失败结果在长有效期内一直被使用。
+        """
+        ttl = config.SNAPSHOT_CACHE_TTLS[tier]
+        if not self._is_tier_complete(tier, values):
+            ttl = min(ttl, self.cache_timeout)
+        elif tier in ('quote', 'valuation'):
+            ttl = trading_calendar.cache_ttl(ttl)
+        cache_key = f"stock_{tier}_{code}"
+        entry = self._set_cache(cache_key, values, ttl)
+        if config.SHARED_SNAPSHOT_CACHE_ENABLED and tier in self.SHARED_SNAPSHOT_TIERS:
+            try:
+                db_manager.save_snapshot_cache(cache_key, values, entry['timestamp'].timestamp(), ttl)
+            except Exception as e:
+                logger.error(f"写入共享快照缓存失败 {cache_key}: {e}")
+        return entry
+    
+    # ==================== 本地基本面库 ====================
+    
+    def _get_stored_fundamentals(self, code: str) -> Optional[Dict[str, Any]]:
+        """读取本地保存的基本面数据，读取失败返回None"""
+        try:
+            return db_manager.get_fundamentals(code)
+        except Exception as e:
+            logger.error(f"读取本地基本面数据失败 {code}: {e}")
             return None
     
-    def _get_stock_codes_by_keyword(self, keyword: str, limit: int) -> List[str]:
-        """根据关键词获取股票代码列表"""
-        # 如果是6位数字，直接作为股票代码
-        if keyword.isdigit() and len(keyword) == 6:
-            return [keyword]
-        
-        # 扩展的股票代码映射
-        stock_mapping = {
-            '平安银行': ['000001'],
-            '万科': ['000002'], 
-            '招商银行': ['600036'],
-            '浦发银行': ['600000'],
-            '中国平安': ['601318'],
-            '贵州茅台': ['600519'],
-            '五粮液': ['000858'],
-            '比亚迪': ['002594'],
-            '宁德时代': ['300750'],
-            '江苏银行': ['600919'],
-            '南京银行': ['601009'],
-            '宁波银行': ['002142'],
-            '兴业银行': ['601166'],
-            '民生银行': ['600016'],
-            '光大银行': ['601818'],
-            '华夏银行': ['600015'],
-            '中信银行': ['601998'],
-            '建设银行': ['601939'],
-            '工商银行': ['601398'],
-            '农业银行': ['601288'],
-            '中国银行': ['601988']
+    def _stored_fundamentals_values(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """本地基本面记录转换为基本面字段层"""
+        return {
+            'roe': record['roe'],
+            'industry': record['industry'],
+            'dividend_ratio': record['dividend_ratio']
         }
+    
+    def _fundamentals_need_refresh(self, record: Dict[str, Any]) -> bool:
+        """
+        判断本地基本面数据是否需要到网络检查新财报
         
-        # 根据名称搜索
-        codes = []
-        for name, code_list in stock_mapping.items():
-            if keyword in name:
-                codes.extend(code_list)
+        距上次检查不足 FUNDAMENTALS_RECHECK_HOURS 小时不检查；
+        已知报告期时，只有下一个报告期已结束（新财报才可能发布）才检查；
+        报告期未知时按检查间隔定期检查。
+        """
+        now = datetime.now()
+        try:
+            checked_time = datetime.strptime(record['checked_time'], '%Y-%m-%d %H:%M:%S')
+        except (TypeError, ValueError):
+            return True
         
-        # 如果没找到精确匹配，尝试模糊匹配
-        if not codes:
-            for name, code_list in stock_mapping.items():
-                if any(char in name for char in keyword) and len(keyword) >= 2:
-                    codes.extend(code_list)
+        if now - checked_time < timedelta(hours=config.FUNDAMENTALS_RECHECK_HOURS):
+            return False
         
-        # 如果还是没找到，返回空列表而不是默认代码
-        return codes[:limit]
+        report_date = record.get('report_date')
+        if not report_date:
+            return True
+        
+        try:
+            return now.date() > self._next_report_period_end(report_date)
+        except ValueError:
+            return True
     
-    def _get_basic_data(self, code: str) -> Dict[str, Any]:
-        """获取基础行情数据"""
+    def _next_report_period_end(self, report_date: str) -> date:
+        """下一个报告期（季度末）的截止日期"""
+        current = datetime.strptime(report_date[:10], '%Y-%m-%d').date()
+        for month, day in ((3, 31), (6, 30), (9, 30), (12, 31)):
+            period_end = date(current.year, month, day)
+            if period_end > current:
+                return period_end
+        return date(current.year + 1, 3, 31)
+    
+    def _resolve_fundamentals_tier(self, code: str, values: Dict[str, Any],
+                                   plan: SnapshotFetchPlan) -> Dict[str, Any]:
+        """
+        处理从网络新获取的基本面字段层
+        
+        数据完整时连同报告期（财务主表 REPORT_DATE）和总股本写入本地基本面库；
+        含降级默认值时沿用本地已保存的数据（如有）。
+        """
+        if self._is_tier_complete('fundamentals', values):
+            fn_main = plan.peek('eastmoney_fn_main') or {}
+            em_data = plan.peek('eastmoney_stock') or {}
+            total_shares = em_data.get('f116')
+            try:
+                db_manager.save_fundamentals(
+                    code,
+                    roe=values['roe'],
+                    industry=values['industry'],
+                    dividend_ratio=values['dividend_ratio'],
+                    total_shares=total_shares if isinstance(total_shares, (int, float)) else None,
+                    report_date=str(fn_main.get('REPORT_DATE') or '')[:10] or None
+                )
+            except Exception as e:
+                logger.error(f"保存本地基本面数据失败 {code}: {e}")
+            return values
+        
+        record = self._get_stored_fundamentals(code)
+        if record:
+            logger.warning(f"股票 {code} 基本面数据获取不完整，沿用本地数据（报告期 {record['report_date']}）")
+            return self._stored_fundamentals_values(record)
+        return values
+    
+    def _get_stock_codes_by_keyword(self, keyword: str, limit: int) -> List[str]:
+        """根据关键词（代码前缀、名称、拼音首字母）从证券代码表查找股票代码"""
+        return [symbol['code'] for symbol in self._search_symbols(keyword, limit)]
+    
+    def _search_symbols(self, keyword: str, limit: int) -> List[Dict[str, Any]]:
+        """从证券代码表查找，返回证券信息列表"""
+        self.ensure_symbol_master()
+        symbols = symbol_master.search(keyword, limit)
+        
+        # 6位数字且代码表中没有时，仍直接作为股票代码（代码表可能尚未包含新股，名称由行情补充）
+        if not symbols and keyword.isdigit() and len(keyword) == config.STOCK_CODE_LENGTH:
+            return [symbol_master.make_symbol(keyword, '')]
+        return symbols
+    
+    # ==================== 证券代码表 ====================
+    
+    def ensure_symbol_master(self) -> None:
+        """加载证券代码表；数据过期或来自本地文件时，在后台从批量股票列表接口刷新（可由配置关闭）"""
+        symbol_master.ensure_loaded()
+        if config.SYMBOL_MASTER_REFRESH_ENABLED and symbol_master.claim_refresh():
+            fetch_executor.submit(self._refresh_symbol_master_claimed, priority=PRIORITY_BACKGROUND)
+    
+    def refresh_symbol_master(self) -> int:
+        """立即从批量股票列表接口刷新证券代码表，返回股票数"""
+        symbols = self.fetch_symbol_listing()
+        return symbol_master.replace(symbols)
+    
+    def _refresh_symbol_master_claimed(self) -> None:
+        """后台刷新任务（已占用刷新标记）"""
         try:
-            eq_data = self.eq_sina.real([code], prefix=True)
+            self.refresh_symbol_master()
+        except Exception as e:
+            logger.error(f"刷新证券代码表失败: {e}")
+        finally:
+            symbol_master.finish_refresh()
+    
+    def fetch_symbol_listing(self) -> List[Dict[str, Any]]:
+        """
+        从东方财富沪深京A股列表（push2 clist）取回全部A股的代码、名称和行业
+        
+        第一页得到总数后，其余各页并发请求；任何一页失败都抛出异常，
+        避免用不完整的列表覆盖代码表。
+        """
+        def page_request(page: int) -> tuple:
+            url = "http://push2.eastmoney.com/api/qt/clist/get"
+            params = {
+                'pn': page,
+                'pz': config.SYMBOL_LISTING_PAGE_SIZE,
+                'po': 0,
+                'np': 1,
+                'fid': 'f12',
+                'fs': 'm:0+t:6,m:0+t:80,m:1+t:2,m:1+t:23,m:0+t:81+s:2048',  # 沪深主板、创业板、科创板、北交所
+                'fields': 'f12,f14,f100'  # 代码、名称、行业
+            }
+            return url, {'params': params, 'timeout': 5}
+        
+        def parse_page(response) -> tuple:
+            data = response.json().get('data') or {}
+            rows = data.get('diff') or []
+            if isinstance(rows, dict):
+                rows = list(rows.values())
+            return data.get('total', 0), rows
+        
+        url, kwargs = page_request(1)
+        total, rows = parse_page(self._http_get(url, **kwargs))
+        
+        page_count = -(-total // config.SYMBOL_LISTING_PAGE_SIZE)
+        responses = self._http_get_many([page_request(page) for page in range(2, page_count + 1)])
+        for response in responses:
+            if isinstance(response, Exception):
+                raise response
+            rows.extend(parse_page(response)[1])
+        
+        symbols = {}
+        for row in rows:
+            code = str(row.get('f12') or '')
+            name = str(row.get('f14') or '').strip()
+            if len(code) != config.STOCK_CODE_LENGTH or not name:
+                continue
+            industry = row.get('f100')
+            symbols[code] = symbol_master.make_symbol(code, name, industry=industry if industry not in (None, '-') else '')
+        
+        if not symbols:
+            raise ValueError("批量股票列表为空")
+        
+        logger.info(f"批量股票列表获取成功，共 {len(symbols)} 只（{page_count} 页）")
+        return list(symbols.values())
+    
+    # ==================== 上游请求（熔断保护） ====================
+    
+    def _http_get(self, url: str, **kwargs) -> requests.Response:
+        """
+        经熔断器保护的上游GET请求
+        
+        熔断打开的主机直接抛出 UpstreamUnavailableError，不占用超时时间，
+        调用方的降级链路因此会立即转向下一个数据源。
+        HTTP状态码 >= 400 或请求异常计为失败。
+        传入的 timeout 作为默认值，该主机积累足够延迟样本后改用自适应超时。
+        启用异步后端时，请求在异步事件循环中执行（同步等待结果）；
+        stream=True 的流式请求始终使用同步连接池（异步后端会一次读取完整响应体），调用方读取后需 close。
+        """
+        breaker = upstream_registry.for_url(url)
+        if not breaker.allow_request():
+            raise self._upstream_skipped(breaker)
+        
+        kwargs['timeout'] = self._cap_timeout(
+            breaker, breaker.get_timeout(kwargs.get('timeout', config.UPSTREAM_DEFAULT_TIMEOUT)))
+        
+        start_time = time.time()
+        try:
+            if self.async_backend and not kwargs.get('stream'):
+                response = self.async_backend.get(url, **kwargs)
+            else:
+                response = self.session.get(url, **kwargs)
+        except Exception as e:
+            self._record_upstream_result(breaker, time.time() - start_time, e)
+            raise
+        
+        self._record_upstream_result(breaker, time.time() - start_time, response)
+        return response
+    
+    def _http_get_many(self, request_list: List[tuple]) -> List[Any]:
+        """
+        并发执行一组经熔断器保护的上游GET请求
+        
+        启用异步后端时全部请求在一个事件循环中并发执行；
+        否则提交到进程级线程池。
+        
+        Args:
+            request_list: [(url, 请求参数)]
             
+        Returns:
+            与请求顺序一致的结果列表，失败或被熔断跳过的请求对应位置为异常对象
+        """
+        results = [None] * len(request_list)
+        prepared = []  # (下标, 熔断器, url, 请求参数)
+        for index, (url, kwargs) in enumerate(request_list):
+            breaker = upstream_registry.for_url(url)
+            if not breaker.allow_request():
+                results[index] = self._upstream_skipped(breaker)
+                continue
+            kwargs = dict(kwargs)
+            try:
+                kwargs['timeout'] = self._cap_timeout(
+                    breaker, breaker.get_timeout(kwargs.get('timeout', config.UPSTREAM_DEFAULT_TIMEOUT)))
+            except requests.exceptions.Timeout as e:
+                results[index] = e
+                continue
+            prepared.append((index, breaker, url, kwargs))
+        
+        if self.async_backend:
+            # 异步响应的 elapsed 为包含读取响应体的墙钟耗时，失败请求按整组耗时计
+            start_time = time.time()
+            responses = self.async_backend.get_many([(url, kwargs) for _, _, url, kwargs in prepared])
+            timed = [
+                (response, time.time() - start_time if isinstance(response, Exception) else response.elapsed.total_seconds())
+                for response in responses
+            ]
+        else:
+            futures = [fetch_executor.submit(self._timed_get, url, **kwargs) for _, _, url, kwargs in prepared]
+            timed = [fetch_executor.result(future) for future in futures]
+        
+        for (index, breaker, _, _), (response, latency) in zip(prepared, timed):
+            self._record_upstream_result(breaker, latency, response)
+            results[index] = response
+        
+        return results
+    
+    def _timed_get(self, url: str, **kwargs) -> tuple:
+        """
+        同步GET请求，返回 (响应或异常, 耗时秒)
+        耗时为请求开始到读取完响应体的墙钟时间（与 _http_get 一致，不含线程池排队时间），
+        不使用 response.elapsed（只计到收到响应头）
+        """
+        start_time = time.time()
+        try:
+            response = self.session.get(url, **kwargs)
+        except Exception as e:
+            return e, time.time() - start_time
+        return response, time.time() - start_time
+    
+    def _record_upstream_result(self, breaker, latency: float, result: Any) -> None:
+        """记录一次上游请求的结果到熔断器和分段计时（超时、异常、HTTP >= 400 计为失败）"""
+        if isinstance(result, requests.exceptions.Timeout):
+            breaker.record_failure(latency, timed_out=True)
+            outcome = request_timing.OUTCOME_TIMEOUT
+        elif isinstance(result, Exception):
+            breaker.record_failure(latency)
+            outcome = request_timing.OUTCOME_ERROR
+        elif result.status_code >= 400:
+            breaker.record_failure(latency)
+            outcome = f"http_{result.status_code}"
+        else:
+            breaker.record_success(latency)
+            outcome = request_timing.OUTCOME_OK
+        request_timing.record_upstream(breaker.host, latency, outcome)
+    
+    def _cap_timeout(self, breaker, timeout: float) -> float:
+        """
+        按当前获取截止时间收紧上游请求超时（每次尝试平分剩余时间，连接池重试后仍不超过截止时间）
+        截止时间已过时不再发出请求（不计入熔断器），记为超时并抛出 requests.exceptions.Timeout
+        """
+        deadline = _fetch_deadline.get()
+        if deadline is None:
+            return timeout
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            request_timing.record_upstream(breaker.host, 0.0, request_timing.OUTCOME_TIMEOUT)
+            raise requests.exceptions.Timeout(f"已超过获取截止时间，未请求上游 {breaker.host}")
+        return min(timeout, remaining / self.upstream_attempts)
+    
+    def _upstream_skipped(self, breaker) -> UpstreamUnavailableError:
+        """熔断中被跳过的请求：计入分段计时并返回对应的异常"""
+        request_timing.record_upstream(breaker.host, 0.0, request_timing.OUTCOME_SKIPPED)
+        return UpstreamUnavailableError(f"上游 {breaker.host} 熔断中，已跳过")
+    
+    def _sina_real(self, codes: List[str]) -> Dict[str, Any]:
+        """经熔断器保护的新浪实时行情请求（easyquotation）"""
+        breaker = upstream_registry.get('hq.sinajs.cn')
+        if not breaker.allow_request():
+            raise self._upstream_skipped(breaker)
+        self._cap_timeout(breaker, config.UPSTREAM_DEFAULT_TIMEOUT)  # easyquotation 不支持单次超时，只检查截止时间
+        
+        start_time = time.time()
+        try:
+            eq_data = self.eq_sina.real(codes, prefix=True)
+        except Exception as e:
+            self._record_upstream_result(breaker, time.time() - start_time, e)
+            raise
+        
+        breaker.record_success(time.time() - start_time)
+        request_timing.record_upstream(breaker.host, time.time() - start_time, request_timing.OUTCOME_OK)
+        return eq_data
+    
+    # ==================== 上游资源获取（每个资源在一次快照中只请求一次） ====================
+    
+    def _fetch_sina_quote(self, code: str) -> Dict[str, Any]:
+        """新浪实时行情（easyquotation）"""
+        try:
+            eq_data = self._sina_real([code])
             for key, value in eq_data.items():
                 if code in key:
-                    current_price = value.get('now', 0)
-                    yesterday_close = value.get('close', 0)
-                    
-                    # 计算涨跌幅和涨跌额
-                    change_amount = current_price - yesterday_close if yesterday_close > 0 else 0
-                    change_percent = (change_amount / yesterday_close * 100) if yesterday_close > 0 else 0
-                    
-                    return {
-                        'name': value.get('name', ''),
-                        'current_price': current_price,
-                        'change_percent': round(change_percent, 2),
-                        'change_amount': round(change_amount, 2)
-                    }
+                    return value
+            return {}
+        except Exception as e:
+            logger.error(f"获取新浪行情失败 {code}: {e}")
+            return {}
+    
+    def _fetch_tencent_quote(self, code: str) -> Optional[TencentQuote]:
+        """腾讯行情（qt.gtimg.cn），获取失败时返回None"""
+        try:
+            tencent_code = self._market_symbol(code)
+            return self._fetch_tencent_quotes([tencent_code]).get(tencent_code)
+        except Exception as e:
+            logger.error(f"获取腾讯行情失败 {code}: {e}")
+            return None
+    
+    def _fetch_tencent_quotes(self, symbols: List[str]) -> Dict[str, TencentQuote]:
+        """腾讯行情多代码请求（qt.gtimg.cn?q=sh600000,sz000001,...），返回 {带市场前缀代码: 行情记录}"""
+        url = f"http://qt.gtimg.cn/q={','.join(symbols)}"
+        
+        response = self._http_get(url, timeout=2)
+        return parse_tencent_quotes(response.content)
+    
+    def _fetch_eastmoney_stock(self, code: str) -> Dict[str, Any]:
+        """东方财富个股数据（push2），一次取回总股本、总市值和行业"""
+        try:
+            url, kwargs = self._eastmoney_stock_request(code)
+            return self._parse_eastmoney_stock(self._http_get(url, **kwargs))
+        except Exception as e:
+            logger.error(f"获取东方财富个股数据失败 {code}: {e}")
+            return {}
+    
+    def _eastmoney_stock_request(self, code: str) -> tuple:
+        """东方财富个股数据请求 (url, 请求参数)"""
+        url = "http://push2.eastmoney.com/api/qt/stock/get"
+        params = {
+            'secid': f"{'1' if exchange_of(code) == 'SH' else '0'}.{code}",  # 深交所和北交所均为 0
+            'fields': 'f116,f117,f127'  # 总股本、总市值、行业
+        }
+        return url, {'params': params, 'timeout': 2}
+    
+    def _parse_eastmoney_stock(self, response) -> Dict[str, Any]:
+        """解析东方财富个股数据"""
+        data = response.json()
+        
+        if isinstance(data, dict) and data.get('data'):
+            return data['data']
+        return {}
+    
+    def _fetch_eastmoney_fn_main(self, code: str) -> Dict[str, Any]:
+        """东方财富财务主表（RPT_DMSK_FN_MAIN）最新一期，一次取回ROE、EPS和每股分红"""
+        try:
+            url, kwargs = self._eastmoney_fn_main_request(code)
+            return self._parse_eastmoney_fn_main(self._http_get(url, **kwargs))
+        except Exception as e:
+            logger.error(f"获取东方财富财务主表失败 {code}: {e}")
             return {}
+    
+    def _eastmoney_fn_main_request(self, code: str) -> tuple:
+        """东方财富财务主表请求 (url, 请求参数)"""
+        url = "http://datacenter-web.eastmoney.com/api/data/v1/get"
+        params = {
+            'sortColumns': 'REPORT_DATE',
+            'sortTypes': '-1',
+            'pageSize': '1',
+            'pageNumber': '1',
+            'reportName': 'RPT_DMSK_FN_MAIN',
+            'columns': 'SECUCODE,REPORT_DATE,ROEJQ,EPSJB,MGJYXJJE',
+            'filter': f'(SECUCODE="{code}.{exchange_of(code)}")'
+        }
+        return url, {'params': params, 'timeout': 2}
+    
+    def _parse_eastmoney_fn_main(self, response) -> Dict[str, Any]:
+        """解析东方财富财务主表最新一期"""
+        if response.status_code != 200:
+            return {}
+        
+        try:
+            data = response.json()
+        except:
+            return {}
+        
+        if not isinstance(data, dict):
+            return {}
+        
+        result = data.get('result')
+        if not result or not isinstance(result, dict):
+            return {}
+        
+        result_data = result.get('data')
+        if not result_data or not isinstance(result_data, list):
+            return {}
+        
+        row = result_data[0]
+        return row if isinstance(row, dict) else {}
+    
+    def _prefetch_fundamental_resources(self, plans: Dict[str, SnapshotFetchPlan],
+                                        stale_groups: Optional[Dict[str, List[str]]] = None) -> None:
+        """
+        批量预取多只股票的东方财富个股数据和财务主表，并发请求后填充各自的请求计划
+        
+        启用异步后端时，全部请求在一个事件循环中并发执行。
+        请求失败的资源以空结果填充，与单次快照中该资源请求失败的处理一致。
+        
+        Args:
+            stale_groups: {code: 需要获取的字段组}，只预取这些字段组用到的资源；默认全部预取
+        """
+        resources = [
+            ('eastmoney_stock', ('valuation', 'industry'), self._eastmoney_stock_request, self._parse_eastmoney_stock),
+            ('eastmoney_fn_main', ('roe', 'dividend_ratio'), self._eastmoney_fn_main_request, self._parse_eastmoney_fn_main)
+        ]
+        
+        jobs = []
+        request_list = []
+        for code in plans:
+            for key, used_by, build_request, parser in resources:
+                if stale_groups is not None and not set(used_by) & set(stale_groups.get(code, [])):
+                    continue
+                jobs.append((code, key, parser))
+                request_list.append(build_request(code))
+        
+        if not request_list:
+            return
+        
+        for (code, key, parser), response in zip(jobs, self._http_get_many(request_list)):
+            value = {}
+            if isinstance(response, Exception):
+                logger.error(f"批量预取 {key} 失败 {code}: {response}")
+            else:
+                try:
+                    value = parser(response)
+                except Exception as e:
+                    logger.error(f"解析 {key} 失败 {code}: {e}")
+            plans[code].prime(key, value)
+    
+    # ==================== 字段提取 ====================
+    
+    def _get_basic_data(self, code: str, plan: Optional[SnapshotFetchPlan] = None) -> Dict[str, Any]:
+        """获取基础行情数据"""
+        try:
+            plan = plan or SnapshotFetchPlan(code)
+            value = plan.fetch('sina_quote', self._fetch_sina_quote, code)
+            if not value:
+                return {}
+            
+            return self._format_basic_quote(value)
         except Exception as e:
             logger.error(f"获取基础数据失败 {code}: {e}")
             return {}
     
-    def _get_valuation_data(self, code: str) -> Dict[str, float]:
+    def _format_basic_quote(self, value: Dict[str, Any]) -> Dict[str, Any]:
+        """将新浪行情转换为基础行情字段（名称、当前价格、涨跌幅、涨跌额）"""
+        current_price = value.get('now', 0)
+        yesterday_close = value.get('close', 0)
+        
+        # 计算涨跌幅和涨跌额
+        change_amount = current_price - yesterday_close if yesterday_close > 0 else 0
+        change_percent = (change_amount / yesterday_close * 100) if yesterday_close > 0 else 0
+        
+        return {
+            'name': value.get('name', ''),
+            'current_price': current_price,
+            'change_percent': round(change_percent, 2),
+            'change_amount': round(change_amount, 2)
+        }
+    
+    def _get_valuation_data(self, code: str, plan: Optional[SnapshotFetchPlan] = None) -> Dict[str, float]:
         """获取估值数据"""
         try:
-            # 腾讯财经接口
-            tencent_code = f"sh{code}" if code.startswith('6') else f"sz{code}"
-            url = f"http://qt.gtimg.cn/q={tencent_code}"
-            
-            response = self.session.get(url, timeout=2)
-            response.encoding = 'gbk'
-            data = response.text
-            
-            pe_ttm = 0
-            pb = 0
-            total_shares = 0
-            
-            match = re.search(rf'v_{tencent_code}="([^"]+)"', data)
-            if match:
-                fields = match.group(1).split('~')
-                if len(fields) > 50:
-                    try:
-                        pe_ttm = float(fields[39]) if fields[39] and fields[39] != '-' else 0
-                        pb = float(fields[46]) if fields[46] and fields[46] != '-' else 0
-                        total_shares = float(fields[38]) if len(fields) > 38 and fields[38] else 0
-                    except:
-                        pass
+            plan = plan or SnapshotFetchPlan(code)
+            quote = plan.fetch('tencent_quote', self._fetch_tencent_quote, code)
             
             # 计算总市值
-            total_market_value = self._get_market_value(code, total_shares)
+            total_market_value = self._get_market_value(code, quote, plan)
             
             return {
-                'pe_ttm': pe_ttm,
-                'pb': pb,
+                'pe_ttm': quote.pe_ttm if quote else 0,
+                'pb': quote.pb if quote else 0,
                 'total_market_value': total_market_value
             }
         except Exception as e:
             logger.error(f"获取估值数据失败 {code}: {e}")
             return {'pe_ttm': 0, 'pb': 0, 'total_market_value': 0}
     
-    def _get_market_value(self, code: str, total_shares: float) -> float:
-        """获取总市值"""
+    def _get_market_value(self, code: str, quote: Optional[TencentQuote],
+                          plan: Optional[SnapshotFetchPlan] = None) -> float:
+        """获取总市值（亿元）"""
         try:
-            # 方法1: 从东方财富获取
-            url = "http://push2.eastmoney.com/api/qt/stock/get"
-            params = {
-                'secid': f"{'1' if code.startswith('6') else '0'}.{code}",
-                'fields': 'f116,f117'  # 总股本、总市值
-            }
-            
-            response = self.session.get(url, params=params, timeout=2)
-            data = response.json()
+            plan = plan or SnapshotFetchPlan(code)
             
-            if 'data' in data and data['data']:
-                # 总市值（元），转换为亿元
-                market_value = data['data'].get('f117', 0)
-                if market_value:
-                    return round(market_value / 100000000, 2)
-            
-            # 方法2: 如果东方财富失败，用腾讯数据计算
-            if total_shares > 0:
-                current_price = self._get_current_price(code)
+            # 方法1: 从东方财富获取
+            em_data = plan.fetch('eastmoney_stock', self._fetch_eastmoney_stock, code)
+            # 总市值（元），转换为亿元
+            market_value = em_data.get('f117', 0)
+            if market_value and isinstance(market_value, (int, float)):
+                return round(market_value / 100000000, 2)
+            
+            # 方法2: 如果东方财富失败，使用腾讯行情的总市值，或用总股本计算
+            if quote and quote.total_market_value > 0:
+                return round(quote.total_market_value, 2)
+            if quote and quote.total_shares > 0:
+                current_price = self._get_current_price(code, plan)
                 if current_price > 0:
-                    return round((current_price * total_shares) / 10000, 2)
+                    return round((current_price * quote.total_shares) / 100000000, 2)
             
             return 0
         except Exception as e:
             logger.error(f"获取市值失败 {code}: {e}")
             return 0
     
-    def _get_current_price(self, code: str) -> float:
+    def _get_current_price(self, code: str, plan: Optional[SnapshotFetchPlan] = None) -> float:
         """获取当前价格"""
         try:
-            eq_data = self.eq_sina.real([code], prefix=True)
-            for key, value in eq_data.items():
-                if code in key:
-                    return value.get('now', 0)
-            return 0
+            plan = plan or SnapshotFetchPlan(code)
+            value = plan.fetch('sina_quote', self._fetch_sina_quote, code)
+            return value.get('now', 0) if value else 0
         except:
             return 0
     
-    def _get_financial_data(self, code: str) -> Dict[str, Any]:
-        """获取财务数据（ROE、行业、股利支付率）"""
-        # 先尝试从API获取ROE
-        roe = self._get_roe_from_apis(code)
-        
-        # 如果API获取失败，尝试计算ROE
-        if roe == 0:
-            roe = self._calculate_roe(code)
-        
-        # 如果还是0，使用行业平均值
-        if roe == 0:
-            industry = self._get_industry(code)
-            industry_roe_map = {
-                '银行': 12.5,
-                '银行业': 12.5,
-                '汽车制造业': 8.0,
-                '房地产业': 10.0,
-                '未知行业': 8.0
+    def _fetch_field_groups(self, code: str, plan: SnapshotFetchPlan,
+                            group_names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        并发获取互相独立的字段组
+        
+        各字段组共享同一个请求计划，同一上游资源仍只请求一次；
+        整体耗时取决于最慢的字段组，而不是各组耗时之和。
+        超时或失败的字段组使用默认值。
+        
+        Args:
+            group_names: 需要获取的字段组，默认全部
+        """
+        # 字段组 -> (获取函数, 默认值, 数据源)；ROE的数据源为竞速胜出者，降级路径在获取函数中改写数据源
+        group_tasks = {
+            'basic': (self._get_basic_data, {}, 'sina'),
+            'valuation': (self._get_valuation_data, {'pe_ttm': 0, 'pb': 0, 'total_market_value': 0}, 'tencent'),
+            'roe': (self._get_roe, 0, None),
+            'industry': (self._get_industry, '未知行业', 'eastmoney'),
+            'dividend_ratio': (self._get_dividend_ratio, 20.0, 'eastmoney')
+        }
+        
+        # 提交到进程级线程池，优先级继承当前请求（详情为交互式，批量为批量级）；
+        # 截止时间随任务上下文传递，线程池饱和、任务由当前线程直接执行时上游请求同样不超过剩余时间
+        deadline = time.time() + self.field_group_timeout
+        token = _fetch_deadline.set(min(deadline, _fetch_deadline.get() or deadline))
+        try:
+            futures = {
+                name: fetch_executor.submit(self._timed_field_group, name, group_tasks[name], code, plan)
+                for name in group_tasks
+                if group_names is None or name in group_names
             }
-            roe = industry_roe_map.get(industry, 8.0)
+        finally:
+            _fetch_deadline.reset(token)
         
-        # 获取行业信息
-        industry = self._get_industry(code)
+        results = {}
+        for name, future in futures.items():
+            default = group_tasks[name][1]
+            try:
+                results[name] = fetch_executor.result(future, timeout=max(deadline - time.time(), 0))
+            except concurrent.futures.TimeoutError:
+                future.cancel()  # 尚未开始执行的任务不再占用线程池
+                logger.warning(f"股票 {code} 字段组 {name} 获取超时，使用默认值")
+                results[name] = default
+            except Exception as e:
+                logger.error(f"股票 {code} 字段组 {name} 获取失败: {e}")
+                results[name] = default
+        
+        return results
+    
+    def _timed_field_group(self, name: str, task: tuple, code: str, plan: SnapshotFetchPlan) -> Any:
+        """获取一个字段组并计时（结果等于默认值时记为 default）"""
+        func, default, source = task
+        with request_timing.stage(name, source) as record:
+            value = func(code, plan)
+            if value == default:
+                record.outcome = request_timing.OUTCOME_DEFAULT
+            return value
+    
+    def _get_financial_data(self, code: str, plan: Optional[SnapshotFetchPlan] = None) -> Dict[str, Any]:
+        """获取财务数据（ROE、行业、股利支付率）"""
+        plan = plan or SnapshotFetchPlan(code)
+        
+        # 获取行业信息（东方财富个股数据在本次快照中共享）
+        industry = self._get_industry(code, plan)
+        
+        # ROE获取失败时使用行业平均值
+        roe = self._get_roe(code, plan) or self._get_industry_average_roe(industry)
         
         # 计算股利支付率
-        dividend_ratio = self._get_dividend_ratio(code)
+        dividend_ratio = self._get_dividend_ratio(code, plan)
         
         return {
             'roe': roe,
@@ -306,18 +1050,151 @@ class StockService:
             'dividend_ratio': dividend_ratio
         }
     
-    def _calculate_roe(self, code: str) -> float:
-        """通过财务数据计算ROE = 净利润 / 净资产"""
+    def _get_roe(self, code: str, plan: Optional[SnapshotFetchPlan] = None) -> float:
+        """
+        获取ROE：各数据源按竞速/对冲策略并发请求，取最先返回的有效值
+        
+        数据源（东方财富、雪球、同花顺、财务摘要计算、EPS/BPS推算）的启动延迟
+        由 config.ROE_SOURCE_HEDGE_DELAYS 配置：0 表示立即竞速，大于0表示
+        延迟到达且仍无有效结果时才发起。都失败返回0。
+        """
+        plan = plan or SnapshotFetchPlan(code)
+        
+        roe_sources = {
+            'eastmoney': lambda: self._get_roe_from_eastmoney(code, plan),
+            'xueqiu': lambda: self._get_roe_from_xueqiu(code),
+            '10jqka': lambda: self._get_roe_from_10jqka(code),
+            'statements': lambda: self._calculate_roe_from_statements(code),
+            'eps': lambda: self._calculate_roe_from_eps(code, plan)
+        }
+        
+        tasks = [
+            (name, config.ROE_SOURCE_HEDGE_DELAYS.get(name, 0), func)
+            for name, func in roe_sources.items()
+        ]
+        
+        winner = self._race_sources(
+            tasks,
+            is_valid=lambda roe: isinstance(roe, (int, float)) and 0 < roe < 100,
+            timeout=config.ROE_RESOLVE_TIMEOUT,
+            stage_name='roe'
+        )
+        
+        if winner:
+            source, roe = winner
+            logger.debug(f"股票 {code} ROE来自 {source}: {roe}")
+            request_timing.set_source(source)
+            return roe
+        return 0
+    
+    def _race_sources(self, tasks: List[tuple], is_valid, timeout: float, stage_name: str) -> Optional[tuple]:
+        """
+        按对冲延迟竞速执行多个数据源，返回第一个有效结果
+        
+        Args:
+            tasks: [(数据源名称, 启动延迟秒数, 无参函数)]
+            is_valid: 判断结果是否有效的函数
+            timeout: 总超时（秒）
+            stage_name: 分段计时的阶段名前缀，每个数据源计为 {stage_name}.{数据源名称}
+                （胜出为 ok，有效但晚于胜出者为 late，无效结果为 default）
+            
+        Returns:
+            (数据源名称, 结果)，全部失败或超时返回None。
+            取得有效结果后，未启动的数据源不再发起，已在执行的结果被忽略。
+        """
+        pending = sorted(tasks, key=lambda task: task[1])
+        condition = threading.Condition()
+        state = {'winner': None, 'finished': 0}
+        futures = []
+        
+        def run(name, func):
+            with request_timing.stage(f"{stage_name}.{name}") as record:
+                try:
+                    value = func()
+                except Exception as e:
+                    logger.error(f"数据源 {name} 执行失败: {e}")
+                    value = None
+                    record.outcome = request_timing.OUTCOME_ERROR
+                valid = is_valid(value)
+                with condition:
+                    state['finished'] += 1
+                    if state['winner'] is None and valid:
+                        state['winner'] = (name, value)
+                    elif record.outcome == request_timing.OUTCOME_OK:
+                        record.outcome = 'late' if valid else request_timing.OUTCOME_DEFAULT
+                    condition.notify_all()
+        
+        start_time = time.time()
+        launched = 0
+        while True:
+            with condition:
+                elapsed = time.time() - start_time
+                if state['winner'] is not None or elapsed >= timeout:
+                    break
+                
+                # 启动已到延迟时间的数据源；已启动的全部失败时，下一个数据源立即启动
+                while launched < len(pending) and (
+                    pending[launched][1] <= elapsed or state['finished'] == launched
+                ):
+                    name, _, func = pending[launched]
+                    futures.append(fetch_executor.submit(run, name, func))
+                    launched += 1
+                
+                if state['finished'] == len(pending):
+                    break
+                
+                wait_time = timeout - elapsed
+                if launched < len(pending):
+                    wait_time = min(wait_time, pending[launched][1] - elapsed)
+                queued = [future for future in futures if not (future.running() or future.done())]
+                if queued:
+                    # 有数据源仍在排队时缩短等待，以便检查线程池是否繁忙
+                    wait_time = min(wait_time, 0.05)
+                condition.wait(max(wait_time, 0.001))
+            
+            # 线程池繁忙、已启动的数据源都还在排队时，由当前线程直接执行一个，至少保证串行推进
+            if queued and not any(future.running() for future in futures):
+                fetch_executor.run_inline(queued[0])
+        
+        with condition:
+            winner = state['winner']
+        
+        # 取消尚未开始执行的数据源
+        for future in futures:
+            future.cancel()
+        
+        return winner
+    
+    def _get_industry_average_roe(self, industry: str) -> float:
+        """行业平均ROE（ROE无法获取时的兜底值）"""
+        industry_roe_map = {
+            '银行': 12.5,
+            '银行业': 12.5,
+            '汽车制造业': 8.0,
+            '房地产业': 10.0,
+            '未知行业': 8.0
+        }
+        return industry_roe_map.get(industry, 8.0)
+    
+    def _calculate_roe_from_statements(self, code: str) -> float:
+        """通过财务报表计算ROE = 净利润 / 净资产"""
         try:
-            # 方法1: 从东方财富获取净利润和净资产
             financial_data = self._get_financial_statements(code)
             
             if financial_data and financial_data['net_profit'] > 0 and financial_data['net_assets'] > 0:
                 roe = (financial_data['net_profit'] / financial_data['net_assets']) * 100
                 return round(roe, 2)
             
-            # 方法2: 通过每股数据计算 ROE = EPS / 每股净资产
-            eps_data = self._get_eps_data(code)
+            return 0
+            
+        except Exception as e:
+            logger.error(f"ROE计算失败 {code}: {e}")
+            return 0
+    
+    def _calculate_roe_from_eps(self, code: str, plan: Optional[SnapshotFetchPlan] = None) -> float:
+        """通过每股数据计算 ROE = EPS / 每股净资产"""
+        try:
+            eps_data = self._get_eps_data(code, plan)
             if eps_data and eps_data['eps'] > 0 and eps_data['bps'] > 0:
                 roe = (eps_data['eps'] / eps_data['bps']) * 100
                 return round(roe, 2)
@@ -337,25 +1214,21 @@ class StockService:
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             }
             
-            response = self.session.get(url, headers=headers, timeout=2)
-            response.encoding = 'gbk'
-            
-            # 解析HTML获取净利润和净资产
-            content = response.text
-            
-            # 查找净利润（单位：万元）
-            net_profit_pattern = r'净利润[^>]*>([^<]*)</td>'
-            net_profit_match = re.search(net_profit_pattern, content)
-            
-            # 查找净资产（单位：万元）
-            net_assets_pattern = r'资产总计[^>]*>([^<]*)</td>'
-            net_assets_match = re.search(net_assets_pattern, content)
-            
-            if net_profit_match and net_assets_match:
+            # 流式读取页面，找到净利润和资产总计（最近一期，位于页面开头）后停止下载
+            response = self._http_get(url, headers=headers, timeout=2, stream=True)
+            try:
+                matches = scan_stream(
+                    response.iter_content(chunk_size=config.SCRAPE_CHUNK_SIZE),
+                    SINA_FINANCE_SUMMARY_PATTERNS
+                )
+            finally:
+                response.close()
+            
+            if 'net_profit' in matches and 'net_assets' in matches:
                 try:
                     # 提取数字，去掉逗号
-                    net_profit_str = net_profit_match.group(1).replace(',', '').replace('--', '0')
-                    net_assets_str = net_assets_match.group(1).replace(',', '').replace('--', '0')
+                    net_profit_str = decode_gbk(matches['net_profit']).replace(',', '').replace('--', '0')
+                    net_assets_str = decode_gbk(matches['net_assets']).replace(',', '').replace('--', '0')
                     
                     net_profit = float(net_profit_str) * 10000  # 转换为元
                     net_assets = float(net_assets_str) * 10000  # 转换为元
@@ -374,38 +1247,23 @@ class StockService:
             logger.error(f"获取财务报表失败 {code}: {e}")
             return None
     
-    def _get_eps_data(self, code: str) -> Optional[Dict[str, float]]:
+    def _get_eps_data(self, code: str, plan: Optional[SnapshotFetchPlan] = None) -> Optional[Dict[str, float]]:
         """获取每股收益和每股净资产"""
         try:
-            # 从腾讯财经获取每股数据
-            tencent_code = f"sh{code}" if code.startswith('6') else f"sz{code}"
-            url = f"http://qt.gtimg.cn/q={tencent_code}"
-            
-            response = self.session.get(url, timeout=2)
-            response.encoding = 'gbk'
-            data = response.text
-            
-            match = re.search(rf'v_{tencent_code}="([^"]+)"', data)
-            if match:
-                fields = match.group(1).split('~')
-                if len(fields) > 50:
-                    try:
-                        current_price = float(fields[3]) if fields[3] else 0
-                        pe_ttm = float(fields[39]) if fields[39] and fields[39] != '-' else 0
-                        pb = float(fields[46]) if fields[46] and fields[46] != '-' else 0
-                        
-                        if current_price > 0 and pe_ttm > 0 and pb > 0:
-                            # EPS = 股价 / PE
-                            eps = current_price / pe_ttm
-                            # BPS = 股价 / PB
-                            bps = current_price / pb
-                            
-                            return {
-                                'eps': eps,
-                                'bps': bps
-                            }
-                    except:
-                        pass
+            # 复用本次快照已取得的腾讯行情
+            plan = plan or SnapshotFetchPlan(code)
+            quote = plan.fetch('tencent_quote', self._fetch_tencent_quote, code)
+            
+            if quote and quote.price > 0 and quote.pe_ttm > 0 and quote.pb > 0:
+                # EPS = 股价 / PE
+                eps = quote.price / quote.pe_ttm
+                # BPS = 股价 / PB
+                bps = quote.price / quote.pb
+                
+                return {
+                    'eps': eps,
+                    'bps': bps
+                }
             
             return None
             
@@ -413,63 +1271,11 @@ class StockService:
             logger.error(f"获取每股数据失败 {code}: {e}")
             return None
     
-    def _get_roe_from_apis(self, code: str) -> float:
-        """从各种API获取ROE（备用方法）"""
-        # 方法1: 东方财富
-        roe = self._get_roe_from_eastmoney(code)
-        if roe > 0:
-            return roe
-        
-        # 方法2: 从雪球获取
-        roe = self._get_roe_from_xueqiu(code)
-        if roe > 0:
-            return roe
-        
-        # 方法3: 从同花顺获取
-        roe = self._get_roe_from_10jqka(code)
-        if roe > 0:
-            return roe
-        
-        return 0
-    
-    def _get_roe_from_eastmoney(self, code: str) -> float:
+    def _get_roe_from_eastmoney(self, code: str, plan: Optional[SnapshotFetchPlan] = None) -> float:
         """从东方财富获取ROE"""
         try:
-            url = "http://datacenter-web.eastmoney.com/api/data/v1/get"
-            params = {
-                'sortColumns': 'REPORT_DATE',
-                'sortTypes': '-1',
-                'pageSize': '1',
-                'pageNumber': '1',
-                'reportName': 'RPT_DMSK_FN_MAIN',
-                'columns': 'SECUCODE,REPORT_DATE,ROEJQ',
-                'filter': f'(SECUCODE="{code}.{"SH" if code.startswith("6") else "SZ"}")'
-            }
-            
-            response = self.session.get(url, params=params, timeout=2)
-            
-            if response.status_code != 200:
-                return 0
-            
-            try:
-                data = response.json()
-            except:
-                return 0
-            
-            if not isinstance(data, dict):
-                return 0
-            
-            result = data.get('result')
-            if not result or not isinstance(result, dict):
-                return 0
-            
-            result_data = result.get('data')
-            if not result_data or not isinstance(result_data, list) or len(result_data) == 0:
-                return 0
-            
-            roe_data = result_data[0]
-            if not isinstance(roe_data, dict):
-                return 0
+            plan = plan or SnapshotFetchPlan(code)
+            roe_data = plan.fetch('eastmoney_fn_main', self._fetch_eastmoney_fn_main, code)
             
             roe = roe_data.get('ROEJQ')
             if roe and isinstance(roe, (int, float)) and roe != 0:
@@ -488,7 +1294,7 @@ class StockService:
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             }
             
-            symbol = f"SH{code}" if code.startswith('6') else f"SZ{code}"
+            symbol = f"{exchange_of(code)}{code}"
             url = f"https://stock.xueqiu.com/v5/stock/finance/cn/indicator.json"
             params = {
                 'symbol': symbol,
@@ -497,7 +1303,7 @@ class StockService:
                 'count': 1
             }
             
-            response = self.session.get(url, params=params, headers=headers, timeout=2)
+            response = self._http_get(url, params=params, headers=headers, timeout=2)
             if response.status_code == 200:
                 data = response.json()
                 
@@ -520,48 +1326,52 @@ class StockService:
             }
             
             url = f"http://basic.10jqka.com.cn/{code}/finance.html"
-            response = self.session.get(url, headers=headers, timeout=2)
-            response.encoding = 'gbk'
-            
-            roe_patterns = [
-                r'净资产收益率[^>]*>([^<]*)</td>',
-                r'ROE[^>]*>([^<]*)</td>',
-                r'净资产收益率.*?(\d+\.?\d*)%'
-            ]
-            
-            for pattern in roe_patterns:
-                match = re.search(pattern, response.text)
-                if match:
-                    try:
-                        roe_str = match.group(1).strip().replace('%', '').replace('--', '0')
-                        roe = float(roe_str)
-                        if 0 < roe < 100:  # 合理范围检查
-                            return round(roe, 2)
-                    except:
-                        continue
-            
-            return 0
+            response = self._http_get(url, headers=headers, timeout=2, stream=True)
+            try:
+                # 按顺序第一个有效的ROE已确定时停止下载
+                matches = scan_stream(
+                    response.iter_content(chunk_size=config.SCRAPE_CHUNK_SIZE),
+                    THS_ROE_PATTERNS,
+                    stop=lambda found: self._select_ths_roe(found) is not None
+                )
+            finally:
+                response.close()
+            
+            return self._select_ths_roe(matches, final=True) or 0
         except Exception as e:
             logger.error(f"同花顺ROE获取失败 {code}: {e}")
             return 0
     
-    def _get_industry(self, code: str) -> str:
+    def _select_ths_roe(self, matches: Dict[str, bytes], final: bool = False) -> Optional[float]:
+        """
+        按 THS_ROE_PATTERNS 的顺序取第一个合理的ROE
+        页面未读完时（final=False），排在前面的模式尚未匹配则无法确定，返回None
+        """
+        for name in THS_ROE_PATTERNS:
+            if name not in matches:
+                if final:
+                    continue
+                return None
+            try:
+                roe = float(decode_gbk(matches[name]).strip().replace('%', '').replace('--', '0'))
+            except ValueError:
+                continue
+            if 0 < roe < 100:  # 合理范围检查
+                return round(roe, 2)
+        return None
+    
+    def _get_industry(self, code: str, plan: Optional[SnapshotFetchPlan] = None) -> str:
         """获取行业信息"""
         try:
-            url = "http://push2.eastmoney.com/api/qt/stock/get"
-            params = {
-                'secid': f"{'1' if code.startswith('6') else '0'}.{code}",
-                'fields': 'f127'  # 行业字段
-            }
+            plan = plan or SnapshotFetchPlan(code)
+            em_data = plan.fetch('eastmoney_stock', self._fetch_eastmoney_stock, code)
             
-            response = self.session.get(url, params=params, timeout=2)
-            data = response.json()
-            
-            if 'data' in data and data['data']:
-                industry = data['data'].get('f127', '未知行业')
+            if em_data:
+                industry = em_data.get('f127', '未知行业')
                 return industry if industry else '未知行业'
             
             # 备用：基于股票代码推断行业
+            request_timing.set_source('code_map')
             industry_map = {
                 '000001': '银行业', '600036': '银行业', '600000': '银行业',
                 '002594': '汽车制造业', '000002': '房地产业'
@@ -572,16 +1382,19 @@ class StockService:
             logger.error(f"获取行业失败 {code}: {e}")
             return '未知行业'
     
-    def _get_dividend_ratio(self, code: str) -> float:
+    def _get_dividend_ratio(self, code: str, plan: Optional[SnapshotFetchPlan] = None) -> float:
         """获取股利支付率"""
         try:
+            plan = plan or SnapshotFetchPlan(code)
+            
             # 方法1: 尝试从真实数据计算
-            dividend_ratio = self._calculate_real_dividend_ratio(code)
+            dividend_ratio = self._calculate_real_dividend_ratio(code, plan)
             if dividend_ratio > 0:
                 return dividend_ratio
             
             # 方法2: 基于行业估算
-            industry = self._get_industry(code)
+            industry = self._get_industry(code, plan)
+            request_timing.set_source('industry_estimate')
             industry_dividend_ratios = {
                 '银行': 35.0,
                 '银行业': 35.0,
@@ -601,39 +1414,20 @@ class StockService:
             logger.error(f"获取股利支付率失败 {code}: {e}")
             return 20.0
     
-    def _calculate_real_dividend_ratio(self, code: str) -> float:
+    def _calculate_real_dividend_ratio(self, code: str, plan: Optional[SnapshotFetchPlan] = None) -> float:
         """尝试计算真实的股利支付率"""
         try:
-            url = "http://datacenter-web.eastmoney.com/api/data/v1/get"
-            params = {
-                'sortColumns': 'REPORT_DATE',
-                'sortTypes': '-1',
-                'pageSize': '1',
-                'pageNumber': '1',
-                'reportName': 'RPT_DMSK_FN_MAIN',
-                'columns': 'SECUCODE,REPORT_DATE,EPSJB,MGJYXJJE',
-                'filter': f'(SECUCODE="{code}.{"SH" if code.startswith("6") else "SZ"}")'
-            }
+            # 与ROE共用同一份财务主表数据
+            plan = plan or SnapshotFetchPlan(code)
+            financial_data = plan.fetch('eastmoney_fn_main', self._fetch_eastmoney_fn_main, code)
             
-            response = self.session.get(url, params=params, timeout=2)
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    if (data and isinstance(data, dict) and
-                            'result' in data and data['result'] and
-                            'data' in data['result'] and data['result']['data']):
-                        
-                        financial_data = data['result']['data'][0]
-                        if isinstance(financial_data, dict):
-                            eps = financial_data.get('EPSJB', 0)  # 每股收益
-                            dividend = financial_data.get('MGJYXJJE', 0)  # 每股分红
-                            
-                            if eps and dividend and eps > 0:
-                                ratio = (float(dividend) / float(eps)) * 100
-                                if 0 <= ratio <= 100:  # 合理范围检查
-                                    return round(ratio, 1)
-                except:
-                    pass
+            eps = financial_data.get('EPSJB', 0)  # 每股收益
+            dividend = financial_data.get('MGJYXJJE', 0)  # 每股分红
+            
+            if eps and dividend and eps > 0:
+                ratio = (float(dividend) / float(eps)) * 100
+                if 0 <= ratio <= 100:  # 合理范围检查
+                    return round(ratio, 1)
             
             return 0
         except Exception as e:
@@ -716,7 +1510,8 @@ class StockService:
                 'cache_hit': bool,
                 'count': int,
                 'period': str,
-                'stock_code': str
+                'stock_code': str,
+                'cache_entry': 返回数据所在的缓存项（用于生成与内容一致的ETag），未缓存时为None
             }
         """
         try:
@@ -726,28 +1521,36 @@ class StockService:
             cache_key = f"stock_history_{code}_{period}"
             cache_hit = False
             
-            if self._is_history_cache_valid(cache_key):
+            cache_entry = self.cache.get(cache_key)
+            history_cache_valid = self._is_history_cache_valid(cache_entry)
+            metrics.record_cache_lookup('history', history_cache_valid)
+            if history_cache_valid:
                 logger.info(f"使用缓存的历史数据: {code}_{period}")
-                history_data = self.cache[cache_key]['data']
+                history_data = cache_entry['data']
                 cache_hit = True
             else:
                 # 获取历史数据
-                history_data = self._fetch_stock_history(code, period)
+                with request_timing.stage('history') as record:
+                    history_data = self._fetch_stock_history(code, period)
+                    if not history_data:
+                        record.outcome = request_timing.OUTCOME_DEFAULT
                 
                 if history_data:
                     # 缓存结果（30分钟）
-                    self._set_history_cache(cache_key, history_data)
+                    cache_entry = self._set_history_cache(cache_key, history_data)
                     logger.info(f"股票 {code} 历史数据获取成功，共 {len(history_data)} 条记录")
                 else:
                     logger.warning(f"股票 {code} 历史数据获取失败")
                     history_data = []
+                    cache_entry = None
             
             return {
                 'data': history_data,
                 'cache_hit': cache_hit,
                 'count': len(history_data),
                 'period': period,
-                'stock_code': code
+                'stock_code': code,
+                'cache_entry': cache_entry
             }
                 
         except Exception as e:
@@ -757,7 +1560,8 @@ class StockService:
                 'cache_hit': False,
                 'count': 0,
                 'period': period,
-                'stock_code': code
+                'stock_code': code,
+                'cache_entry': None
             }
     
     def _fetch_stock_history(self, code: str, period: str) -> List[Dict[str, Any]]:
@@ -788,7 +1592,7 @@ class StockService:
             start_date = self._calculate_start_date(end_date, period)
             
             # 腾讯财经历史数据接口
-            tencent_code = f"sh{code}" if code.startswith('6') else f"sz{code}"
+            tencent_code = self._market_symbol(code)
             url = f"http://web.ifzq.gtimg.cn/appstock/app/fqkline/get"
             
             params = {
@@ -796,7 +1600,7 @@ class StockService:
                 '_var': 'kline_dayqfq'
             }
             
-            response = self.session.get(url, params=params, timeout=10)
+            response = self._http_get(url, params=params, timeout=10)
             response.encoding = 'utf-8'
             
             # 解析响应
@@ -824,7 +1628,7 @@ class StockService:
             start_date = self._calculate_start_date(end_date, period)
             
             # 新浪财经历史数据接口
-            sina_code = f"sh{code}" if code.startswith('6') else f"sz{code}"
+            sina_code = self._market_symbol(code)
             url = f"http://money.finance.sina.com.cn/quotes_service/api/json_v2.php/CN_MarketData.getKLineData"
             
             params = {
@@ -834,7 +1638,7 @@ class StockService:
                 'datalen': self._get_data_length(period)
             }
             
-            response = self.session.get(url, params=params, timeout=10)
+            response = self._http_get(url, params=params, timeout=10)
             response.encoding = 'utf-8'
             
             if response.status_code == 200:
@@ -859,7 +1663,7 @@ class StockService:
             netease_code = f"0{code}" if code.startswith('0') or code.startswith('3') else f"1{code}"
             url = f"http://img1.money.126.net/data/hs/kline/day/history/{datetime.now().year}/{netease_code}.json"
             
-            response = self.session.get(url, timeout=10)
+            response = self._http_get(url, timeout=10)
             response.encoding = 'utf-8'
             
             if response.status_code == 200:
@@ -976,49 +1780,177 @@ class StockService:
             logger.error(f"解析网易K线数据失败: {e}")
             return []
     
-    def _is_history_cache_valid(self, cache_key: str) -> bool:
-        """检查历史数据缓存是否有效（30分钟）"""
-        if cache_key not in self.cache:
+    def _is_history_cache_valid(self, cache_data: Optional[Dict[str, Any]]) -> bool:
+        """检查历史数据缓存项是否有效（30分钟）"""
+        if cache_data is None:
             return False
         
-        cache_time = self.cache[cache_key]['timestamp']
+        cache_time = cache_data['timestamp']
         # 历史数据缓存30分钟
         return (datetime.now() - cache_time).seconds < 1800
     
-    def _set_history_cache(self, cache_key: str, data: Any) -> None:
-        """设置历史数据缓存"""
-        self.cache[cache_key] = {
+    def _set_history_cache(self, cache_key: str, data: Any) -> Dict[str, Any]:
+        """设置历史数据缓存，返回写入的缓存项"""
+        entry = {
             'data': data,
-            'timestamp': datetime.now()
+            'timestamp': datetime.now(),
+            'ttl': 1800,
+            'version': next(self._cache_versions)
         }
+        self.cache[cache_key] = entry
+        return entry
     
-    def get_batch_stocks(self, codes: List[str]) -> List[Dict[str, Any]]:
+    def _market_symbol(self, code: str) -> str:
+        """转换为带市场前缀的代码（sh600000 / sz000001 / bj430047），已带前缀的原样返回"""
+        if code[:2] in ('sh', 'sz', 'bj'):
+            return code
+        return f"{exchange_of(code).lower()}{code}"
+    
+    def _fetch_batch_raw(self, codes: List[str], with_valuation: bool = True) -> tuple:
+        """
+        批量获取原始行情
+        
+        新浪行情一次请求全部代码（easyquotation内部按800只分段），
+        腾讯行情按 quote_batch_size 分段，每段一次请求。
+        
+        Returns:
+            (新浪行情 {code: dict}, 腾讯行情 {code: TencentQuote})
+        """
+        symbols = {self._market_symbol(code): code for code in codes}
+        sina_quotes = {}
+        tencent_quotes = {}
+        
+        try:
+            eq_data = self._sina_real(list(symbols.keys()))
+            for symbol, value in eq_data.items():
+                if symbol in symbols:
+                    sina_quotes[symbols[symbol]] = value
+        except Exception as e:
+            logger.error(f"批量获取新浪行情失败: {e}")
+        
+        if with_valuation:
+            symbol_list = list(symbols.keys())
+            for i in range(0, len(symbol_list), self.quote_batch_size):
+                chunk = symbol_list[i:i + self.quote_batch_size]
+                try:
+                    for symbol, tencent_quote in self._fetch_tencent_quotes(chunk).items():
+                        if symbol in symbols:
+                            tencent_quotes[symbols[symbol]] = tencent_quote
+                except Exception as e:
+                    logger.error(f"批量获取腾讯行情失败: {e}")
+        
+        return sina_quotes, tencent_quotes
+    
+    def get_batch_quotes(self, codes: List[str], with_valuation: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        批量获取行情（基础行情+估值字段），少量请求覆盖全部代码
+        
+        Args:
+            codes: 股票代码列表（支持6位代码或带 sh/sz 前缀的指数代码）
+            with_valuation: 是否同时获取腾讯估值字段
+            
+        Returns:
+            {code: {'name', 'current_price', 'change_percent', 'change_amount',
+                    'pe_ttm', 'pb', 'total_market_value'}}
+        """
+        sina_quotes, tencent_quotes = self._fetch_batch_raw(codes, with_valuation)
+        
+        quotes = {}
+        for code in codes:
+            value = sina_quotes.get(code)
+            if not value:
+                continue
+            
+            quote = self._format_basic_quote(value)
+            tencent_quote = tencent_quotes.get(code)
+            if tencent_quote:
+                quote['pe_ttm'] = tencent_quote.pe_ttm
+                quote['pb'] = tencent_quote.pb
+                quote['total_market_value'] = tencent_quote.total_market_value
+            quotes[code] = quote
+        
+        return quotes
+    
+    def get_batch_stocks(self, codes: List[str], refresh_ahead: float = 0) -> List[Dict[str, Any]]:
         """
         批量获取股票数据
         
         Args:
             codes: 股票代码列表
+            refresh_ahead: 提前刷新时间（秒），将在该时间内过期的字段层也重新获取
             
         Returns:
-            股票数据列表
+            股票数据列表（按传入顺序）
+        """
+        snapshots = self.get_batch_snapshots(codes, refresh_ahead)
+        
+        ordered_results = []
+        seen_codes = set()
+        for code in codes:
+            if code in snapshots and code not in seen_codes:
+                seen_codes.add(code)
+                ordered_results.append(snapshots[code][0])
+        return ordered_results
+    
+    def get_batch_snapshots(self, codes: List[str], refresh_ahead: float = 0) -> Dict[str, Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]]:
+        """
+        批量获取股票数据及组装时实际使用的缓存项 {代码: (股票数据, {缓存键: 缓存项})}（不含获取失败的代码）
+        
+        先用批量行情一次性取回所有字段层过期代码的新浪/腾讯行情，
+        再为每只股票补齐过期的字段层（未过期的字段层直接使用缓存）。
+        各股票的获取任务使用批量优先级；在后台任务中调用时沿用后台优先级。
         """
         try:
             logger.info(f"批量获取股票数据，共 {len(codes)} 只股票")
-            
-            results = []
-            
-            # 使用线程池并发获取股票数据
-            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                # 提交所有任务
-                future_to_code = {executor.submit(self.get_stock_complete_data, code): code for code in codes}
+            priority = max(PRIORITY_BATCH, fetch_executor.current_priority())
+            
+            results = {}
+            cached_tiers = {}  # code -> 有效字段层缓存项（每只股票只读取一次缓存，组装快照时直接使用）
+            stale_groups = {}  # code -> 过期字段层包含的字段组
+            for code in codes:
+                if code in cached_tiers:
+                    continue
+                tiers = cached_tiers[code] = self._get_cached_tiers(code, refresh_ahead)
+                if len(tiers) == len(self.SNAPSHOT_TIERS):
+                    stock_data, entries = self.get_stock_snapshot(code, cached_tiers=tiers)
+                    if stock_data:
+                        results[code] = (stock_data, entries)
+                else:
+                    stale_groups[code] = [
+                        group for tier, groups in self.SNAPSHOT_TIERS.items()
+                        if tier not in tiers for group in groups
+                    ]
+            
+            missing_codes = list(stale_groups.keys())
+            if missing_codes:
+                # 批量行情：预先填充每只股票的请求计划（估值层都未过期时不请求腾讯行情）
+                with_valuation = any('valuation' in groups for groups in stale_groups.values())
+                sina_quotes, tencent_quotes = self._fetch_batch_raw(missing_codes, with_valuation)
+                plans = {}
+                for code in missing_codes:
+                    plan = SnapshotFetchPlan(code)
+                    if code in sina_quotes:
+                        plan.prime('sina_quote', sina_quotes[code])
+                    if code in tencent_quotes:
+                        plan.prime('tencent_quote', tencent_quotes[code])
+                    plans[code] = plan
+                
+                # 并发预取过期字段组用到的东方财富个股数据和财务主表
+                self._prefetch_fundamental_resources(plans, stale_groups)
+                
+                # 使用进程级线程池（批量优先级）并发补齐财务字段
+                future_to_code = {
+                    fetch_executor.submit(self.get_stock_snapshot, code, plans[code], refresh_ahead,
+                                          cached_tiers[code], priority=priority): code
+                    for code in missing_codes
+                }
                 
                 # 收集结果
-                for future in concurrent.futures.as_completed(future_to_code):
-                    code = future_to_code[future]
+                for future, code in future_to_code.items():
                     try:
-                        stock_data = future.result(timeout=10)  # 10秒超时
+                        stock_data, entries = fetch_executor.result(future)
                         if stock_data:
-                            results.append(stock_data)
+                            results[code] = (stock_data, entries)
                     except Exception as e:
                         logger.error(f"批量获取股票数据失败 {code}: {e}")
             
@@ -1027,7 +1959,7 @@ class StockService:
             
         except Exception as e:
             logger.error(f"批量获取股票数据失败: {e}")
-            return []
+            return {}
     
     def get_market_overview(self) -> Optional[Dict[str, Any]]:
         """
@@ -1036,45 +1968,45 @@ class StockService:
         Returns:
             市场概览数据
         """
+        entry = self.get_market_overview_entry()
+        return entry['data'] if entry else None
+    
+    def get_market_overview_entry(self) -> Optional[Dict[str, Any]]:
+        """获取市场概览的缓存项（含数据和版本号，用于生成与内容一致的ETag），获取失败返回None"""
         try:
             logger.info("获取市场概览数据")
             
             # 检查缓存
             cache_key = "market_overview"
-            if self._is_cache_valid(cache_key):
+            entry = self.cache.get(cache_key)
+            overview_cache_valid = entry is not None and self._is_cache_entry_valid(entry, datetime.now())
+            metrics.record_cache_lookup('market_overview', overview_cache_valid)
+            if overview_cache_valid:
                 logger.info("使用缓存的市场概览数据")
-                return self.cache[cache_key]['data']
+                return entry
             
-            # 获取主要指数数据
+            # 获取主要指数数据（一次批量请求）
             indices = ['sh000001', 'sz399001', 'sz399006']  # 上证指数、深证成指、创业板指
-            market_data = {}
+            quotes = self.get_batch_quotes(indices, with_valuation=False)
             
+            market_data = {}
             for index_code in indices:
-                try:
-                    eq_data = self.eq_sina.real([index_code], prefix=True)
-                    for key, value in eq_data.items():
-                        if index_code in key:
-                            name = value.get('name', '')
-                            current = value.get('now', 0)
-                            yesterday_close = value.get('close', 0)
-                            change_amount = current - yesterday_close if yesterday_close > 0 else 0
-                            change_percent = (change_amount / yesterday_close * 100) if yesterday_close > 0 else 0
-                            
-                            market_data[index_code] = {
-                                'name': name,
-                                'current': current,
-                                'change_amount': round(change_amount, 2),
-                                'change_percent': round(change_percent, 2)
-                            }
-                            break
-                except Exception as e:
-                    logger.error(f"获取指数 {index_code} 数据失败: {e}")
+                quote = quotes.get(index_code)
+                if quote:
+                    market_data[index_code] = {
+                        'name': quote['name'],
+                        'current': quote['current_price'],
+                        'change_amount': quote['change_amount'],
+                        'change_percent': quote['change_percent']
+                    }
+                else:
+                    logger.error(f"获取指数 {index_code} 数据失败")
             
             if market_data:
-                # 缓存结果
-                self._set_cache(cache_key, market_data)
+                # 缓存结果（非交易时段缓存到下一次开盘）
+                entry = self._set_cache(cache_key, market_data, trading_calendar.cache_ttl(self.cache_timeout))
                 logger.info("市场概览数据获取成功")
-                return market_data
+                return entry
             else:
                 logger.warning("市场概览数据获取失败")
                 return None
@@ -1109,46 +2041,127 @@ class StockService:
             test_codes = ['000001', '600036', '000002']
             watchlist = []
             
-            # 使用线程池并发获取股票数据
-            with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-                # 提交所有任务
-                future_to_code = {executor.submit(self.get_stock_complete_data, code): code for code in test_codes}
-                
-                # 收集结果
-                for future in concurrent.futures.as_completed(future_to_code):
-                    code = future_to_code[future]
-                    try:
-                        stock_data = future.result(timeout=10)  # 10秒超时
-                        if stock_data:
-                            stock_data['added_time'] = datetime.now().isoformat()
-                            stock_data['updated_time'] = datetime.now().isoformat()
-                            watchlist.append(stock_data)
-                    except Exception as e:
-                        logger.error(f"获取股票数据失败 {code}: {e}")
+            # 使用进程级线程池（批量优先级）并发获取股票数据
+            future_to_code = {
+                fetch_executor.submit(self.get_stock_complete_data, code, priority=PRIORITY_BATCH): code
+                for code in test_codes
+            }
+            
+            # 收集结果
+            for future, code in future_to_code.items():
+                try:
+                    stock_data = fetch_executor.result(future)
+                    if stock_data:
+                        stock_data['added_time'] = datetime.now().isoformat()
+                        stock_data['updated_time'] = datetime.now().isoformat()
+                        watchlist.append(stock_data)
+                except Exception as e:
+                    logger.error(f"获取股票数据失败 {code}: {e}")
             
             return watchlist
         except Exception as e:
             logger.error(f"获取关注列表失败: {e}")
             return []
     
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """检查缓存是否有效"""
-        if cache_key not in self.cache:
+    def _is_cache_valid(self, cache_key: str, margin: float = 0) -> bool:
+        """
+        检查缓存是否有效（按缓存项自身的有效期，未指定时为 cache_timeout）
+        margin 大于0时，将在 margin 秒内过期的缓存也视为无效
+        """
+        cache_data = self.cache.get(cache_key)
+        if cache_data is None:
             return False
         
-        cache_time = self.cache[cache_key]['timestamp']
-        return (datetime.now() - cache_time).seconds < self.cache_timeout
+        return self._is_cache_entry_valid(cache_data, datetime.now() + timedelta(seconds=margin))
+    
+    def _is_cache_entry_valid(self, cache_data: Dict[str, Any], current_time: datetime) -> bool:
+        """检查单个缓存项在 current_time 时是否仍在有效期内"""
+        ttl = cache_data.get('ttl', self.cache_timeout)
+        return (current_time - cache_data['timestamp']).total_seconds() < ttl
     
-    def _set_cache(self, cache_key: str, data: Any) -> None:
-        """设置缓存"""
-        self.cache[cache_key] = {
+    def _set_cache(self, cache_key: str, data: Any, ttl: Optional[float] = None,
+                   timestamp: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        设置缓存，ttl 为该缓存项的有效期（秒），默认 cache_timeout；返回写入的缓存项
+        timestamp 为数据获取时间，默认为当前时间（从共享快照缓存载入时沿用原获取时间）
+        """
+        entry = {
             'data': data,
-            'timestamp': datetime.now()
+            'timestamp': timestamp or datetime.now(),
+            'ttl': ttl if ttl is not None else self.cache_timeout,
+            'version': next(self._cache_versions)
+        }
+        self.cache[cache_key] = entry
+        return entry
+    
+    def get_cache_validator(self, cache_keys: List[str], extra: tuple = ()) -> Optional[Dict[str, Any]]:
+        """
+        由缓存项版本生成HTTP响应校验信息（强ETag和Last-Modified）
+        
+        缓存项未刷新时响应内容不变，因此ETag可以直接由各缓存项的版本号得到，无需序列化响应体。
+        
+        Args:
+            cache_keys: 响应数据依赖的缓存键
+            extra: 响应中其他影响内容的部分（如用户相关字段）
+        
+        Returns:
+            {'etag': ETag值, 'last_modified': 最后修改时间(UTC)}；任一缓存项不存在或已过期时返回None
+        """
+        current_time = datetime.now()
+        entries = []
+        for cache_key in cache_keys:
+            cache_data = self.cache.get(cache_key)
+            if cache_data is None or not self._is_cache_entry_valid(cache_data, current_time):
+                return None
+            entries.append((cache_key, cache_data))
+        
+        return self.make_cache_validator(entries, extra)
+    
+    def make_cache_validator(self, entries: List[Tuple[str, Dict[str, Any]]], extra: tuple = ()) -> Optional[Dict[str, Any]]:
+        """
+        由组装响应时实际使用的缓存项 [(缓存键, 缓存项), ...] 生成校验信息（与 get_cache_validator 结果一致）
+        
+        组装数据后不再重新读取缓存，避免其他线程在此期间刷新缓存，使ETag对应的版本与响应内容不一致。
+        任一缓存项缺失（None）或列表为空时返回None
+        """
+        parts = [self._cache_epoch]
+        last_modified = None
+        for cache_key, cache_data in entries:
+            if cache_data is None:
+                return None
+            parts.append(f"{cache_key}:{cache_data['version']}")
+            if last_modified is None or cache_data['timestamp'] > last_modified:
+                last_modified = cache_data['timestamp']
+        
+        if last_modified is None:
+            return None
+        
+        parts.extend(str(part) for part in extra)
+        return {
+            'etag': hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:24],
+            'last_modified': last_modified.astimezone(timezone.utc)
         }
     
+    def _cache_family(self, cache_key: str) -> str:
+        """缓存键类别（快照各字段层、history、market_overview），用于指标标签"""
+        if cache_key.startswith('stock_'):
+            return cache_key.split('_', 2)[1]
+        return cache_key
+    
     def clear_cache(self) -> None:
-        """清空缓存"""
+        """清空缓存（按缓存键类别计入淘汰次数）"""
+        evicted = {}
+        for cache_key in list(self.cache):
+            family = self._cache_family(cache_key)
+            evicted[family] = evicted.get(family, 0) + 1
         self.cache.clear()
+        if config.SHARED_SNAPSHOT_CACHE_ENABLED:
+            try:
+                evicted['snapshot_store'] = db_manager.clear_snapshot_cache()
+            except Exception as e:
+                logger.error(f"清空共享快照缓存失败: {e}")
+        for family, count in evicted.items():
+            metrics.cache_evictions.inc(family, amount=count)
         logger.info("缓存已清空")
     
     def get_cache_stats(self) -> Dict[str, Any]:
@@ -1160,9 +2173,8 @@ class StockService:
             
             current_time = datetime.now()
             
-            for cache_key, cache_data in self.cache.items():
-                cache_time = cache_data['timestamp']
-                if (current_time - cache_time).seconds < self.cache_timeout:
+            for cache_key, cache_data in list(self.cache.items()):
+                if self._is_cache_entry_valid(cache_data, current_time):
                     valid_items += 1
                 else:
                     expired_items += 1
@@ -1172,6 +2184,8 @@ class StockService:
                 'valid_items': valid_items,
                 'expired_items': expired_items,
                 'cache_timeout_seconds': self.cache_timeout,
+                'snapshot_tier_ttls': config.SNAPSHOT_CACHE_TTLS,
+                'trading_status': trading_calendar.get_status(),
                 'hit_rate': round((valid_items / total_items * 100) if total_items > 0 else 0, 2)
             }
         except Exception as e:
@@ -1181,6 +2195,7 @@ class StockService:
                 'valid_items': 0,
                 'expired_items': 0,
                 'cache_timeout_seconds': self.cache_timeout,
+                'snapshot_tier_ttls': config.SNAPSHOT_CACHE_TTLS,
                 'hit_rate': 0
             }
 
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+A股证券代码表模块
+保存全部上市A股的代码、名称、交易所、拼音首字母和行业，
+启动时一次性加载到内存索引，支持代码前缀、名称子串和拼音首字母查找；
+数据来自批量股票列表接口（由 StockService 获取）或本地文件
+"""
+
+import bisect
+import csv
+import logging
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from config import get_config
+from database import db_manager
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # pypinyin 为可选依赖，未安装时不支持拼音首字母查找
+    lazy_pinyin = None
+
+# 获取配置
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# 匹配类型排序（数值越小越靠前）
+RANK_CODE_EXACT = 0     # 代码完全匹配
+RANK_NAME_EXACT = 1     # 名称完全匹配
+RANK_CODE_PREFIX = 2    # 代码前缀
+RANK_NAME_PREFIX = 3    # 名称前缀
+RANK_PINYIN_PREFIX = 4  # 拼音首字母前缀
+RANK_NAME_CONTAINS = 5  # 名称包含
+
+
+def normalize_keyword(text: str) -> str:
+    """统一全角/半角、去除空格并转为大写"""
+    return unicodedata.normalize('NFKC', text or '').replace(' ', '').upper()
+
+
+def exchange_of(code: str) -> str:
+    """根据代码判断交易所：SH 上交所、SZ 深交所、BJ 北交所"""
+    if code.startswith('6'):
+        return 'SH'
+    if code.startswith(('0', '3')):
+        return 'SZ'
+    return 'BJ'
+
+
+def pinyin_initials(name: str) -> str:
+    """名称的拼音首字母（大写，仅保留字母和数字），未安装 pypinyin 时返回空字符串"""
+    if lazy_pinyin is None:
+        return ''
+    letters = ''.join(lazy_pinyin(normalize_keyword(name), style=Style.FIRST_LETTER))
+    return ''.join(char for char in letters.upper() if char.isalnum())
+
+
+class SymbolIndex:
+    """
+    证券代码内存索引（构建后只读，刷新时整体替换）
+    
+    - 代码前缀：有序代码列表上二分查找
+    - 名称子串：按字符建立倒排索引，取关键词各字符候选集的交集后再校验子串
+    - 拼音首字母前缀：有序拼音列表上二分查找
+    """
+    
+    def __init__(self, symbols: List[Dict[str, Any]]):
+        self.by_code = {symbol['code']: symbol for symbol in symbols}
+        self.codes = sorted(self.by_code)
+        self.names = {code: normalize_keyword(symbol['name']) for code, symbol in self.by_code.items()}
+        self.pinyins = sorted(
+            (symbol['pinyin'], code) for code, symbol in self.by_code.items() if symbol.get('pinyin')
+        )
+        
+        self.char_index = {}
+        for code, name in self.names.items():
+            for char in set(name):
+                self.char_index.setdefault(char, set()).add(code)
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    def search(self, keyword: str, limit: int) -> List[Dict[str, Any]]:
+        """按匹配类型排序返回前 limit 条"""
+        keyword = normalize_keyword(keyword)
+        if not keyword or limit <= 0:
+            return []
+        
+        ranks = {}
+        
+        def add(code: str, rank: int) -> None:
+            if rank < ranks.get(code, RANK_NAME_CONTAINS + 1):
+                ranks[code] = rank
+        
+        # 代码前缀（同类型内按代码排序，取到 limit 条即可）
+        if keyword.isdigit():
+            start = bisect.bisect_left(self.codes, keyword)
+            for code in self.codes[start:start + limit]:
+                if not code.startswith(keyword):
+                    break
+                add(code, RANK_CODE_EXACT if code == keyword else RANK_CODE_PREFIX)
+        
+        # 名称子串：候选集从最小的字符集合开始求交集
+        candidate_sets = [self.char_index.get(char) for char in set(keyword)]
+        if all(candidate_sets):
+            candidate_sets.sort(key=len)
+            candidates = set(candidate_sets[0]).intersection(*candidate_sets[1:])
+            for code in candidates:
+                name = self.names[code]
+                if name == keyword:
+                    add(code, RANK_NAME_EXACT)
+                elif name.startswith(keyword):
+                    add(code, RANK_NAME_PREFIX)
+                elif keyword in name:
+                    add(code, RANK_NAME_CONTAINS)
+        
+        # 拼音首字母前缀
+        if keyword.isascii() and keyword.isalnum():
+            start = bisect.bisect_left(self.pinyins, (keyword, ''))
+            for pinyin, code in self.pinyins[start:start + limit]:
+                if not pinyin.startswith(keyword):
+                    break
+                add(code, RANK_PINYIN_PREFIX)
+        
+        ordered = sorted(ranks.items(), key=lambda item: (item[1], item[0]))[:limit]
+        return [self.by_code[code] for code, _ in ordered]
+
+
+class SuggestIndex:
+    """
+    联想输入索引（构建后只读）
+    
+    对代码前缀、名称前缀和名称子串（n-gram）、拼音首字母前缀预先计算每个键的
+    前 max_results 条排序结果，查询只是一次字典查找，不做任何排序和I/O。
+    返回的条目只含代码、名称和交易所，减小响应体积。
+    """
+    
+    def __init__(self, symbols: List[Dict[str, Any]], max_results: int = None):
+        self.max_results = max_results or config.SUGGEST_MAX_RESULTS
+        candidates = {}  # 键 -> {code: 排序键}
+        
+        def add(key: str, code: str, score: tuple) -> None:
+            entries = candidates.setdefault(key, {})
+            if code not in entries or score < entries[code]:
+                entries[code] = score
+        
+        entries = {}
+        for symbol in symbols:
+            code = symbol['code']
+            name = normalize_keyword(symbol['name'])
+            entries[code] = {'code': code, 'name': symbol['name'], 'exchange': symbol['exchange']}
+            
+            for i in range(1, len(code) + 1):
+                # 代码匹配按代码排序，名称和拼音匹配优先较短的名称
+                add(code[:i], code, (RANK_CODE_EXACT if i == len(code) else RANK_CODE_PREFIX, 0, code))
+            
+            for start in range(len(name)):
+                for end in range(start + 1, len(name) + 1):
+                    if start == 0:
+                        rank = RANK_NAME_EXACT if end == len(name) else RANK_NAME_PREFIX
+                    else:
+                        rank = RANK_NAME_CONTAINS
+                    add(name[start:end], code, (rank, len(name), code))
+            
+            pinyin = symbol.get('pinyin') or ''
+            for i in range(1, len(pinyin) + 1):
+                add(pinyin[:i], code, (RANK_PINYIN_PREFIX, len(name), code))
+        
+        self.suggestions = {
+            key: [entries[code] for code in sorted(scores, key=scores.get)[:self.max_results]]
+            for key, scores in candidates.items()
+        }
+    
+    def __len__(self) -> int:
+        return len(self.suggestions)
+    
+    def suggest(self, keyword: str, limit: int) -> List[Dict[str, str]]:
+        """返回前 limit 条联想结果"""
+        return self.suggestions.get(normalize_keyword(keyword), [])[:limit]
+
+
+class SymbolMaster:
+    """A股证券代码表（数据库持久化 + 内存索引）"""
+    
+    def __init__(self, symbols_file: str = None):
+        self.symbols_file = symbols_file or config.SYMBOL_MASTER_FILE
+        self._index = SymbolIndex([])
+        self._suggest_index = SuggestIndex([])
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._refreshing = False
+        self._last_refresh_attempt = 0.0
+        self.updated_time = None  # 数据更新时间（来自数据库或网络刷新）
+        self.source = None        # 当前数据来源：database / file / network
+        
+        if lazy_pinyin is None:
+            logger.warning("未安装 pypinyin，证券代码表不支持拼音首字母查找")
+    
+    def ensure_loaded(self) -> None:
+        """首次使用时加载：优先数据库（网络刷新的结果），数据库为空时使用本地文件"""
+        if self._loaded:
+            return
+        
+        with self._lock:
+            if self._loaded:
+                return
+            
+            try:
+                symbols = db_manager.get_symbols()
+                if symbols:
+                    self._install(symbols, 'database')
+                    self.updated_time = max(symbol['updated_time'] or '' for symbol in symbols) or None
+                else:
+                    symbols = self._load_file()
+                    if symbols:
+                        self._install(symbols, 'file')
+            except Exception as e:
+                logger.error(f"加载证券代码表失败: {e}")
+            
+            self._loaded = True
+    
+    def _load_file(self) -> List[Dict[str, Any]]:
+        """从本地文件加载（CSV，列：code,name,exchange,industry；exchange 可为空）"""
+        symbols = []
+        try:
+            with open(self.symbols_file, 'r', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    code = (row.get('code') or '').strip()
+                    name = (row.get('name') or '').strip()
+                    if len(code) == config.STOCK_CODE_LENGTH and code.isdigit() and name:
+                        symbols.append(self.make_symbol(
+                            code, name,
+                            industry=(row.get('industry') or '').strip(),
+                            exchange=(row.get('exchange') or '').strip()
+                        ))
+            logger.info(f"从本地文件加载证券代码 {len(symbols)} 条: {self.symbols_file}")
+        except FileNotFoundError:
+            logger.warning(f"证券代码文件不存在: {self.symbols_file}")
+        except Exception as e:
+            logger.error(f"读取证券代码文件失败 {self.symbols_file}: {e}")
+        return symbols
+    
+    def make_symbol(self, code: str, name: str, industry: str = '', exchange: str = '') -> Dict[str, Any]:
+        """构造一条证券代码记录（交易所未知时按代码推断，拼音首字母由名称生成）"""
+        return {
+            'code': code,
+            'name': name,
+            'exchange': exchange or exchange_of(code),
+            'pinyin': pinyin_initials(name),
+            'industry': industry or ''
+        }
+    
+    def _install(self, symbols: List[Dict[str, Any]], source: str) -> None:
+        """构建新索引并整体替换（读操作无需加锁）"""
+        self._index = SymbolIndex(symbols)
+        self._suggest_index = SuggestIndex(symbols)
+        self.source = source
+        logger.info(f"证券代码索引构建完成，共 {len(self._index)} 只（来源: {source}）")
+    
+    def replace(self, symbols: List[Dict[str, Any]]) -> int:
+        """用完整的股票列表替换代码表（写入数据库并重建索引）"""
+        db_manager.replace_symbols(symbols)
+        with self._lock:
+            self._install(symbols, 'network')
+            self.updated_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._loaded = True
+        return len(symbols)
+    
+    def claim_refresh(self) -> bool:
+        """
+        判断是否需要从网络刷新，需要时占用刷新标记（调用方刷新结束后调用 finish_refresh）
+        数据超过 SYMBOL_MASTER_REFRESH_HOURS 小时或来自本地文件时刷新，失败后间隔一段时间再重试
+        """
+        with self._lock:
+            if self._refreshing:
+                return False
+            if time.time() - self._last_refresh_attempt < config.SYMBOL_MASTER_RETRY_SECONDS:
+                return False
+            
+            stale = self.source != 'database' and self.source != 'network'
+            if not stale:
+                try:
+                    updated = datetime.strptime(self.updated_time, '%Y-%m-%d %H:%M:%S')
+                    stale = datetime.now() - updated > timedelta(hours=config.SYMBOL_MASTER_REFRESH_HOURS)
+                except (TypeError, ValueError):
+                    stale = True
+            if not stale:
+                return False
+            
+            self._refreshing = True
+            self._last_refresh_attempt = time.time()
+            return True
+    
+    def finish_refresh(self) -> None:
+        """释放刷新标记"""
+        with self._lock:
+            self._refreshing = False
+    
+    def search(self, keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """按代码前缀、名称子串、拼音首字母查找，按匹配程度排序"""
+        self.ensure_loaded()
+        return self._index.search(keyword, limit)
+    
+    def suggest(self, keyword: str, limit: int = None) -> List[Dict[str, str]]:
+        """联想输入：纯内存查找，返回代码、名称和交易所"""
+        self.ensure_loaded()
+        return self._suggest_index.suggest(keyword, limit or config.SUGGEST_MAX_RESULTS)
+    
+    def get(self, code: str) -> Optional[Dict[str, Any]]:
+        """按代码获取证券信息"""
+        self.ensure_loaded()
+        return self._index.by_code.get(code)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """代码表统计"""
+        return {
+            'symbol_count': len(self._index),
+            'suggest_keys': len(self._suggest_index),
+            'source': self.source,
+            'updated_time': self.updated_time,
+            'pinyin_enabled': lazy_pinyin is not None,
+            'refreshing': self._refreshing
+        }
+
+
+# 创建全局证券代码表实例
+symbol_master = SymbolMaster()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+腾讯行情解析模块
+解析 qt.gtimg.cn 的 ~ 分隔行情格式（支持一次请求多个代码的响应），
+直接在原始字节上切分，只拆分到最后一个需要的字段，一次遍历得到紧凑的类型化行情记录
+"""
+
+import re
+from typing import Dict, NamedTuple
+
+# 响应格式: v_sh600000="1~浦发银行~600000~10.12~...";  每个代码一条
+RECORD_PATTERN = re.compile(rb'v_(\w+)="([^"]*)"')
+
+# 字段下标（~ 分隔）
+FIELD_NAME = 1
+FIELD_PRICE = 3
+FIELD_TURNOVER_RATE = 38
+FIELD_PE_TTM = 39
+FIELD_CIRCULATING_MARKET_VALUE = 44
+FIELD_TOTAL_MARKET_VALUE = 45
+FIELD_PB = 46
+FIELD_TOTAL_SHARES = 73
+
+# 字段数不超过该值的记录视为无效（停牌、退市或代码错误时只返回少量字段）
+MIN_FIELD_COUNT = 50
+
+
+class TencentQuote(NamedTuple):
+    """腾讯行情记录（数值缺失或为 '-' 时为0）"""
+    symbol: str                        # 带市场前缀的代码（sh600000）
+    name: str                          # 股票名称
+    price: float                       # 当前价格
+    pe_ttm: float                      # 市盈率(TTM)
+    pb: float                          # 市净率
+    turnover_rate: float               # 换手率（%）
+    circulating_market_value: float    # 流通市值（亿元）
+    total_market_value: float          # 总市值（亿元）
+    total_shares: float                # 总股本（股），部分证券不提供时为0
+
+
+def _to_float(value: bytes) -> float:
+    """字段转为浮点数，空值、'-' 等无法解析的值为0"""
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def parse_tencent_quotes(content: bytes) -> Dict[str, TencentQuote]:
+    """
+    解析腾讯行情响应（GBK编码的原始字节）
+    
+    Args:
+        content: 响应体，可包含多个代码的行情
+    
+    Returns:
+        {带市场前缀代码: TencentQuote}，字段不全的记录被忽略
+    """
+    quotes = {}
+    for match in RECORD_PATTERN.finditer(content):
+        # 只拆分到总股本字段，其后的字段保留在最后一个元素中
+        fields = match.group(2).split(b'~', FIELD_TOTAL_SHARES + 1)
+        if len(fields) <= MIN_FIELD_COUNT:
+            continue
+        
+        symbol = match.group(1).decode('ascii')
+        # 按位置构造（比关键字参数快），顺序与 TencentQuote 字段定义一致
+        quotes[symbol] = TencentQuote(
+            symbol,
+            fields[FIELD_NAME].decode('gbk', errors='ignore'),
+            _to_float(fields[FIELD_PRICE]),
+            _to_float(fields[FIELD_PE_TTM]),
+            _to_float(fields[FIELD_PB]),
+            _to_float(fields[FIELD_TURNOVER_RATE]),
+            _to_float(fields[FIELD_CIRCULATING_MARKET_VALUE]),
+            _to_float(fields[FIELD_TOTAL_MARKET_VALUE]),
+            _to_float(fields[FIELD_TOTAL_SHARES]) if len(fields) > FIELD_TOTAL_SHARES else 0.0
+        )
+    return quotes
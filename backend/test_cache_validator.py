@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+响应ETag与缓存版本一致性测试（StockService.make_cache_validator 及使用它的接口）
+组装数据后其他线程刷新缓存时，ETag仍须对应响应内容实际使用的缓存版本
+"""
+
+import pytest
+
+from stock_service import stock_service
+from http_cache import response_body_cache
+
+CODE = '600000'
+
+
+def seed_snapshot(code=CODE, price=10.0):
+    stock_service._set_cache(f"stock_quote_{code}", {'basic': {
+        'name': '浦发银行', 'current_price': price, 'change_percent': 1.0, 'change_amount': 0.1
+    }}, 60)
+    stock_service._set_cache(f"stock_valuation_{code}", {'valuation': {
+        'pe_ttm': 5.0, 'pb': 0.5, 'total_market_value': 3000
+    }}, 60)
+    stock_service._set_cache(f"stock_fundamentals_{code}", {
+        'roe': 10.0, 'industry': '银行', 'dividend_ratio': 30.0
+    }, 3600)
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    stock_service.clear_cache()
+    response_body_cache.clear()
+    yield
+    stock_service.clear_cache()
+    response_body_cache.clear()
+
+
+@pytest.fixture
+def client():
+    from app import create_app
+    return create_app('testing').test_client()
+
+
+def test_snapshot_entries_match_validator_read_before_refresh():
+    seed_snapshot()
+    before = stock_service.get_cache_validator(stock_service.snapshot_cache_keys(CODE))
+    
+    stock_info, entries = stock_service.get_stock_snapshot(CODE)
+    seed_snapshot(price=11.0)  # 组装后行情被刷新
+    
+    assert stock_info['current_price'] == 10.0
+    assert list(entries) == stock_service.snapshot_cache_keys(CODE)
+    assert stock_service.make_cache_validator(list(entries.items())) == before
+    assert stock_service.get_cache_validator(stock_service.snapshot_cache_keys(CODE)) != before
+
+
+def test_make_cache_validator_requires_every_entry():
+    seed_snapshot()
+    _, entries = stock_service.get_stock_snapshot(CODE)
+    
+    assert stock_service.make_cache_validator([]) is None
+    assert stock_service.make_cache_validator(list(entries.items()) + [('stock_quote_600036', None)]) is None
+
+
+def test_stock_detail_etag_describes_returned_body(client, monkeypatch):
+    seed_snapshot()
+    get_stock_snapshot = stock_service.get_stock_snapshot
+    
+    def snapshot_then_refresh(code, *args, **kwargs):
+        result = get_stock_snapshot(code, *args, **kwargs)
+        seed_snapshot(code, price=11.0)  # 模拟后台刷新与请求并发
+        return result
+    
+    monkeypatch.setattr(stock_service, 'get_stock_snapshot', snapshot_then_refresh)
+    # 首次请求没有已缓存的响应体，走组装路径
+    response = client.get(f'/api/stocks/{CODE}')
+    
+    assert response.status_code == 200
+    assert response.get_json()['data']['current_price'] == 10.0
+    current = stock_service.get_cache_validator(stock_service.snapshot_cache_keys(CODE), (False,))
+    assert response.headers['ETag'].strip('"') != current['etag']
+    # 刷新后的ETag下没有旧内容的响应体
+    assert response_body_cache.get(current['etag']) is None
+    
+    monkeypatch.setattr(stock_service, 'get_stock_snapshot', get_stock_snapshot)
+    response = client.get(f'/api/stocks/{CODE}')
+    assert response.get_json()['data']['current_price'] == 11.0
+    assert response.headers['ETag'].strip('"') == current['etag']
+
+
+def test_history_body_cached_under_entry_it_came_from(client, monkeypatch):
+    monkeypatch.setattr(stock_service, '_fetch_stock_history', lambda code, period: [{'date': '2025-10-09', 'close': 10.0}])
+    set_history_cache = stock_service._set_history_cache
+
+    def set_then_refresh(cache_key, data):
+        entry = set_history_cache(cache_key, data)
+        set_history_cache(cache_key, [{'date': '2025-10-09', 'close': 11.0}])  # 模拟并发请求写入新数据
+        return entry
+
+    monkeypatch.setattr(stock_service, '_set_history_cache', set_then_refresh)
+    response = client.get(f'/api/stocks/{CODE}/history?period=1y')
+
+    assert response.get_json()['data'][0]['close'] == 10.0
+    current = stock_service.get_cache_validator([f"stock_history_{CODE}_1y"], (False,))
+    assert response.headers['ETag'].strip('"') != current['etag']
+    assert response_body_cache.get(current['etag']) is None
+
+
+def test_market_overview_etag_from_entry_used(client, monkeypatch):
+    entry = stock_service._set_cache('market_overview', {'sh000001': {'name': '上证指数'}}, 60)
+    expected = stock_service.make_cache_validator([('market_overview', entry)])
+    get_entry = stock_service.get_market_overview_entry
+    
+    def entry_then_refresh():
+        result = get_entry()
+        stock_service._set_cache('market_overview', {'sh000001': {'name': '刷新后'}}, 60)
+        return result
+    
+    monkeypatch.setattr(stock_service, 'get_market_overview_entry', entry_then_refresh)
+    response = client.get('/api/market/overview')
+    
+    assert response.get_json()['data'] == {'sh000001': {'name': '上证指数'}}
+    assert response.headers['ETag'].strip('"') == expected['etag']
+
+
+def test_cached_batch_records_each_tier_lookup_once():
+    import metrics
+    seed_snapshot()
+    hits_before = {tier: metrics.cache_hits._values.get((tier,), 0) for tier in stock_service.SNAPSHOT_TIERS}
+    
+    results = stock_service.get_batch_snapshots([CODE, CODE])
+    
+    assert list(results) == [CODE]
+    for tier, before in hits_before.items():
+        assert metrics.cache_hits._values.get((tier,), 0) - before == 1
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+带优先级的有界线程池测试（fetch_executor.PriorityFetchExecutor）
+"""
+
+import concurrent.futures
+import contextvars
+import threading
+
+import pytest
+
+from fetch_executor import PriorityFetchExecutor, PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BACKGROUND
+
+
+def block_worker(executor):
+    """占住线程池的唯一工作线程，返回释放用的事件"""
+    started = threading.Event()
+    release = threading.Event()
+    
+    def blocker():
+        started.set()
+        release.wait(5)
+    
+    future = executor.submit(blocker)
+    assert started.wait(5)
+    return release, future
+
+
+def test_result_runs_unclaimed_task_inline():
+    executor = PriorityFetchExecutor(max_workers=1)
+    release, blocker = block_worker(executor)
+    
+    future = executor.submit(lambda: threading.current_thread().name)
+    
+    assert executor.result(future, timeout=1) == threading.current_thread().name
+    stats = executor.get_stats()['priorities']['interactive']
+    assert stats['inline_runs'] == 1
+    assert stats['queue_depth'] == 0
+    
+    release.set()
+    blocker.result(timeout=5)
+
+
+def test_result_with_expired_timeout_does_not_run_inline():
+    executor = PriorityFetchExecutor(max_workers=1)
+    release, blocker = block_worker(executor)
+    calls = []
+    
+    future = executor.submit(calls.append, 1)
+    
+    with pytest.raises(concurrent.futures.TimeoutError):
+        executor.result(future, timeout=0)
+    assert calls == []
+    assert executor.get_stats()['priorities']['interactive']['inline_runs'] == 0
+    
+    future.cancel()
+    release.set()
+    blocker.result(timeout=5)
+
+
+def test_claimed_task_not_executed_twice():
+    executor = PriorityFetchExecutor(max_workers=1)
+    release, blocker = block_worker(executor)
+    calls = []
+    
+    future = executor.submit(calls.append, 'run')
+    executor.result(future, timeout=1)
+    release.set()
+    blocker.result(timeout=5)
+    executor.submit(lambda: None).result(timeout=5)  # 工作线程已处理完队列中被认领的任务
+    
+    assert calls == ['run']
+
+
+def test_nested_submit_does_not_deadlock_on_full_pool():
+    executor = PriorityFetchExecutor(max_workers=1)
+    
+    def outer():
+        inner = [executor.submit(lambda value=value: value * 2) for value in range(3)]
+        return [executor.result(future, timeout=1) for future in inner]
+    
+    assert executor.submit(outer).result(timeout=5) == [0, 2, 4]
+
+
+def test_nested_submit_inherits_priority():
+    executor = PriorityFetchExecutor(max_workers=2)
+    
+    def outer():
+        inner = executor.submit(executor.current_priority)
+        return executor.result(inner, timeout=1)
+    
+    assert executor.submit(outer, priority=PRIORITY_BACKGROUND).result(timeout=5) == PRIORITY_BACKGROUND
+    assert executor.current_priority() == PRIORITY_INTERACTIVE
+
+
+def test_higher_priority_tasks_run_first():
+    executor = PriorityFetchExecutor(max_workers=1)
+    release, blocker = block_worker(executor)
+    order = []
+    
+    futures = [
+        executor.submit(order.append, 'background', priority=PRIORITY_BACKGROUND),
+        executor.submit(order.append, 'batch', priority=PRIORITY_BATCH),
+        executor.submit(order.append, 'interactive', priority=PRIORITY_INTERACTIVE)
+    ]
+    assert executor.get_stats()['queue_depth'] == 3
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    
+    assert order == ['interactive', 'batch', 'background']
+
+
+def test_cancelled_task_is_skipped():
+    executor = PriorityFetchExecutor(max_workers=1)
+    release, blocker = block_worker(executor)
+    calls = []
+    
+    future = executor.submit(calls.append, 'run')
+    assert future.cancel()
+    assert not executor.run_inline(future)
+    release.set()
+    executor.submit(lambda: None).result(timeout=5)
+    
+    assert calls == []
+    assert executor.get_stats()['queue_depth'] == 0
+
+
+def test_task_runs_in_submitting_context():
+    executor = PriorityFetchExecutor(max_workers=1)
+    request_id = contextvars.ContextVar('request_id', default=None)
+    
+    token = request_id.set('req-1')
+    future = executor.submit(request_id.get)
+    request_id.reset(token)
+    
+    assert future.result(timeout=5) == 'req-1'
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+字段组截止时间测试（StockService._fetch_field_groups）
+线程池饱和时字段组由当前线程直接执行，慢上游也不能让快照超过 field_group_timeout
+"""
+
+import threading
+import time
+
+import pytest
+
+from config import get_config
+from fetch_executor import fetch_executor
+from market_simulator import LatencyProfile, MarketSimulator, MarketUniverse, start_simulator
+from stock_service import SnapshotFetchPlan, StockService
+
+config = get_config()
+
+CODE = '600000'
+GROUP_TIMEOUT = 0.5
+UPSTREAM_DELAY_MS = 3000
+
+
+@pytest.fixture
+def slow_service(monkeypatch):
+    """上游固定延迟 3 秒的 StockService，行情和估值字段组各请求一次上游"""
+    simulator = MarketSimulator(MarketUniverse(size=10, seed=1),
+                                default_profile=LatencyProfile(UPSTREAM_DELAY_MS, 0, 0))
+    server = start_simulator(simulator=simulator)
+    monkeypatch.setattr(config, 'UPSTREAM_SIMULATOR_URL', 'http://%s:%d' % server.server_address[:2])
+    
+    service = StockService()
+    service.field_group_timeout = GROUP_TIMEOUT
+    
+    def slow_group(code, plan):
+        service._http_get(f'http://qt.gtimg.cn/q=sh{code}', timeout=10)
+        return {'current_price': 1.0}
+    
+    service._get_basic_data = slow_group
+    service._get_valuation_data = slow_group
+    yield service
+    server.shutdown()
+
+
+@pytest.fixture
+def saturated_executor():
+    """占住进程级线程池的全部工作线程，提交的任务只能由等待结果的线程直接执行"""
+    release = threading.Event()
+    started = threading.Semaphore(0)
+    
+    def blocker():
+        started.release()
+        release.wait(30)
+    
+    blockers = [fetch_executor.submit(blocker) for _ in range(fetch_executor.max_workers)]
+    for _ in blockers:
+        assert started.acquire(timeout=5)
+    yield
+    release.set()
+    for future in blockers:
+        future.result(timeout=5)
+
+
+def test_inline_group_bounded_by_deadline(slow_service, saturated_executor):
+    start_time = time.time()
+    results = slow_service._fetch_field_groups(CODE, SnapshotFetchPlan(CODE), ['basic', 'valuation'])
+    elapsed = time.time() - start_time
+    
+    assert elapsed < GROUP_TIMEOUT + 0.5
+    assert results == {'basic': {}, 'valuation': {'pe_ttm': 0, 'pb': 0, 'total_market_value': 0}}
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+网页流式扫描测试（html_scan.scan_stream）
+任意分块方式下的结果须与对整页执行 re.search 一致，页面取自本地上游模拟服务
+"""
+
+import pytest
+
+from html_scan import compile_gbk, scan_stream
+from market_simulator import MarketSimulator, MarketUniverse
+from stock_service import SINA_FINANCE_SUMMARY_PATTERNS, THS_ROE_PATTERNS
+
+OVERLAP = 1024
+
+
+def simulator_pages():
+    simulator = MarketSimulator(MarketUniverse(size=10, seed=1), html_padding_kb=8)
+    code = simulator.universe.stocks['sh600000']['code']
+    _, _, sina_page = simulator.sina_money(f'/corp/go.php/vFD_FinanceSummary/stockid/{code}.phtml', {})
+    _, _, ths_page = simulator.ths_finance(f'/{code}/finance.html', {})
+    return [(sina_page, SINA_FINANCE_SUMMARY_PATTERNS), (ths_page, THS_ROE_PATTERNS)]
+
+
+PAGES = simulator_pages()
+
+
+def whole_page_matches(page, patterns):
+    matches = {}
+    for name, pattern in patterns.items():
+        match = pattern.search(page)
+        if match:
+            matches[name] = match.group(1)
+    return matches
+
+
+def split(page, size):
+    return [page[i:i + size] for i in range(0, len(page), size)]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 100, 1000, OVERLAP + 1, 4096, 10 ** 7])
+@pytest.mark.parametrize('page, patterns', PAGES, ids=['sina_summary', 'ths_finance'])
+def test_chunked_scan_matches_whole_page_search(page, patterns, chunk_size):
+    expected = whole_page_matches(page, patterns)
+    assert expected  # 模拟页面中至少包含一个字段
+    
+    assert scan_stream(split(page, chunk_size), patterns, overlap=OVERLAP) == expected
+
+
+@pytest.mark.parametrize('boundary', range(0, 40, 3))
+def test_first_match_straddling_boundary_wins_over_later_match(boundary):
+    patterns = {'roe': compile_gbk(r'净资产收益率</td><td>([^<]{0,16})</td>')}
+    first = '<td>净资产收益率</td><td>12.50</td>'.encode('gbk')
+    page = b'x' * 50 + first + b'y' * 50 + '<td>净资产收益率</td><td>99.00</td>'.encode('gbk')
+    # 第一个匹配跨越数据块边界，第二个匹配完整地落在后一个数据块中
+    cut = 50 + boundary
+    
+    assert scan_stream([page[:cut], page[cut:]], patterns, overlap=64) == {'roe': b'12.50'}
+
+
+def test_stops_reading_when_all_fields_found():
+    page, patterns = PAGES[0]
+    read = []
+    
+    def chunks():
+        for chunk in split(page, 512):
+            read.append(chunk)
+            yield chunk
+    
+    matches = scan_stream(chunks(), patterns, overlap=OVERLAP)
+    
+    assert matches == whole_page_matches(page, patterns)
+    assert sum(len(chunk) for chunk in read) < len(page) / 2
+
+
+def test_stop_condition_and_max_bytes():
+    page, patterns = PAGES[1]
+    
+    # 提前结束条件满足时不再继续查找其他字段
+    matches = scan_stream(split(page, 256), patterns, stop=lambda found: 'roe_text' in found, overlap=OVERLAP)
+    assert 'roe_text' in matches
+    
+    # ROE位于页面中部，只读取前 2KB 时找不到
+    assert scan_stream(split(page, 256), patterns, overlap=OVERLAP, max_bytes=2048) == {}
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+响应序列化测试（http_cache.dumps_json）
+带ETag缓存的响应体须与 Flask jsonify 的输出等价：键按字母排序，日期为 HTTP-date 格式
+"""
+
+import json
+from datetime import date, datetime, timezone
+
+import pytest
+from flask import Flask, jsonify
+
+import http_cache
+from http_cache import dumps_json
+
+
+PAYLOAD = {
+    'success': True,
+    'data': {
+        'name': '浦发银行',
+        'code': '600000',
+        'current_price': 10.5,
+        'updated': datetime(2025, 10, 9, 9, 30, tzinfo=timezone.utc),
+        'trade_date': date(2025, 10, 9),
+        'items': [{'b': 1, 'a': None}]
+    },
+    'count': 1
+}
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def test_matches_jsonify(app):
+    with app.app_context():
+        expected = jsonify(PAYLOAD).get_data()
+    
+    body = dumps_json(PAYLOAD)
+    
+    assert json.loads(body) == json.loads(expected)
+    assert list(json.loads(body)) == ['count', 'data', 'success']
+    assert json.loads(body)['data']['updated'] == 'Thu, 09 Oct 2025 09:30:00 GMT'
+
+
+def test_stdlib_fallback_matches_orjson(monkeypatch):
+    body = dumps_json(PAYLOAD)
+    monkeypatch.setattr(http_cache, 'orjson', None)
+    
+    assert dumps_json(PAYLOAD) == body
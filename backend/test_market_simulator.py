@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+上游行情模拟服务测试（market_simulator.MarketUniverse 代码段分配和按代码查找）
+"""
+
+import pytest
+
+from market_simulator import CODE_RANGES, MarketSimulator, MarketUniverse
+from symbol_master import exchange_of
+
+
+@pytest.mark.parametrize('size', [1, 10, 5000, 6001, 8000])
+def test_codes_unique_and_inside_ranges(size):
+    universe = MarketUniverse(size=size, seed=1)
+    
+    assert len(universe.stocks) == size
+    assert len(universe.by_code) == size
+    for symbol, stock in universe.stocks.items():
+        assert symbol == f"{stock['market']}{stock['code']}"
+        assert stock['market'] == exchange_of(stock['code']).lower()
+        assert any(market == stock['market'] and start <= int(stock['code']) < end
+                   for market, start, end in CODE_RANGES)
+
+
+def test_size_beyond_capacity_raises():
+    capacity = sum(end - start for _, start, end in CODE_RANGES)
+    
+    assert len(MarketUniverse(size=capacity).stocks) == capacity
+    with pytest.raises(ValueError):
+        MarketUniverse(size=capacity + 1)
+
+
+def test_lookup_by_code_does_not_return_index():
+    simulator = MarketSimulator(MarketUniverse(size=5000, seed=1), html_padding_kb=1)
+    stock = simulator.universe.stocks['sz000001']
+    
+    _, _, page = simulator.ths_finance('/000001/finance.html', {})
+    assert f"{stock['roe']:.2f}%".encode('gbk') in page
+    assert simulator.universe.get_by_code('000001', 'sh') is None
+
+
+def test_bse_stock_served_with_secid_market_zero():
+    simulator = MarketSimulator(MarketUniverse(size=5000, seed=1))
+    stock = simulator.universe.stocks['bj830000']
+    
+    data = simulator.eastmoney_push2('/api/qt/stock/get', {'secid': ['0.830000']})[2]
+    assert stock['industry'].encode('utf-8') in data
+    assert b'"data": null' in simulator.eastmoney_push2('/api/qt/stock/get', {'secid': ['1.830000']})[2]
+    assert simulator.tencent_quote('/q=bj830000', {})[2].startswith(b'v_bj830000="62~')
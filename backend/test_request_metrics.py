@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+请求指标测试（api_routes.record_request_metrics）
+未匹配任何路由的请求计入固定的 unmatched 接口标签
+"""
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def client():
+    from app import create_app
+    return create_app('testing').test_client()
+
+
+def request_count(endpoint, status):
+    return metrics.api_requests._values.get((endpoint, 'GET', status), 0)
+
+
+def test_unmatched_request_exported_as_unmatched(client):
+    before = request_count(metrics.UNMATCHED_ENDPOINT, 404)
+    
+    assert client.get('/api/no-such-endpoint').status_code == 404
+    assert client.get('/api/wp-login.php').status_code == 404
+    
+    assert request_count(metrics.UNMATCHED_ENDPOINT, 404) == before + 2
+    assert request_count('None', 404) == 0
+    assert f'endpoint="{metrics.UNMATCHED_ENDPOINT}",method="GET",status="404"' in metrics.render_metrics()
+
+
+def test_matched_request_keeps_endpoint_label(client):
+    before = request_count('api.health_check', 200)
+    
+    assert client.get('/api/health').status_code == 200
+    
+    assert request_count('api.health_check', 200) == before + 1
+
+
+def test_non_api_request_not_recorded(client):
+    before = sum(metrics.api_requests._values.values())
+    
+    assert client.get('/no-such-page').status_code == 404
+    
+    assert sum(metrics.api_requests._values.values()) == before
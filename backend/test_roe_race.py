@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+ROE数据源竞速测试（StockService._race_sources）
+离线运行：数据源为本地函数，用 sleep 模拟延迟
+"""
+
+import threading
+import time
+
+from stock_service import stock_service
+
+
+def is_valid_roe(value):
+    return isinstance(value, (int, float)) and 0 < value < 100
+
+
+def make_source(value, delay=0.0, calls=None, name=None):
+    """返回一个延迟 delay 秒后返回 value 的数据源，调用时把名称记入 calls"""
+    def source():
+        if calls is not None:
+            calls.append(name)
+        if delay:
+            time.sleep(delay)
+        if isinstance(value, Exception):
+            raise value
+        return value
+    return source
+
+
+def race(tasks, timeout=2.0):
+    return stock_service._race_sources(tasks, is_valid=is_valid_roe, timeout=timeout, stage_name='test_roe')
+
+
+def test_first_valid_result_wins_and_hedged_source_not_launched():
+    calls = []
+    tasks = [
+        ('fast', 0, make_source(12.5, 0.01, calls, 'fast')),
+        ('hedged', 0.5, make_source(20.0, 0, calls, 'hedged'))
+    ]
+    
+    start_time = time.time()
+    winner = race(tasks)
+    
+    assert winner == ('fast', 12.5)
+    assert time.time() - start_time < 0.4
+    time.sleep(0.6)
+    assert calls == ['fast']  # 胜出后到达对冲延迟的数据源不再发起
+
+
+def test_hedged_source_launched_after_delay_when_first_is_slow():
+    calls = []
+    tasks = [
+        ('slow', 0, make_source(10.0, 1.0, calls, 'slow')),
+        ('hedged', 0.1, make_source(15.0, 0, calls, 'hedged'))
+    ]
+    
+    start_time = time.time()
+    winner = race(tasks)
+    elapsed = time.time() - start_time
+    
+    assert winner == ('hedged', 15.0)
+    assert 0.1 <= elapsed < 0.8
+    assert calls == ['slow', 'hedged']
+
+
+def test_next_source_starts_immediately_when_started_sources_fail():
+    tasks = [
+        ('invalid', 0, make_source(0)),
+        ('error', 0, make_source(ValueError('boom'))),
+        ('hedged', 1.5, make_source(9.9))
+    ]
+    
+    start_time = time.time()
+    winner = race(tasks)
+    
+    assert winner == ('hedged', 9.9)
+    assert time.time() - start_time < 1.0  # 不必等到 1.5 秒的对冲延迟
+
+
+def test_late_valid_result_is_ignored():
+    late_finished = threading.Event()
+    
+    def late_source():
+        time.sleep(0.3)
+        late_finished.set()
+        return 30.0
+    
+    tasks = [
+        ('late', 0, late_source),
+        ('fast', 0, make_source(11.0, 0.01))
+    ]
+    
+    start_time = time.time()
+    winner = race(tasks)
+    
+    assert winner == ('fast', 11.0)
+    assert time.time() - start_time < 0.25  # 不等待较慢的数据源
+    assert late_finished.wait(1.0)
+    assert winner == ('fast', 11.0)
+
+
+def test_all_sources_invalid_returns_none():
+    tasks = [
+        ('a', 0, make_source(0)),
+        ('b', 0.05, make_source(150.0)),
+        ('c', 0.1, make_source(None))
+    ]
+    
+    assert race(tasks) is None
+
+
+def test_timeout_returns_none():
+    tasks = [('stuck', 0, make_source(12.0, 1.0))]
+    
+    start_time = time.time()
+    assert race(tasks, timeout=0.2) is None
+    assert time.time() - start_time < 0.6
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+证券代码内存索引测试（symbol_master.SymbolIndex、SuggestIndex）
+"""
+
+import pytest
+
+from symbol_master import SymbolIndex, SuggestIndex, exchange_of
+
+
+def make_symbols():
+    rows = [
+        ('600000', '浦发银行', 'PFYH'),
+        ('600036', '招商银行', 'ZSYH'),
+        ('600030', '中信证券', 'ZXZQ'),
+        ('000001', '平安银行', 'PAYH'),
+        ('601318', '中国平安', 'ZGPA'),
+        ('000002', '万科Ａ', 'WKA'),
+        ('300750', '宁德时代', 'NDSD'),
+        ('601398', '工商银行', 'GSYH')
+    ]
+    return [
+        {'code': code, 'name': name, 'exchange': exchange_of(code), 'pinyin': pinyin, 'industry': ''}
+        for code, name, pinyin in rows
+    ]
+
+
+@pytest.fixture
+def index():
+    return SymbolIndex(make_symbols())
+
+
+def codes(results):
+    return [symbol['code'] for symbol in results]
+
+
+def test_code_exact_match(index):
+    assert codes(index.search('600036', 10)) == ['600036']
+
+
+def test_code_prefix_sorted_by_code(index):
+    assert codes(index.search('600', 10)) == ['600000', '600030', '600036']
+    assert codes(index.search('600', 2)) == ['600000', '600030']
+
+
+def test_name_prefix_ranks_before_name_contains(index):
+    # 平安银行为名称前缀，中国平安为名称包含
+    assert codes(index.search('平安', 10)) == ['000001', '601318']
+
+
+def test_name_exact_ranks_first(index):
+    assert codes(index.search('工商银行', 10)) == ['601398']
+    assert codes(index.search('银行', 10)) == ['000001', '600000', '600036', '601398']
+
+
+def test_pinyin_prefix_case_insensitive(index):
+    assert codes(index.search('zs', 10)) == ['600036']
+    assert codes(index.search('ZXZQ', 10)) == ['600030']
+
+
+def test_name_matches_rank_before_pinyin(index):
+    symbols = make_symbols() + [{'code': '688001', 'name': 'PA科技', 'exchange': 'SH', 'pinyin': 'PAKJ', 'industry': ''}]
+    index = SymbolIndex(symbols)
+    
+    # PA科技 名称前缀（同时也是拼音前缀），平安银行只匹配拼音首字母
+    assert codes(index.search('pa', 10)) == ['688001', '000001']
+
+
+def test_fullwidth_and_spaces_normalized(index):
+    assert codes(index.search('６０００３６', 10)) == ['600036']
+    assert codes(index.search(' 万科 A ', 10)) == ['000002']
+
+
+def test_no_match_and_empty_keyword(index):
+    assert index.search('不存在', 10) == []
+    assert index.search('', 10) == []
+    assert index.search('600', 0) == []
+
+
+
+@pytest.fixture
+def suggest_index():
+    return SuggestIndex(make_symbols(), max_results=3)
+
+
+def test_suggest_code_prefix_sorted_and_truncated(suggest_index):
+    assert codes(suggest_index.suggest('6', 10)) == ['600000', '600030', '600036']
+    assert codes(suggest_index.suggest('600', 2)) == ['600000', '600030']
+    assert codes(suggest_index.suggest('600036', 10)) == ['600036']
+
+
+def test_suggest_name_ranking(suggest_index):
+    # 名称完全匹配优先，其次名称前缀，最后名称包含
+    assert codes(suggest_index.suggest('平安', 10)) == ['000001', '601318']
+    assert codes(suggest_index.suggest('中国平安', 10)) == ['601318']
+    assert codes(suggest_index.suggest('银行', 10)) == ['000001', '600000', '600036']
+
+
+def test_suggest_name_matches_rank_before_pinyin():
+    symbols = make_symbols() + [{'code': '688001', 'name': 'PA科技', 'exchange': 'SH', 'pinyin': 'PAKJ', 'industry': ''}]
+    suggest_index = SuggestIndex(symbols, max_results=3)
+    
+    assert codes(suggest_index.suggest('pa', 10)) == ['688001', '000001']
+    assert codes(suggest_index.suggest('ZG', 10)) == ['601318']
+
+
+def test_suggest_entries_and_normalization(suggest_index):
+    assert suggest_index.suggest(' ６０００３６ ', 10) == [{'code': '600036', 'name': '招商银行', 'exchange': 'SH'}]
+    assert suggest_index.suggest('不存在', 10) == []
+    assert suggest_index.suggest('', 10) == []
+
+
+@pytest.mark.parametrize('code, exchange', [
+    ('600000', 'SH'), ('688981', 'SH'), ('000001', 'SZ'), ('300750', 'SZ'),
+    ('430047', 'BJ'), ('830799', 'BJ'), ('920002', 'BJ')
+])
+def test_exchange_of(code, exchange):
+    assert exchange_of(code) == exchange
+
+
+@pytest.mark.parametrize('code, symbol', [
+    ('600000', 'sh600000'), ('000001', 'sz000001'), ('300750', 'sz300750'),
+    ('430047', 'bj430047'), ('830799', 'bj830799'), ('920002', 'bj920002'),
+    ('sh000001', 'sh000001'), ('bj899050', 'bj899050')
+])
+def test_market_symbol_prefix(code, symbol):
+    from stock_service import stock_service
+    
+    assert stock_service._market_symbol(code) == symbol
+
+
+def test_bse_upstream_request_parameters():
+    """北交所股票的东方财富 secid 市场为 0，财务主表代码后缀为 .BJ"""
+    from stock_service import stock_service
+    
+    _, stock_request = stock_service._eastmoney_stock_request('430047')
+    assert stock_request['params']['secid'] == '0.430047'
+    _, fn_request = stock_service._eastmoney_fn_main_request('430047')
+    assert fn_request['params']['filter'] == '(SECUCODE="430047.BJ")'
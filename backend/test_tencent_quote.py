@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+腾讯行情解析测试（tencent_quote.parse_tencent_quotes）
+每个字段下标填入不同的值，字段位置错位时对应的断言会失败
+"""
+
+from tencent_quote import parse_tencent_quotes, TencentQuote
+from market_simulator import MarketSimulator, MarketUniverse
+
+
+def record(symbol, field_count=88, **overrides):
+    fields = [f"{index}.25" for index in range(field_count)]
+    fields[1] = '浦发银行'
+    for index, value in overrides.items():
+        fields[int(index[1:])] = value
+    return f'v_{symbol}="{"~".join(fields)}";\n'.encode('gbk')
+
+
+def test_field_indices():
+    quote = parse_tencent_quotes(record('sh600000'))['sh600000']
+    
+    assert quote == TencentQuote(
+        symbol='sh600000',
+        name='浦发银行',
+        price=3.25,
+        pe_ttm=39.25,
+        pb=46.25,
+        turnover_rate=38.25,
+        circulating_market_value=44.25,
+        total_market_value=45.25,
+        total_shares=73.25
+    )
+
+
+def test_multiple_records_and_invalid_entries():
+    content = (
+        record('sh600000')
+        + b'v_pv_none_match="1";\n'
+        + record('sz000001', f3='11.50')
+        + record('sh600036', field_count=20)  # 停牌等只返回少量字段
+    )
+    quotes = parse_tencent_quotes(content)
+    
+    assert sorted(quotes) == ['sh600000', 'sz000001']
+    assert quotes['sz000001'].price == 11.5
+
+
+def test_missing_values_are_zero():
+    quote = parse_tencent_quotes(record('sh600000', f39='-', f46='', f45='abc'))['sh600000']
+    
+    assert (quote.pe_ttm, quote.pb, quote.total_market_value) == (0.0, 0.0, 0.0)
+    assert quote.price == 3.25
+
+
+def test_total_shares_absent_in_short_record():
+    quote = parse_tencent_quotes(record('sh600000', field_count=60))['sh600000']
+    
+    assert quote.total_shares == 0.0
+    assert quote.total_market_value == 45.25
+
+
+def test_matches_full_split_on_simulator_response():
+    simulator = MarketSimulator(MarketUniverse(size=30, seed=1))
+    symbols = [f"{stock['market']}{stock['code']}" for stock in list(simulator.universe.stocks.values())[:10]]
+    _, _, content = simulator.tencent_quote('/q=' + ','.join(symbols), {})
+    quotes = parse_tencent_quotes(content)
+    
+    assert sorted(quotes) == sorted(symbols)
+    for line in content.decode('gbk').strip().split('\n'):
+        symbol, body = line[2:].split('="', 1)
+        fields = body.rstrip('";').split('~')
+        quote = quotes[symbol]
+        assert quote.name == fields[1]
+        assert quote.price == float(fields[3])
+        assert quote.turnover_rate == float(fields[38])
+        assert quote.pe_ttm == float(fields[39] or 0)
+        assert quote.circulating_market_value == float(fields[44])
+        assert quote.total_market_value == float(fields[45])
+        assert quote.pb == float(fields[46] or 0)
+        assert quote.total_shares == float(fields[73])
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+沪深交易日历测试（trading_calendar.TradingCalendar）
+"""
+
+import json
+from datetime import datetime
+
+import pytest
+
+from trading_calendar import TradingCalendar
+
+
+@pytest.fixture
+def calendar(tmp_path):
+    holidays_file = tmp_path / 'holidays.json'
+    holidays_file.write_text(json.dumps({'holidays': {
+        '2025': ['2025-10-01', '2025-10-02', '2025-10-03', '2025-10-06', '2025-10-07', '2025-10-08']
+    }}), encoding='utf-8')
+    return TradingCalendar(
+        holidays_file=str(holidays_file),
+        sessions=[('09:15', '11:30'), ('13:00', '15:00')],
+        close_grace_minutes=5
+    )
+
+
+def ttl_at(calendar, moment, ttl=10):
+    calendar.now = lambda: moment
+    return calendar.cache_ttl(ttl)
+
+
+@pytest.mark.parametrize('moment', [
+    datetime(2025, 9, 30, 9, 15),    # 开盘集合竞价
+    datetime(2025, 9, 30, 10, 0),
+    datetime(2025, 9, 30, 11, 34),   # 午间收盘宽限期内
+    datetime(2025, 9, 30, 13, 0),
+    datetime(2025, 9, 30, 15, 4)     # 收盘宽限期内
+])
+def test_trading_time_uses_base_ttl(calendar, moment):
+    assert calendar.is_trading_time(moment)
+    assert ttl_at(calendar, moment) == 10
+
+
+def test_lunch_break_extends_to_afternoon_open(calendar):
+    moment = datetime(2025, 9, 30, 11, 40)
+    
+    assert not calendar.is_trading_time(moment)
+    assert ttl_at(calendar, moment) == 80 * 60
+
+
+def test_after_close_grace_extends_to_next_morning(calendar):
+    moment = datetime(2025, 9, 29, 15, 5)  # 宽限期结束
+    
+    assert not calendar.is_trading_time(moment)
+    assert ttl_at(calendar, moment) == (datetime(2025, 9, 30, 9, 15) - moment).total_seconds()
+
+
+def test_weekend_extends_to_monday_open(calendar):
+    moment = datetime(2025, 9, 26, 16, 0)  # 周五收盘后
+    
+    assert ttl_at(calendar, moment) == (datetime(2025, 9, 29, 9, 15) - moment).total_seconds()
+
+
+def test_holiday_extends_past_holiday_and_weekend(calendar):
+    moment = datetime(2025, 9, 30, 16, 0)  # 国庆休市前最后一个交易日收盘后
+    
+    assert not calendar.is_trading_day(datetime(2025, 10, 1).date())
+    assert calendar.next_session_open(moment) == datetime(2025, 10, 9, 9, 15)
+    assert ttl_at(calendar, moment) == (datetime(2025, 10, 9, 9, 15) - moment).total_seconds()
+
+
+def test_during_holiday_session_hours(calendar):
+    moment = datetime(2025, 10, 2, 10, 0)
+    
+    assert not calendar.is_trading_time(moment)
+    assert ttl_at(calendar, moment) == (datetime(2025, 10, 9, 9, 15) - moment).total_seconds()
+
+
+def test_ttl_never_shorter_than_base_before_open(calendar):
+    moment = datetime(2025, 9, 30, 9, 14, 55)
+    
+    assert ttl_at(calendar, moment) == 10
+
+
+def test_missing_holiday_file_falls_back_to_weekends(tmp_path):
+    calendar = TradingCalendar(holidays_file=str(tmp_path / 'missing.json'))
+    
+    assert calendar.is_trading_day(datetime(2025, 10, 1).date())
+    assert not calendar.is_trading_day(datetime(2025, 10, 4).date())
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+上游熔断器和自适应超时测试（upstream.CircuitBreaker）
+"""
+
+import time
+from datetime import timedelta
+
+from config import get_config
+from upstream import CircuitBreaker, UpstreamRegistry, upstream_registry
+
+config = get_config()
+
+
+def make_breaker(**kwargs):
+    options = {'window_size': 10, 'min_requests': 4, 'error_rate_threshold': 0.5, 'open_seconds': 0.1}
+    options.update(kwargs)
+    return CircuitBreaker('test.example.com', **options)
+
+
+def test_stays_closed_below_min_requests():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure(0.01)
+    
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_opens_when_error_rate_reaches_threshold():
+    breaker = make_breaker()
+    breaker.record_success(0.01)
+    breaker.record_success(0.01)
+    breaker.record_failure(0.01)
+    assert breaker.state == CircuitBreaker.CLOSED
+    
+    breaker.record_failure(0.01)  # 4次请求中2次失败，错误率50%
+    
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.total_skipped == 1
+    assert breaker.health_score() == 0.0
+
+
+def test_half_open_allows_single_probe_after_cooldown():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record_failure(0.01)
+    assert not breaker.allow_request()
+    
+    time.sleep(0.12)
+    
+    assert breaker.allow_request()  # 探测请求
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()  # 探测进行中，其余请求仍被跳过
+
+
+def test_successful_probe_closes_and_resets_window():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record_failure(0.01)
+    time.sleep(0.12)
+    assert breaker.allow_request()
+    
+    breaker.record_success(0.02)
+    
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.get_stats()['window_requests'] == 1
+    assert breaker.get_stats()['error_rate'] == 0
+    # 窗口已重置，恢复后单次失败不会立即再次熔断
+    breaker.record_failure(0.01)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record_failure(0.01)
+    time.sleep(0.12)
+    assert breaker.allow_request()
+    
+    breaker.record_failure(0.01)
+    
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_registry_creates_breaker_per_host():
+    registry = UpstreamRegistry()
+    
+    breaker = registry.for_url('https://qt.gtimg.cn/q=sh600000')
+    
+    assert breaker is registry.get('qt.gtimg.cn')
+    assert set(registry.get_stats()) == {'qt.gtimg.cn'}
+    registry.reset('qt.gtimg.cn')
+    assert registry.get('qt.gtimg.cn') is not breaker
+
+
+def test_timeout_uses_default_until_enough_samples():
+    breaker = make_breaker()
+    for _ in range(config.UPSTREAM_TIMEOUT_MIN_SAMPLES - 1):
+        breaker.record_success(0.4)
+    
+    assert breaker.get_timeout(3) == 3
+    
+    breaker.record_success(0.4)
+    assert breaker.get_timeout(3) == round(0.4 * config.UPSTREAM_TIMEOUT_MULTIPLIER, 3)
+
+
+def test_timeout_clamped_to_floor_for_fast_hosts():
+    breaker = make_breaker()
+    for _ in range(config.UPSTREAM_TIMEOUT_MIN_SAMPLES):
+        breaker.record_success(0.005)
+    
+    assert breaker.get_timeout(3) == config.UPSTREAM_TIMEOUT_FLOOR
+
+
+def test_timeout_clamped_to_ceiling_for_slow_hosts():
+    breaker = make_breaker()
+    for _ in range(config.UPSTREAM_TIMEOUT_MIN_SAMPLES):
+        breaker.record_success(20)
+    
+    assert breaker.get_timeout(3) == config.UPSTREAM_TIMEOUT_CEILING
+
+
+def test_only_timed_out_failures_enter_latency_histogram():
+    breaker = make_breaker(min_requests=1000)
+    for _ in range(config.UPSTREAM_TIMEOUT_MIN_SAMPLES):
+        breaker.record_failure(0.001)  # 连接被拒等快速失败不影响超时
+    assert breaker.get_timeout(3) == 3
+    
+    for _ in range(config.UPSTREAM_TIMEOUT_MIN_SAMPLES):
+        breaker.record_failure(2, timed_out=True)
+    assert breaker.get_timeout(3) == 3.0  # 2秒的分桶上界 × 1.5
+
+
+class _FakeResponse:
+    status_code = 200
+    elapsed = timedelta(milliseconds=1)  # 只计到收到响应头
+
+
+def test_concurrent_requests_record_wall_clock_latency(monkeypatch):
+    """_http_get_many 与 _http_get 一样按墙钟时间记录延迟，而不是 response.elapsed"""
+    from stock_service import stock_service
+    
+    def slow_get(url, **kwargs):
+        time.sleep(0.1)
+        return _FakeResponse()
+    
+    monkeypatch.setattr(stock_service.session, 'get', slow_get)
+    monkeypatch.setattr(stock_service, 'async_backend', None)
+    upstream_registry.reset('wallclock.example.com')
+    
+    results = stock_service._http_get_many([('http://wallclock.example.com/a', {}), ('http://wallclock.example.com/b', {})])
+    
+    assert all(isinstance(result, _FakeResponse) for result in results)
+    stats = upstream_registry.get('wallclock.example.com').get_stats()
+    assert stats['total_requests'] == 2
+    assert stats['avg_latency_ms'] >= 100
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+关注列表后台刷新测试（刷新周期推导、多进程文件锁和共享快照缓存）
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import stock_service as stock_service_module
+import watchlist_refresher as refresher_module
+from config import get_config
+from database import DatabaseManager
+from market_simulator import MarketSimulator, MarketUniverse, start_simulator
+from stock_service import StockService
+from watchlist_refresher import WatchlistRefresher
+
+config = get_config()
+
+
+def test_interval_derived_from_quote_ttl():
+    refresher = WatchlistRefresher(lock_file=os.devnull)
+    quote_ttl = config.SNAPSHOT_CACHE_TTLS['quote']
+    
+    assert refresher.interval == quote_ttl
+    
+    refresher.last_duration = 3
+    assert refresher.interval == quote_ttl - 3
+    # 提前量 = 周期 + 上一轮耗时 = 行情有效期，每个有效期只刷新一次
+    assert refresher.interval + refresher.last_duration == quote_ttl
+    
+    refresher.last_duration = quote_ttl + 5
+    assert refresher.interval == config.WATCHLIST_REFRESH_MIN_INTERVAL
+
+
+def test_configured_interval_overrides_derivation():
+    refresher = WatchlistRefresher(interval=30, lock_file=os.devnull)
+    refresher.last_duration = 3
+    
+    assert refresher.interval == 30
+
+
+@pytest.mark.skipif(refresher_module.fcntl is None, reason='平台不支持 fcntl 文件锁')
+def test_only_one_refresher_holds_lock(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'SHARED_SNAPSHOT_CACHE_ENABLED', True)
+    lock_file = str(tmp_path / 'refresher.lock')
+    first = WatchlistRefresher(lock_file=lock_file)
+    second = WatchlistRefresher(lock_file=lock_file)
+    
+    assert first._acquire_lock()
+    assert first.is_leader
+    assert not second._acquire_lock()
+    assert not second.is_leader
+    assert not second.get_stats()['is_leader']
+    
+    first._release_lock()  # 持有者退出后由其他进程接替
+    assert second._acquire_lock()
+    assert second.is_leader
+    second._release_lock()
+
+
+def test_every_process_refreshes_without_shared_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'SHARED_SNAPSHOT_CACHE_ENABLED', False)
+    lock_file = str(tmp_path / 'refresher.lock')
+    first = WatchlistRefresher(lock_file=lock_file)
+    second = WatchlistRefresher(lock_file=lock_file)
+    
+    # 各进程的内存缓存互不共享，每个进程都需要自己刷新
+    assert first._acquire_lock() and second._acquire_lock()
+    assert first.is_leader and second.is_leader
+
+
+# 模拟另一个 gunicorn worker：独立进程、独立的内存缓存，与刷新进程共用数据库
+WORKER_SCRIPT = """
+import json, sys
+from config import get_config
+config = get_config()
+config.DATABASE_PATH, config.UPSTREAM_SIMULATOR_URL = sys.argv[1], sys.argv[2]
+config.SHARED_SNAPSHOT_CACHE_ENABLED = True
+from stock_service import stock_service
+snapshots = stock_service.get_batch_snapshots(sys.argv[3].split(','))
+print(json.dumps({code: snapshot[0]['current_price'] for code, snapshot in snapshots.items()}))
+"""
+
+
+def test_other_worker_serves_watchlist_from_shared_cache(tmp_path, monkeypatch):
+    simulator = MarketSimulator(MarketUniverse(size=30, seed=1), html_padding_kb=1)
+    server = start_simulator(simulator=simulator)
+    simulator_url = 'http://%s:%d' % server.server_address[:2]
+    db_path = str(tmp_path / 'shared.db')
+    monkeypatch.setattr(config, 'UPSTREAM_SIMULATOR_URL', simulator_url)
+    monkeypatch.setattr(config, 'SHARED_SNAPSHOT_CACHE_ENABLED', True)
+    
+    db = DatabaseManager(db_path)
+    user_id = db.create_user('refresher', 'refresher@example.com', 'hash')
+    codes = [stock['code'] for stock in list(simulator.universe.stocks.values())[:3]]
+    for code in codes:
+        db.add_to_watchlist(code, '', user_id=user_id)
+    monkeypatch.setattr(stock_service_module, 'db_manager', db)
+    monkeypatch.setattr(refresher_module, 'db_manager', db)
+    leader_service = StockService()
+    monkeypatch.setattr(refresher_module, 'stock_service', leader_service)
+    
+    try:
+        refresher = WatchlistRefresher(lock_file=str(tmp_path / 'refresher.lock'))
+        assert refresher._acquire_lock()
+        assert refresher.refresh_once() == len(codes)
+        refresher._release_lock()
+        expected = {code: leader_service.get_stock_complete_data(code)['current_price'] for code in codes}
+        requests_before = sum(simulator.get_stats()['request_counts'].values())
+        
+        worker = subprocess.run(
+            [sys.executable, '-c', WORKER_SCRIPT, db_path, simulator_url, ','.join(codes)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, timeout=60
+        )
+        
+        assert worker.returncode == 0, worker.stderr
+        assert json.loads(worker.stdout.strip().splitlines()[-1]) == expected
+        # 另一个进程没有请求上游，全部数据来自刷新进程写入的共享缓存和本地基本面库
+        assert sum(simulator.get_stats()['request_counts'].values()) == requests_before
+    finally:
+        server.shutdown()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+沪深交易所交易日历模块
+交易时段（含午间休市）、周末和节假日休市（节假日从本地文件加载），
+用于判断行情是否可能变化：非交易时段的行情类缓存保持有效直到下一次开盘
+"""
+
+import json
+import logging
+from datetime import datetime, date, time, timedelta, timezone
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from config import get_config
+
+# 获取配置
+config = get_config()
+logger = logging.getLogger(__name__)
+
+# 交易所所在时区（北京时间，无夏令时）
+CHINA_TZ = timezone(timedelta(hours=8))
+
+
+class TradingCalendar:
+    """沪深交易日历（所有时间均为北京时间）"""
+    
+    def __init__(self, holidays_file: str = None, sessions: List[Tuple[str, str]] = None,
+                 close_grace_minutes: float = None):
+        self.holidays_file = holidays_file or config.TRADING_HOLIDAYS_FILE
+        self.sessions = [
+            (self._parse_time(start), self._parse_time(end))
+            for start, end in (sessions or config.TRADING_SESSIONS)
+        ]
+        if close_grace_minutes is None:
+            close_grace_minutes = config.TRADING_CLOSE_GRACE_MINUTES
+        self.close_grace = timedelta(minutes=close_grace_minutes)
+        self.holidays, self.holiday_years = self._load_holidays()
+        self._warned_years = set()
+    
+    def _parse_time(self, value: str) -> time:
+        """解析 HH:MM 格式的时间"""
+        return datetime.strptime(value, '%H:%M').time()
+    
+    def _load_holidays(self) -> Tuple[Set[date], Set[int]]:
+        """
+        从本地文件加载休市日期
+        文件格式: {"holidays": {"2025": ["2025-01-01", ...], ...}}
+        """
+        holidays = set()
+        years = set()
+        try:
+            with open(self.holidays_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            
+            for year, days in data.get('holidays', {}).items():
+                years.add(int(year))
+                for day in days:
+                    holidays.add(datetime.strptime(day, '%Y-%m-%d').date())
+            
+            logger.info(f"交易日历加载完成，覆盖年份 {sorted(years)}，休市日 {len(holidays)} 天")
+        except Exception as e:
+            logger.error(f"加载交易所休市日期失败 {self.holidays_file}: {e}，仅按周末判断休市")
+        
+        return holidays, years
+    
+    def now(self) -> datetime:
+        """当前北京时间（不带时区信息）"""
+        return datetime.now(CHINA_TZ).replace(tzinfo=None)
+    
+    def is_trading_day(self, day: date) -> bool:
+        """是否为交易日（周一至周五且不是节假日）"""
+        if day.weekday() >= 5:
+            return False
+        
+        if day.year not in self.holiday_years and day.year not in self._warned_years:
+            # 休市日期文件未覆盖该年份，只能按周末判断
+            self._warned_years.add(day.year)
+            logger.warning(f"交易日历未包含 {day.year} 年的休市日期，请更新 {self.holidays_file}")
+        
+        return day not in self.holidays
+    
+    def is_trading_time(self, moment: Optional[datetime] = None) -> bool:
+        """
+        是否处于交易时段
+        每个时段收盘后的宽限时间内仍视为交易时段（收盘集合竞价结果和收盘价在此期间落定）
+        """
+        moment = moment or self.now()
+        if not self.is_trading_day(moment.date()):
+            return False
+        
+        for start, end in self.sessions:
+            session_start = datetime.combine(moment.date(), start)
+            session_end = datetime.combine(moment.date(), end) + self.close_grace
+            if session_start <= moment < session_end:
+                return True
+        return False
+    
+    def next_session_open(self, moment: Optional[datetime] = None) -> datetime:
+        """moment 之后下一个交易时段的开始时间"""
+        moment = moment or self.now()
+        day = moment.date()
+        # 最长的节假日休市也不会超过一个月
+        for _ in range(31):
+            if self.is_trading_day(day):
+                for start, end in self.sessions:
+                    session_start = datetime.combine(day, start)
+                    if session_start > moment:
+                        return session_start
+            day += timedelta(days=1)
+        
+        return moment + timedelta(days=1)
+    
+    def cache_ttl(self, ttl: float) -> float:
+        """
+        行情类缓存的有效期（秒）
+        交易时段内为 ttl；非交易时段行情不会变化，有效期延长到下一次开盘
+        """
+        now = self.now()
+        if self.is_trading_time(now):
+            return ttl
+        return max(ttl, (self.next_session_open(now) - now).total_seconds())
+    
+    def get_status(self) -> Dict[str, Any]:
+        """当前交易状态"""
+        now = self.now()
+        return {
+            'is_trading_day': self.is_trading_day(now.date()),
+            'is_trading_time': self.is_trading_time(now),
+            'next_session_open': self.next_session_open(now).isoformat()
+        }
+
+
+# 创建全局交易日历实例
+trading_calendar = TradingCalendar()
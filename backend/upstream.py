@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+上游数据源健康管理模块
+按主机维护熔断器：滚动窗口内的错误率和延迟、健康评分，
+以及关闭/打开/半开三种状态，打开状态的数据源在所有降级链路中被自动跳过；
+并按主机统计延迟直方图，由高分位延迟推导自适应超时
+"""
+
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+from urllib.parse import urlparse
+
+from config import get_config
+
+# 获取配置
+config = get_config()
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailableError(Exception):
+    """上游数据源熔断中，请求被直接跳过"""
+
+
+class LatencyHistogram:
+    """
+    滑动窗口延迟直方图
+    按固定分桶（毫秒）统计最近 window_size 个样本，用于计算分位延迟
+    """
+    
+    # 分桶上界（毫秒），最后一个桶收纳所有更慢的样本
+    BUCKET_BOUNDS_MS = [
+        10, 25, 50, 75, 100, 150, 200, 300, 400, 500, 750,
+        1000, 1500, 2000, 3000, 4000, 5000, 7500, 10000, 15000, 20000, 30000
+    ]
+    
+    def __init__(self, window_size: int = None):
+        self.window_size = window_size or config.UPSTREAM_LATENCY_WINDOW
+        self._samples = deque()  # 最近样本所在的桶下标
+        self._counts = [0] * (len(self.BUCKET_BOUNDS_MS) + 1)
+    
+    def add(self, latency: float) -> None:
+        """记录一个样本（秒）"""
+        index = bisect.bisect_left(self.BUCKET_BOUNDS_MS, latency * 1000)
+        self._samples.append(index)
+        self._counts[index] += 1
+        if len(self._samples) > self.window_size:
+            self._counts[self._samples.popleft()] -= 1
+    
+    def __len__(self) -> int:
+        return len(self._samples)
+    
+    def percentile(self, percent: float) -> float:
+        """分位延迟（秒，取样本所在桶的上界），没有样本时返回0"""
+        total = len(self._samples)
+        if total == 0:
+            return 0.0
+        
+        target = total * percent / 100
+        cumulative = 0
+        for index, count in enumerate(self._counts):
+            cumulative += count
+            if cumulative >= target:
+                break
+        
+        if index >= len(self.BUCKET_BOUNDS_MS):
+            return self.BUCKET_BOUNDS_MS[-1] / 1000
+        return self.BUCKET_BOUNDS_MS[index] / 1000
+
+
+class CircuitBreaker:
+    """单个上游主机的熔断器"""
+    
+    CLOSED = 'closed'        # 正常放行
+    OPEN = 'open'            # 熔断，直接跳过
+    HALF_OPEN = 'half_open'  # 冷却结束，放行一个探测请求
+    
+    def __init__(self, host: str, window_size: int = None, min_requests: int = None,
+                 error_rate_threshold: float = None, open_seconds: float = None):
+        self.host = host
+        self.window_size = window_size or config.CIRCUIT_BREAKER_WINDOW
+        self.min_requests = min_requests or config.CIRCUIT_BREAKER_MIN_REQUESTS
+        self.error_rate_threshold = error_rate_threshold or config.CIRCUIT_BREAKER_ERROR_RATE
+        self.open_seconds = open_seconds or config.CIRCUIT_BREAKER_OPEN_SECONDS
+        
+        self.state = self.CLOSED
+        self._results = deque(maxlen=self.window_size)  # 滚动窗口 (是否成功, 耗时秒)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        
+        # 延迟直方图（成功请求和超时请求的耗时），用于自适应超时
+        self.latency = LatencyHistogram()
+        
+        # 累计计数
+        self.total_requests = 0
+        self.total_failures = 0
+        self.total_skipped = 0
+    
+    def allow_request(self) -> bool:
+        """判断是否放行请求（打开状态冷却结束后转为半开，只放行一个探测请求）"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+                logger.info(f"上游 {self.host} 熔断冷却结束，进入半开状态")
+            
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            
+            self.total_skipped += 1
+            return False
+    
+    def record_success(self, latency: float) -> None:
+        """记录成功请求"""
+        with self._lock:
+            self.total_requests += 1
+            self._results.append((True, latency))
+            self.latency.add(latency)
+            if self.state == self.HALF_OPEN:
+                # 探测成功，恢复正常并重新统计
+                self.state = self.CLOSED
+                self._probe_in_flight = False
+                self._results.clear()
+                self._results.append((True, latency))
+                logger.info(f"上游 {self.host} 探测成功，熔断恢复")
+    
+    def record_failure(self, latency: float, timed_out: bool = False) -> None:
+        """
+        记录失败请求，错误率超过阈值时打开熔断
+        超时请求的耗时也计入延迟直方图，避免超时被截断的慢请求让超时越调越短
+        """
+        with self._lock:
+            self.total_requests += 1
+            self.total_failures += 1
+            self._results.append((False, latency))
+            if timed_out:
+                self.latency.add(latency)
+            
+            if self.state == self.HALF_OPEN:
+                self._trip()
+            elif self.state == self.CLOSED and len(self._results) >= self.min_requests:
+                if self._error_rate() >= self.error_rate_threshold:
+                    self._trip()
+    
+    def _trip(self) -> None:
+        """打开熔断（调用方需持有锁）"""
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        logger.warning(
+            f"上游 {self.host} 熔断打开，错误率 {self._error_rate():.0%}，"
+            f"{self.open_seconds}秒内跳过该数据源"
+        )
+    
+    def _error_rate(self) -> float:
+        """滚动窗口错误率（调用方需持有锁）"""
+        if not self._results:
+            return 0.0
+        failures = sum(1 for success, _ in self._results if not success)
+        return failures / len(self._results)
+    
+    def _avg_latency(self) -> float:
+        """滚动窗口平均耗时（秒，调用方需持有锁）"""
+        if not self._results:
+            return 0.0
+        return sum(latency for _, latency in self._results) / len(self._results)
+    
+    def get_timeout(self, default: float) -> float:
+        """
+        自适应超时（秒）
+        样本不足时使用调用方给出的默认值；否则取高分位延迟乘以系数，
+        并限制在上下限之间：快的数据源快速失败，慢但健康的数据源不被误杀
+        """
+        with self._lock:
+            timeout = self._adaptive_timeout()
+        return default if timeout is None else timeout
+    
+    def _adaptive_timeout(self) -> Optional[float]:
+        """由延迟直方图推导的超时，样本不足时返回None（调用方需持有锁）"""
+        if len(self.latency) < config.UPSTREAM_TIMEOUT_MIN_SAMPLES:
+            return None
+        timeout = self.latency.percentile(config.UPSTREAM_TIMEOUT_PERCENTILE) * config.UPSTREAM_TIMEOUT_MULTIPLIER
+        return round(min(max(timeout, config.UPSTREAM_TIMEOUT_FLOOR), config.UPSTREAM_TIMEOUT_CEILING), 3)
+    
+    def health_score(self) -> float:
+        """
+        健康评分（0-100）
+        成功率决定基础分，平均耗时超过1秒时按比例扣减，熔断打开时为0
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                return 0.0
+            if not self._results:
+                return 100.0
+            score = (1 - self._error_rate()) * 100
+            avg_latency = self._avg_latency()
+            if avg_latency > 1:
+                score /= avg_latency
+            return round(score, 1)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """熔断器状态统计"""
+        health_score = self.health_score()
+        with self._lock:
+            return {
+                'host': self.host,
+                'state': self.state,
+                'health_score': health_score,
+                'window_requests': len(self._results),
+                'error_rate': round(self._error_rate() * 100, 2),
+                'avg_latency_ms': round(self._avg_latency() * 1000, 1),
+                'latency_p50_ms': round(self.latency.percentile(50) * 1000, 1),
+                'latency_p99_ms': round(self.latency.percentile(99) * 1000, 1),
+                'latency_samples': len(self.latency),
+                'timeout_seconds': self._adaptive_timeout(),  # None 表示样本不足，使用调用方默认超时
+                'total_requests': self.total_requests,
+                'total_failures': self.total_failures,
+                'total_skipped': self.total_skipped
+            }
+
+
+class UpstreamRegistry:
+    """上游主机熔断器注册表（按主机名懒创建）"""
+    
+    def __init__(self):
+        self._breakers = {}
+        self._lock = threading.Lock()
+    
+    def get(self, host: str) -> CircuitBreaker:
+        """获取主机对应的熔断器"""
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(host, CircuitBreaker(host))
+        return breaker
+    
+    def for_url(self, url: str) -> CircuitBreaker:
+        """获取URL所属主机的熔断器"""
+        return self.get(urlparse(url).hostname or url)
+    
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """所有上游主机的熔断器状态"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.host: breaker.get_stats() for breaker in breakers}
+    
+    def reset(self, host: Optional[str] = None) -> None:
+        """重置熔断器（不指定主机时全部重置）"""
+        with self._lock:
+            if host is None:
+                self._breakers.clear()
+            else:
+                self._breakers.pop(host, None)
+
+
+# 创建全局上游注册表实例
+upstream_registry = UpstreamRegistry()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+关注列表后台刷新模块
+定时汇总所有用户关注列表中的股票代码（去重），按批在后台优先级下提前刷新即将过期的缓存，
+关注列表接口因此直接命中热缓存，不再由各个请求自己承担上游延迟。
+多进程部署并启用共享快照缓存（SHARED_SNAPSHOT_CACHE_ENABLED）时，各进程通过文件锁选出一个执行刷新的进程，
+刷新结果写入共享快照缓存，其他进程的关注列表请求从中读取；未启用时每个进程各自刷新自己的内存缓存
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, List
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，开发服务器为单进程，不加锁
+    fcntl = None
+
+from config import get_config
+from database import db_manager
+from stock_service import stock_service
+from fetch_executor import fetch_executor, PRIORITY_BACKGROUND
+
+# 获取配置
+config = get_config()
+logger = logging.getLogger(__name__)
+
+
+class WatchlistRefresher:
+    """关注列表后台刷新调度器"""
+    
+    def __init__(self, interval: float = None, batch_size: int = None, lock_file: str = None):
+        self.configured_interval = interval or config.WATCHLIST_REFRESH_INTERVAL  # None 表示按行情缓存有效期推导
+        self.batch_size = batch_size or config.WATCHLIST_REFRESH_BATCH_SIZE
+        self.lock_file = lock_file or config.WATCHLIST_REFRESH_LOCK_FILE
+        self._lock_handle = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        
+        # 运行统计
+        self.total_runs = 0
+        self.total_failures = 0
+        self.last_run_time = None
+        self.last_duration = 0.0
+        self.last_code_count = 0
+    
+    def start(self) -> bool:
+        """启动后台刷新线程，已在运行时返回False"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return False
+            
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run_loop,
+                name='watchlist-refresher',
+                daemon=True
+            )
+            self._thread.start()
+        
+        logger.info(f"关注列表后台刷新已启动，周期 {self.interval} 秒，每批 {self.batch_size} 只")
+        return True
+    
+    def stop(self) -> None:
+        """停止后台刷新线程并释放文件锁"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+        self._release_lock()
+        logger.info("关注列表后台刷新已停止")
+    
+    @property
+    def interval(self) -> float:
+        """
+        刷新周期（秒）
+        未配置时为行情缓存有效期减去上一轮耗时：每轮开始到下一轮开始正好一个有效期，
+        每只关注股票的行情在每个有效期内只刷新一次
+        """
+        if self.configured_interval:
+            return self.configured_interval
+        quote_ttl = config.SNAPSHOT_CACHE_TTLS['quote']
+        return max(quote_ttl - self.last_duration, config.WATCHLIST_REFRESH_MIN_INTERVAL)
+    
+    @property
+    def _needs_lock(self) -> bool:
+        """是否需要通过文件锁选出唯一的刷新进程（只有启用共享快照缓存时，其他进程才能用到刷新结果）"""
+        return fcntl is not None and config.SHARED_SNAPSHOT_CACHE_ENABLED
+    
+    def _acquire_lock(self) -> bool:
+        """尝试获取刷新文件锁（非阻塞），已持有或不需要加锁时直接返回True"""
+        if not self._needs_lock or self._lock_handle is not None:
+            return True
+        handle = open(self.lock_file, 'a')
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        handle.truncate(0)
+        handle.write(str(os.getpid()))
+        handle.flush()
+        self._lock_handle = handle
+        logger.info(f"进程 {os.getpid()} 获得关注列表刷新锁，由本进程执行后台刷新")
+        return True
+    
+    def _release_lock(self) -> None:
+        if self._lock_handle is not None:
+            fcntl.flock(self._lock_handle.fileno(), fcntl.LOCK_UN)
+            self._lock_handle.close()
+            self._lock_handle = None
+    
+    @property
+    def is_leader(self) -> bool:
+        """本进程是否执行刷新（持有文件锁，或不需要加锁）"""
+        return not self._needs_lock or self._lock_handle is not None
+    
+    def _run_loop(self) -> None:
+        """刷新循环：持有文件锁时每个周期刷新一次，单次失败不影响后续周期；未持有时每个周期重试获取"""
+        while not self._stop_event.is_set():
+            try:
+                if self._acquire_lock():
+                    self.refresh_once()
+            except Exception as e:
+                self.total_failures += 1
+                logger.error(f"关注列表后台刷新失败: {e}")
+            self._stop_event.wait(self.interval)
+    
+    def refresh_once(self) -> int:
+        """
+        刷新一轮：所有用户关注的股票按批获取
+        
+        将在下一轮开始前过期的字段层会被提前刷新（提前量为刷新周期加上一轮耗时，
+        按行情缓存有效期推导周期时即为该有效期），未过期的字段层直接命中缓存，不产生上游请求。
+        
+        Returns:
+            本轮刷新的股票数
+        """
+        start_time = time.time()
+        codes = db_manager.get_watched_stock_codes()
+        refresh_ahead = self.interval + self.last_duration
+        
+        for i in range(0, len(codes), self.batch_size):
+            if self._stop_event.is_set():
+                break
+            batch = codes[i:i + self.batch_size]
+            # 在后台优先级任务中执行，批量查询内部提交的子任务沿用后台优先级
+            future = fetch_executor.submit(
+                self._refresh_batch, batch, refresh_ahead,
+                priority=PRIORITY_BACKGROUND
+            )
+            fetch_executor.result(future)
+        
+        self.total_runs += 1
+        self.last_run_time = start_time
+        self.last_duration = time.time() - start_time
+        self.last_code_count = len(codes)
+        return len(codes)
+    
+    def _refresh_batch(self, codes: List[str], refresh_ahead: float) -> None:
+        """刷新一批股票（结果写入 stock_service 缓存）"""
+        stock_service.get_batch_stocks(codes, refresh_ahead=refresh_ahead)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """后台刷新统计"""
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'is_leader': self.is_leader,
+            'interval_seconds': round(self.interval, 2),
+            'batch_size': self.batch_size,
+            'total_runs': self.total_runs,
+            'total_failures': self.total_failures,
+            'last_run_time': self.last_run_time,
+            'last_duration_ms': round(self.last_duration * 1000, 1),
+            'last_code_count': self.last_code_count
+        }
+
+
+# 创建全局后台刷新实例
+watchlist_refresher = WatchlistRefresher()